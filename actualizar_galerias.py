@@ -0,0 +1,54 @@
+"""
+Script para regenerar el manifiesto y las miniaturas de las galerías de fotos
+
+Ejecutar después de subir o borrar fotos en static/galerias. Solo se
+procesan las fotos nuevas o cambiadas; las miniaturas se generan en
+paralelo en static/miniaturas. Los workers en marcha detectan el manifiesto
+nuevo en unos segundos (ver services/galerias.py).
+
+Uso:
+    python actualizar_galerias.py                   # manifiesto y miniaturas pendientes
+    python actualizar_galerias.py --todo            # volver a revisar todas las carpetas
+    python actualizar_galerias.py --sin-miniaturas  # solo el manifiesto
+    python actualizar_galerias.py --procesos 2      # limitar los procesos de miniaturas
+"""
+import argparse
+
+from app import create_app
+from services import galerias, miniaturas
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Regenera el manifiesto y las miniaturas de las galerías de fotos')
+    parser.add_argument('--todo', action='store_true', help='Volver a revisar todas las carpetas aunque no hayan cambiado')
+    parser.add_argument('--sin-miniaturas', action='store_true', help='No generar miniaturas, solo el manifiesto')
+    parser.add_argument('--procesos', type=int, default=None, help='Procesos para generar miniaturas (por defecto, uno por núcleo)')
+    args = parser.parse_args()
+
+    app = create_app()
+    ruta = app.config['GALERIAS_MANIFIESTO']
+    cambiado = galerias.actualizar(app, forzar=args.todo)
+
+    if not args.sin_miniaturas:
+        def progreso(hechas, total, origen):
+            print(f"  [{hechas}/{total}] {origen}")
+
+        generadas = miniaturas.generar(app.static_folder, galerias.fotos(galerias.leer(ruta)),
+                                       procesos=args.procesos, progreso=progreso)
+        print(f"[INFO] Miniaturas generadas: {generadas}")
+        if generadas:
+            # Volver a revisar las carpetas para añadir las versiones nuevas al manifiesto
+            cambiado = galerias.actualizar(app, forzar=True) or cambiado
+
+    manifiesto = galerias.leer(ruta)
+    for carpeta, entrada in sorted(manifiesto.items()):
+        imagenes = entrada.get('imagenes', [])
+        con_versiones = sum(1 for imagen in imagenes if imagen.get('versiones'))
+        video = ' + vídeo' if entrada.get('video') else ''
+        print(f"  {carpeta}: {len(imagenes)} imagen(es), {con_versiones} con miniaturas{video}")
+    estado = 'actualizado' if cambiado else 'sin cambios'
+    print(f"[INFO] Manifiesto {estado}: {ruta}")
+
+
+if __name__ == '__main__':
+    main()
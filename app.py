@@ -43,6 +43,58 @@ def create_app():
     
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
     
+    # Directorio para los archivos generados en segundo plano (lotes de carnets, etc.)
+    # Junto a la base de datos si hay disco persistente, en instance/ en desarrollo
+    app.config['TRABAJOS_DIR'] = os.environ.get('TRABAJOS_DIR') or os.path.join(
+        os.environ.get('PERSISTENT_DISK_PATH') or app.instance_path, 'trabajos')
+    
+    # Manifiesto de las galerías de fotos (lo comparten todos los workers, ver services/galerias.py)
+    app.config['GALERIAS_MANIFIESTO'] = os.environ.get('GALERIAS_MANIFIESTO') or os.path.join(
+        app.instance_path, 'galerias.json')
+    
+    # Caché de las páginas públicas para anónimos, compartida por los workers (ver services/cache_paginas.py)
+    # Se puede apuntar a /dev/shm para tenerla en memoria; con TTL 0 se desactiva
+    app.config['PAGINAS_CACHE_DIR'] = os.environ.get('PAGINAS_CACHE_DIR') or os.path.join(
+        app.instance_path, 'cache_paginas')
+    app.config['PAGINAS_CACHE_TTL'] = int(os.environ.get('PAGINAS_CACHE_TTL', '300'))
+    
+    # Plazas libres de las actividades próximas, compartidas por los workers (ver services/plazas.py)
+    app.config['PLAZAS_CACHE'] = os.environ.get('PLAZAS_CACHE') or os.path.join(
+        app.instance_path, 'plazas.json')
+    
+    # Límite de intentos en los formularios públicos, compartido por los workers (ver services/limites.py)
+    app.config['LIMITES_DB'] = os.environ.get('LIMITES_DB') or os.path.join(app.instance_path, 'limites.db')
+    app.config['LIMITES_ACTIVOS'] = os.environ.get('LIMITES_ACTIVOS', 'true').lower() == 'true'
+    # Proxies delante de gunicorn de los que se cree X-Forwarded-For/-Proto: nginx en el VPS, el de Render
+    # en Render. 0 si la aplicación recibe las conexiones directamente (si no, cualquiera falsea su IP)
+    app.config['PROXIES_CONFIABLES'] = int(os.environ.get('PROXIES_CONFIABLES', '1'))
+    if app.config['PROXIES_CONFIABLES']:
+        from werkzeug.middleware.proxy_fix import ProxyFix
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config['PROXIES_CONFIABLES'],
+                                x_proto=app.config['PROXIES_CONFIABLES'])
+    
+    # Métricas de las peticiones por ruta, compartidas por los workers (ver services/metricas.py)
+    app.config['METRICAS_DB'] = os.environ.get('METRICAS_DB') or os.path.join(app.instance_path, 'metricas.db')
+    app.config['METRICAS_ACTIVAS'] = os.environ.get('METRICAS_ACTIVAS', 'true').lower() == 'true'
+    app.config['METRICAS_LENTA_MS'] = int(os.environ.get('METRICAS_LENTA_MS', '2000'))
+    app.config['METRICAS_TOKEN'] = os.environ.get('METRICAS_TOKEN')
+    
+    # Algoritmo y coste de los hashes de contraseña (ver services/contrasenas.py y benchmark_contrasenas.py)
+    from services import contrasenas
+    politica = os.environ.get('PASSWORD_HASH') or contrasenas.POR_DEFECTO
+    try:
+        app.config['PASSWORD_HASH'] = contrasenas.resolver(politica)
+    except ValueError as e:
+        print(f"[WARNING] PASSWORD_HASH no válido ({politica}): {e}. Se usa {contrasenas.POR_DEFECTO}")
+        app.config['PASSWORD_HASH'] = contrasenas.resolver(contrasenas.POR_DEFECTO)
+    
+    # Las actividades de hace más de estos días pasan al archivo (ver services/archivo.py)
+    app.config['ARCHIVO_DIAS'] = int(os.environ.get('ARCHIVO_DIAS', '365'))
+    
+    # Dominio público para las URLs de verificación de los QR de los carnets (p. ej. https://avmontealto.es)
+    # Si no se indica, se usa el de la petición que genera el carnet
+    app.config['URL_PUBLICA'] = os.environ.get('URL_PUBLICA')
+    
     # Configuración específica según el tipo de base de datos
     if database_url and 'sqlite' in database_url.lower():
         # Configuración optimizada para SQLite en producción
@@ -127,6 +179,33 @@ def create_app():
     app.register_blueprint(actividades_bp, url_prefix='/actividades')
     app.register_blueprint(admin_bp, url_prefix='/admin')
     
+    # Cargar (o construir) el manifiesto de las galerías antes de que gunicorn haga fork
+    from services import galerias
+    galerias.iniciar(app)
+    
+    # URLs de static con huella de contenido en todas las plantillas (ver services/estaticos.py)
+    from services import estaticos
+    estaticos.cargar(app)
+    app.jinja_env.globals['url_for'] = estaticos.url_for_estatico
+    # Bootstrap e iconos desde static/vendor si ya se han construido; si no, desde el CDN
+    from services import librerias
+    app.jinja_env.globals['url_libreria'] = librerias.url_libreria
+    # CSS crítico incrustado en la primera visita a la portada (ver services/critico.py)
+    from services import critico
+    critico.cargar(app)
+    app.jinja_env.globals['css_critico'] = critico.css_critico
+    from services import cache_paginas
+    cache_paginas.iniciar(app)
+    # Tiempo, SQL y plantillas de cada petición (ver services/metricas.py)
+    from services import metricas
+    metricas.iniciar(app)
+    
+    # Sin worker aparte (p. ej. Render, donde el disco no se comparte entre servicios)
+    # los trabajos en segundo plano se ejecutan en un hilo de uno de los procesos web
+    if os.environ.get('TRABAJOS_WORKER_INTERNO') == 'true':
+        from services.trabajos import iniciar_worker_interno
+        iniciar_worker_interno(app)
+    
     # Ruta principal
     @app.route('/')
     def index():
@@ -137,6 +216,19 @@ def create_app():
                 return redirect(url_for('socios.dashboard'))
         return redirect(url_for('auth.login'))
     
+    # Verificación del QR de los carnets (pública: la lee cualquier móvil en la puerta)
+    @app.route('/verificar/<token>')
+    def verificar_carnet(token):
+        from flask import request, jsonify
+        from services import verificacion
+        socio_id = verificacion.leer_token(token)
+        estado = verificacion.estado_socio(socio_id) if socio_id is not None else None
+        if request.args.get('formato') == 'json' or request.accept_mimetypes.best == 'application/json':
+            if estado is None:
+                return jsonify({'valido': False, 'error': 'Carnet no válido'}), 404
+            return jsonify(estado)
+        return render_template('verificar.html', estado=estado), (200 if estado else 404)
+    
     # Crear tablas de base de datos (con manejo de errores)
     try:
         with app.app_context():
@@ -158,7 +250,7 @@ def create_app():
                         print(f"[INFO] Base de datos no encontrada en {db_path}. Se creará automáticamente con db.create_all()")
             
             # Importar todos los modelos para que SQLAlchemy los detecte
-            from models import User, Actividad, Inscripcion, SolicitudSocio, BeneficiarioSolicitud, Beneficiario, RegistroFinanciero
+            from models import User, Actividad, Inscripcion, SolicitudSocio, BeneficiarioSolicitud, Beneficiario, RegistroFinanciero, VersionTabla, Telefono, Renovacion, RenovacionSocio, ListaVencimientos, Vencimiento, ActividadArchivada, InscripcionArchivada, InformeEstadisticas, EstadisticaMes, EstadisticaEdad, EstadisticaActividad
             
             db.create_all()
             
@@ -211,9 +303,113 @@ def create_app():
                                     traceback.print_exc()
                     else:
                         print("[INFO] La tabla 'actividades' no existe aún, se creará con db.create_all()")
+
+                    # Índice de beneficiarios por socio (verificación de carnets, carnets por lotes)
+                    if 'beneficiarios' in inspector.get_table_names():
+                        try:
+                            with db.engine.connect() as conn:
+                                conn.execute(text('CREATE INDEX IF NOT EXISTS ix_beneficiarios_socio_id ON beneficiarios (socio_id)'))
+                                conn.commit()
+                        except Exception as e:
+                            print(f"[WARNING] No se pudo crear el índice 'ix_beneficiarios_socio_id': {e}")
+
+                    # Índice de actividades por fecha (listados de próximas actividades, ETag de las vistas)
+                    if 'actividades' in inspector.get_table_names():
+                        try:
+                            with db.engine.connect() as conn:
+                                conn.execute(text('CREATE INDEX IF NOT EXISTS ix_actividades_fecha ON actividades (fecha)'))
+                                conn.commit()
+                        except Exception as e:
+                            print(f"[WARNING] No se pudo crear el índice 'ix_actividades_fecha': {e}")
+
+                    # Índice de inscripciones por familia (panel e historial del socio, ver services/panel_socio.py)
+                    if 'inscripciones' in inspector.get_table_names():
+                        try:
+                            with db.engine.connect() as conn:
+                                conn.execute(text('CREATE INDEX IF NOT EXISTS ix_inscripciones_user_actividad ON inscripciones (user_id, actividad_id)'))
+                                conn.commit()
+                        except Exception as e:
+                            print(f"[WARNING] No se pudo crear el índice 'ix_inscripciones_user_actividad': {e}")
+
+                    # Verificar columna de último cambio de asistencia en inscripciones
+                    if 'inscripciones' in inspector.get_table_names():
+                        columnas_inscripciones = [col['name'] for col in inspector.get_columns('inscripciones')]
+                        if 'asistencia_actualizada' not in columnas_inscripciones:
+                            try:
+                                with db.engine.connect() as conn:
+                                    conn.execute(text('ALTER TABLE inscripciones ADD COLUMN asistencia_actualizada DATETIME'))
+                                    conn.commit()
+                                print("[INFO] Columna 'asistencia_actualizada' añadida automáticamente a 'inscripciones'")
+                            except Exception as e:
+                                error_msg = str(e).lower()
+                                if "duplicate column name" in error_msg or "already exists" in error_msg:
+                                    print("[INFO] La columna 'asistencia_actualizada' ya existe en 'inscripciones'")
+                                else:
+                                    print(f"[WARNING] No se pudo añadir la columna 'asistencia_actualizada': {e}")
+                                    import traceback
+                                    traceback.print_exc()
+
+                    # Forma de pago del socio (filtro de la renovación masiva)
+                    if 'users' in inspector.get_table_names():
+                        columnas_users = [col['name'] for col in inspector.get_columns('users')]
+                        if 'forma_de_pago' not in columnas_users:
+                            try:
+                                with db.engine.connect() as conn:
+                                    conn.execute(text('ALTER TABLE users ADD COLUMN forma_de_pago VARCHAR(20)'))
+                                    conn.commit()
+                                print("[INFO] Columna 'forma_de_pago' añadida automáticamente a 'users'")
+                            except Exception as e:
+                                error_msg = str(e).lower()
+                                if "duplicate column name" in error_msg or "already exists" in error_msg:
+                                    print("[INFO] La columna 'forma_de_pago' ya existe en 'users'")
+                                else:
+                                    print(f"[WARNING] No se pudo añadir la columna 'forma_de_pago': {e}")
+                                    import traceback
+                                    traceback.print_exc()
+
+                    # Índice de socios por rol y validez (vencidos / por vencer, ver services/vencimientos.py)
+                    if 'users' in inspector.get_table_names():
+                        try:
+                            with db.engine.connect() as conn:
+                                conn.execute(text('CREATE INDEX IF NOT EXISTS ix_users_rol_fecha_validez ON users (rol, fecha_validez)'))
+                                conn.commit()
+                        except Exception as e:
+                            print(f"[WARNING] No se pudo crear el índice 'ix_users_rol_fecha_validez': {e}")
             except Exception as e:
                 print(f"[WARNING] Error al verificar columnas: {e}")
             
+            # Contadores de cambios para los ETag de las vistas (ver services/versiones.py)
+            try:
+                from services import versiones
+                versiones.iniciar(app)
+            except Exception as e:
+                db.session.rollback()
+                print(f"[WARNING] No se pudieron preparar las versiones de las tablas: {e}")
+            
+            # Vistas de actividades e inscripciones con las archivadas (ver services/archivo.py)
+            try:
+                from services import archivo
+                archivo.preparar_ids()
+                archivo.crear_vistas()
+            except Exception as e:
+                print(f"[WARNING] No se pudieron crear las vistas del archivo de actividades: {e}")
+            
+            # Índice de teléfonos de las solicitudes a partir de movil/movil2 (ver services/telefonos.py)
+            try:
+                from services import telefonos
+                telefonos.poblar()
+            except Exception as e:
+                db.session.rollback()
+                print(f"[WARNING] No se pudo rellenar la tabla 'telefonos': {e}")
+            
+            # Forma de pago de los socios que no la tienen, la de su solicitud (filtro de la renovación masiva)
+            try:
+                from services import telefonos
+                telefonos.formas_de_pago()
+            except Exception as e:
+                db.session.rollback()
+                print(f"[WARNING] No se pudo completar la forma de pago de los socios: {e}")
+            
             # Crear usuarios administradores automáticamente si no existen
             from models import User
             from datetime import datetime, timedelta, timezone
@@ -228,7 +424,7 @@ def create_app():
             ]
             
             try:
-                creados = 0
+                pendientes = []
                 for admin_data in ADMINISTRADORES:
                     # Verificar si el usuario ya existe
                     usuario_existente = User.query.filter_by(nombre_usuario=admin_data['nombre_usuario']).first()
@@ -248,9 +444,14 @@ def create_app():
                             fecha_alta=datetime.now(timezone.utc),
                             fecha_validez=datetime.now(timezone.utc) + timedelta(days=3650)  # 10 años de validez
                         )
-                        admin.set_password(password_usuario)
-                        db.session.add(admin)
-                        creados += 1
+                        pendientes.append((admin, password_usuario))
+                
+                # Los hashes en paralelo (en una base nueva son varios seguidos)
+                hashes = contrasenas.generar_varios(password for _, password in pendientes)
+                for (admin, _), password_hash in zip(pendientes, hashes):
+                    admin.password_hash = password_hash
+                    db.session.add(admin)
+                creados = len(pendientes)
                 
                 if creados > 0:
                     db.session.commit()
@@ -0,0 +1,64 @@
+"""
+Benchmark de las políticas de hash de contraseñas (services/contrasenas.py)
+
+Para cada política mide cuánto tarda en comprobarse una contraseña, que es
+casi todo el coste de un inicio de sesión, y lo pasa a inicios de sesión
+por segundo en un worker. Como es trabajo de CPU, el total del servidor es
+ese número por el número de núcleos (no por el de workers de gunicorn).
+
+Al final compara crear N hashes seguidos con hacerlo con el pool de
+procesos de generar_varios().
+
+No necesita base de datos.
+
+Uso: python benchmark_contrasenas.py [segundos_por_politica] [hashes_en_lote]
+"""
+import os
+import sys
+import time
+
+from services import contrasenas
+
+
+def _medir(metodo, segundos):
+    """Segundos medios por comprobación (repitiendo hasta gastar 'segundos')"""
+    hash_guardado = contrasenas.generar('Contraseña de prueba 1', metodo)
+    contrasenas.comprobar(hash_guardado, 'Contraseña de prueba 1')
+    veces = 0
+    inicio = time.perf_counter()
+    while True:
+        contrasenas.comprobar(hash_guardado, 'Contraseña de prueba 1')
+        veces += 1
+        transcurrido = time.perf_counter() - inicio
+        if transcurrido >= segundos and veces >= 3:
+            return transcurrido / veces
+
+
+def main():
+    segundos = float(sys.argv[1]) if len(sys.argv) > 1 else 2.0
+    lote = int(sys.argv[2]) if len(sys.argv) > 2 else 16
+    nucleos = os.cpu_count() or 1
+
+    print(f"Núcleos: {nucleos}. Política por defecto: {contrasenas.POR_DEFECTO}")
+    print()
+    print(f"{'Política':<14} {'Método':<24} {'ms/login':>9} {'logins/s/worker':>16} {'logins/s servidor':>18}")
+    for nombre, metodo in contrasenas.POLITICAS.items():
+        por_login = _medir(metodo, segundos)
+        print(f"{nombre:<14} {metodo:<24} {por_login * 1000:>9.1f} {1 / por_login:>16.1f} {nucleos / por_login:>18.1f}")
+
+    print()
+    metodo = contrasenas.POLITICAS[contrasenas.POR_DEFECTO]
+    passwords = [f'clave{i}' for i in range(lote)]
+    inicio = time.perf_counter()
+    for password in passwords:
+        contrasenas.generar(password, metodo)
+    seguido = time.perf_counter() - inicio
+    inicio = time.perf_counter()
+    contrasenas.generar_varios(passwords, metodo)
+    en_paralelo = time.perf_counter() - inicio
+    print(f"{lote} hashes ({contrasenas.POR_DEFECTO}): {seguido:.2f} s seguidos, "
+          f"{en_paralelo:.2f} s con generar_varios ({seguido / en_paralelo:.1f}x)")
+
+
+if __name__ == '__main__':
+    main()
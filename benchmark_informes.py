@@ -0,0 +1,112 @@
+"""
+Benchmark del motor de PDFs (services/informes.py)
+
+Mide el tiempo medio por documento de los cuatro tipos de PDF con el código
+actual, con la caché de estilos y logos y sin ella:
+  - "sin caché": se vacía la caché antes de cada documento, así que cada uno
+    construye los estilos y decodifica los logos.
+  - "con caché": estilos y logos precargados una vez por proceso, como hace
+    gunicorn en post_fork.
+
+No compara con el código anterior a services/informes.py: "sin caché" solo
+se le parece en que repite la preparación en cada documento.
+
+Al final se muestra el coste de preparación (estilos + logos decodificados)
+que se ahorra en cada petición. El resto del tiempo es maquetación de
+ReportLab y depende del tamaño del documento.
+
+No necesita base de datos: usa objetos de ejemplo con los mismos atributos
+que los modelos.
+
+Uso: python benchmark_informes.py [repeticiones]
+"""
+import sys
+import time
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+from services import informes
+from services.inscritos import FilaInscrito
+
+
+def _datos_ejemplo():
+    ahora = datetime.utcnow()
+    socio = SimpleNamespace(
+        nombre='JUAN PEREZ GARCIA', nombre_usuario='juanpg1980', numero_socio='0042',
+        fecha_alta=ahora - timedelta(days=400), fecha_validez=ahora + timedelta(days=60),
+        ano_nacimiento=1980, calle='MAYOR', numero='12', piso='2B', poblacion='MERIDA',
+    )
+    beneficiarios = [
+        SimpleNamespace(nombre=f'HIJO{i}', primer_apellido='PEREZ', segundo_apellido='LOPEZ', ano_nacimiento=2010 + i)
+        for i in range(3)
+    ]
+    actividades = [
+        SimpleNamespace(
+            nombre=f'Actividad {i}', descripcion='Descripción de la actividad ' * 3,
+            fecha=ahora + timedelta(days=i - 20), aforo_maximo=50,
+            numero_inscritos=lambda: 25,
+        )
+        for i in range(40)
+    ]
+    inscripciones = []
+    for i in range(50):
+        ben = beneficiarios[i % 3] if i % 2 else None
+        inscripciones.append(FilaInscrito(
+            id=i, actividad_id=1, fecha_inscripcion=ahora, asiste=i % 2 == 0, asistencia_actualizada=None,
+            beneficiario_id=i if ben else None, socio_id=1, socio_nombre=socio.nombre,
+            nombre_usuario=socio.nombre_usuario, numero_socio=socio.numero_socio,
+            ben_nombre=ben.nombre if ben else None, ben_primer_apellido=ben.primer_apellido if ben else None,
+            ben_segundo_apellido=ben.segundo_apellido if ben else None, numero_beneficiario=None,
+            ano_nacimiento=ben.ano_nacimiento if ben else socio.ano_nacimiento,
+        ))
+    solicitud = SimpleNamespace(
+        nombre='LUIS', primer_apellido='GIL', segundo_apellido='RUIZ', movil='600000000',
+        fecha_nacimiento=datetime(1990, 1, 1).date(), miembros_unidad_familiar=4,
+        fecha_solicitud=ahora, forma_de_pago='bizum', calle='REAL', numero='3', piso=None,
+        poblacion='MERIDA', beneficiarios=beneficiarios,
+    )
+    return socio, beneficiarios, actividades, inscripciones, solicitud, ahora
+
+
+def _medir(funcion, repeticiones, vaciar_cache):
+    tiempos = []
+    for _ in range(repeticiones):
+        if vaciar_cache:
+            informes.limpiar_cache()
+        inicio = time.perf_counter()
+        funcion()
+        tiempos.append(time.perf_counter() - inicio)
+    return sum(tiempos) / len(tiempos) * 1000
+
+
+def main():
+    repeticiones = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    socio, beneficiarios, actividades, inscripciones, solicitud, ahora = _datos_ejemplo()
+
+    documentos = [
+        ('Carnet', lambda: informes.pdf_carnet(informes.datos_carnet(socio, beneficiarios))),
+        ('Listado de actividades', lambda: informes.pdf_listado_actividades(actividades, ahora)),
+        ('Inscritos (50)', lambda: informes.pdf_inscritos(actividades[0], inscripciones, ahora)),
+        ('Confirmación solicitud', lambda: informes.pdf_confirmacion_solicitud(
+            solicitud, 'luisgr1990', 'secreto', '614 66 53 54', 'ES00 0000')),
+    ]
+
+    # Calentamiento: importaciones perezosas de ReportLab y fuentes base
+    for _, funcion in documentos:
+        funcion()
+
+    print(f"Repeticiones por documento: {repeticiones}")
+    print(f"{'Documento':<26}{'sin caché (ms)':>16}{'con caché (ms)':>16}{'sin/con':>10}")
+    for nombre, funcion in documentos:
+        sin_cache = _medir(funcion, repeticiones, vaciar_cache=True)
+        informes.precargar()
+        con_cache = _medir(funcion, repeticiones, vaciar_cache=False)
+        print(f"{nombre:<26}{sin_cache:>16.2f}{con_cache:>16.2f}{sin_cache / con_cache:>9.1f}x")
+
+    # Coste que post_fork saca del camino de la petición
+    preparacion = _medir(informes.precargar, repeticiones, vaciar_cache=True)
+    print(f"\nPreparación de estilos y logos (una vez por worker): {preparacion:.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,12 +1,17 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, abort
 from flask_login import login_required, current_user
 from models import Actividad, Inscripcion, Beneficiario, db
 from datetime import datetime
+from services.versiones import condicional
+from services import plazas
+
+MAX_IDS_PLAZAS = 50
 
 actividades_bp = Blueprint('actividades', __name__)
 
 @actividades_bp.route('/<int:actividad_id>')
 @login_required
+@condicional('actividades', 'inscripciones', 'beneficiarios', 'users')
 def detalle_actividad(actividad_id):
     actividad = Actividad.query.get_or_404(actividad_id)
     
@@ -25,3 +30,35 @@ def detalle_actividad(actividad_id):
                          inscripciones_actividad=inscripciones_actividad,
                          beneficiarios=beneficiarios,
                          ahora=datetime.utcnow())
+
+
+def _respuesta_plazas(datos):
+    respuesta = jsonify(datos)
+    respuesta.headers['Cache-Control'] = f'private, max-age={plazas.MAX_AGE}'
+    respuesta.add_etag()
+    return respuesta.make_conditional(request)
+
+
+@actividades_bp.route('/<int:actividad_id>/plazas')
+@login_required
+def plazas_actividad(actividad_id):
+    """{plazas_disponibles, bloqueada, ts} de una actividad"""
+    datos = plazas.consultar([actividad_id]).get(str(actividad_id))
+    if datos is None:
+        abort(404)
+    return _respuesta_plazas(datos)
+
+
+@actividades_bp.route('/plazas')
+@login_required
+def plazas_actividades():
+    """{id: {plazas_disponibles, bloqueada, ts}} de varias actividades (?ids=1,2,3)"""
+    ids = []
+    for valor in request.args.get('ids', '').split(','):
+        valor = valor.strip()
+        # isdecimal y no isdigit: '²' es un dígito pero int() no lo acepta
+        if valor.isdecimal() and int(valor) not in ids:
+            ids.append(int(valor))
+    if not ids or len(ids) > MAX_IDS_PLAZAS:
+        abort(400)
+    return _respuesta_plazas(plazas.consultar(ids))
@@ -1,14 +1,11 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, make_response, current_app, abort
+from flask import Blueprint, render_template, request, redirect, url_for, flash, make_response, current_app, abort, jsonify
 from flask_login import login_user, logout_user, login_required, current_user
 from models import User, SolicitudSocio, BeneficiarioSolicitud, db
 from datetime import datetime
-from io import BytesIO
-from reportlab.lib.pagesizes import A4
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import cm
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-from reportlab.lib import colors
-from reportlab.lib.enums import TA_CENTER, TA_LEFT
+from services import informes, galerias, estaticos, critico, telefonos, contrasenas, limites
+from services.cache_paginas import cachear
+from services.limites import limitar
+from sqlalchemy.exc import IntegrityError
 import re
 import unicodedata
 import os
@@ -39,100 +36,85 @@ def quitar_acentos(texto):
     # Convertir a mayúsculas
     return texto.upper()
 
+def _variante_portada():
+    """La portada se cachea por separado con y sin el CSS crítico incrustado"""
+    return 'critico' if critico.css_critico('portada') else 'normal'
+
+
 @auth_bp.route('/login')
+@cachear(variante=_variante_portada)
 def login():
     """Página principal/portada sin formulario de login"""
     return render_template('auth/login.html')
 
 
 @auth_bp.route('/galeria/<seccion>')
+@cachear()
 def galeria(seccion):
     """Galerías de fotos de las fiestas (Nuestras Fiestas)"""
-    # Configuración de las secciones disponibles
-    secciones_config = {
-        'nuevo-parque': {
-            'titulo': 'Nuevo Parque',
-            'icono': 'bi bi-tree-fill',
-            'carpetas': ['inauguracion-parque'],
-        },
-        # Alias para que también funcione si se usa la carpeta como slug en la URL
-        'inauguracion-parque': {
-            'titulo': 'Nuevo Parque',
-            'icono': 'bi bi-tree-fill',
-            'carpetas': ['inauguracion-parque'],
-        },
-        'navidad': {
-            'titulo': 'El Barrio de la Navidad',
-            'icono': 'bi bi-snow',
-            'carpetas': ['navidad'],
-        },
-        'ferias-y-fiestas': {
-            'titulo': 'Ferias y Fiestas',
-            'icono': 'bi bi-calendar-event',
-            # Ferias y Fiestas incluirá también las fotos de Semana Cultural
-            'carpetas': ['ferias-y-fiestas', 'semanacultural'],
-        },
-        'halloween': {
-            'titulo': 'Halloween',
-            'icono': 'bi bi-ghost',
-            'carpetas': ['halloween'],
-        },
-        'cabalgata': {
-            'titulo': 'Cabalgata',
-            'icono': 'bi bi-truck',
-            'carpetas': ['cabalgata'],
-        },
-        'estrellas': {
-            'titulo': 'Estrellas',
-            'icono': 'bi bi-stars',
-            'carpetas': ['estrellas'],
-        },
-        'concetracionmotera': {
-            'titulo': 'Concentración Motera',
-            'icono': 'bi bi-flag',
-            'carpetas': ['concetracionmotera'],
-            'tipo': 'video',
-        },
-    }
-    
-    config = secciones_config.get(seccion)
-    if not config:
+    # El contenido de las carpetas sale del manifiesto cacheado (services/galerias.py)
+    datos = galerias.galeria(current_app, seccion)
+    if datos is None:
         abort(404)
     
-    imagenes = []
-    video_file = None
-    
-    # Cada sección puede usar una o varias carpetas físicas dentro de static/galerias
-    carpetas = config.get('carpetas', [seccion])
-    
-    video_extensiones = ('.mp4', '.webm', '.ogg', '.mov', '.m4v')
-    imagen_extensiones = ('.jpg', '.jpeg', '.png', '.gif', '.webp')
-    
-    for carpeta in carpetas:
-        galeria_dir = os.path.join(current_app.static_folder, 'galerias', carpeta)
-        if os.path.isdir(galeria_dir):
-            for nombre in os.listdir(galeria_dir):
-                ruta_completa = os.path.join(galeria_dir, nombre)
-                if not os.path.isfile(ruta_completa):
-                    continue
-                
-                nombre_lower = nombre.lower()
-                if nombre_lower.endswith(imagen_extensiones):
-                    imagenes.append(f'galerias/{carpeta}/{nombre}')
-                elif nombre_lower.endswith(video_extensiones) and video_file is None:
-                    video_file = f'galerias/{carpeta}/{nombre}'
-    
-    imagenes.sort()
-    
+    # Solo se pinta la primera página; el resto llega desde galeria_api al hacer scroll
+    imagenes, siguiente = galerias.pagina(datos)
     return render_template(
         'auth/galeria.html',
         seccion=seccion,
-        config=config,
+        config=datos['config'],
         imagenes=imagenes,
-        video=video_file,
+        siguiente=siguiente,
+        total=len(datos['imagenes']),
+        video=datos['video'],
     )
 
+
+def _srcset(imagen, formato):
+    versiones = imagen['versiones']
+    return ', '.join(f"{url_for('static', filename=versiones[t][formato])} {versiones[t]['ancho']}w"
+                     for t in ('miniatura', 'media'))
+
+
+def _imagen_json(imagen):
+    """Datos de una foto para construir su miniatura y su diapositiva en el navegador"""
+    original = estaticos.url_for_estatico('static', filename=imagen['ruta'])
+    datos = {
+        'original': original,
+        'ancho': imagen['ancho'],
+        'alto': imagen['alto'],
+        'miniatura': original,
+        'media': original,
+        'srcset': None,
+        'srcset_webp': None,
+    }
+    if imagen.get('versiones'):
+        versiones = imagen['versiones']
+        datos['miniatura'] = url_for('static', filename=versiones['miniatura']['jpg'])
+        datos['media'] = url_for('static', filename=versiones['media']['jpg'])
+        datos['srcset'] = _srcset(imagen, 'jpg')
+        if 'webp' in versiones['miniatura']:
+            datos['srcset_webp'] = _srcset(imagen, 'webp')
+    return datos
+
+
+@auth_bp.route('/galeria/<seccion>/api')
+def galeria_api(seccion):
+    """Páginas de fotos de una galería en JSON (scroll infinito)"""
+    datos = galerias.galeria(current_app, seccion)
+    if datos is None:
+        abort(404)
+    imagenes, siguiente = galerias.pagina(datos, request.args.get('cursor'))
+    respuesta = jsonify({
+        'imagenes': [_imagen_json(imagen) for imagen in imagenes],
+        'siguiente': siguiente,
+        'total': len(datos['imagenes']),
+    })
+    respuesta.headers['Cache-Control'] = 'public, max-age=300'
+    return respuesta
+
 @auth_bp.route('/acceso-socios', methods=['GET', 'POST'])
+@limitar('acceso_ip', 'acceso_usuario', solo_fallos=('acceso_usuario',))
 def acceso_socios():
     """Página dedicada para el acceso de socios"""
     if current_user.is_authenticated:
@@ -152,6 +134,14 @@ def acceso_socios():
         user = User.query.filter_by(nombre_usuario=nombre_usuario).first()
         
         if user and user.check_password(password):
+            # Hash hecho con otra política (más cara o más barata): se rehace con la actual
+            if contrasenas.necesita_rehash(user.password_hash):
+                try:
+                    user.set_password(password)
+                    db.session.commit()
+                except Exception as e:
+                    db.session.rollback()
+                    print(f"[WARNING] No se pudo actualizar el hash de {user.nombre_usuario}: {e}")
             login_user(user)
             flash(f'¡Bienvenido/a, {user.nombre}!', 'success')
             
@@ -161,6 +151,7 @@ def acceso_socios():
             else:
                 return redirect(url_for('socios.dashboard'))
         else:
+            limites.fallo('acceso_usuario')
             flash('Nombre de usuario o contraseña incorrectos.', 'error')
     
     return render_template('auth/acceso_socios.html')
@@ -350,6 +341,8 @@ def logout():
     return redirect(url_for('auth.login'))
 
 @auth_bp.route('/hazte-socio', methods=['GET', 'POST'])
+@cachear()
+@limitar('hazte_socio_ip')
 def hazte_socio():
     if request.method == 'POST':
         nombre = request.form.get('nombre', '').strip()
@@ -445,16 +438,9 @@ def hazte_socio():
         # Normalizar movil2 (vacío si no se proporciona)
         movil2 = movil2 if movil2 else None
         
-        # Verificar que los teléfonos no estén duplicados en el sistema
+        # Verificar que los teléfonos no estén duplicados en el sistema (índice de la tabla telefonos)
         # Verificar móvil principal
-        movil_existente = SolicitudSocio.query.filter(
-            db.or_(
-                SolicitudSocio.movil == movil,
-                SolicitudSocio.movil2 == movil
-            )
-        ).first()
-        
-        if movil_existente:
+        if telefonos.registrado(movil):
             flash('Ya hay un usuario registrado con este número de teléfono. Contacta con la asociación si crees que es un error.', 'error')
             from datetime import datetime as dt
             año_actual = datetime.now().year
@@ -462,14 +448,7 @@ def hazte_socio():
         
         # Verificar móvil2 si está presente
         if movil2:
-            movil2_existente = SolicitudSocio.query.filter(
-                db.or_(
-                    SolicitudSocio.movil == movil2,
-                    SolicitudSocio.movil2 == movil2
-                )
-            ).first()
-            
-            if movil2_existente:
+            if telefonos.registrado(movil2):
                 flash('El segundo número de teléfono ya está registrado en el sistema. Por favor, utiliza otro número.', 'error')
                 from datetime import datetime as dt
                 año_actual = datetime.now().year
@@ -504,8 +483,19 @@ def hazte_socio():
         )
         
         db.session.add(solicitud)
+        telefonos.asignar(solicitud)
         try:
             db.session.flush()  # Para obtener el ID de la solicitud
+        except IntegrityError as e:
+            # Otra solicitud con el mismo número se ha guardado entre la comprobación y ahora
+            db.session.rollback()
+            if telefonos.es_duplicado(e):
+                flash('Ya hay un usuario registrado con este número de teléfono. Contacta con la asociación si crees que es un error.', 'error')
+            else:
+                flash(f'Error al crear la solicitud: {str(e)}', 'error')
+            from datetime import datetime as dt
+            año_actual = datetime.now().year
+            return render_template('auth/hazte_socio.html', datetime=dt, current_year=año_actual)
         except Exception as e:
             db.session.rollback()
             flash(f'Error al crear la solicitud: {str(e)}', 'error')
@@ -696,148 +686,7 @@ def confirmacion_solicitud_pdf(token):
     password = solicitud.password_solicitud if solicitud.password_solicitud else 'No especificada'
     
     try:
-        buffer = BytesIO()
-        doc = SimpleDocTemplate(buffer, pagesize=A4, 
-                                rightMargin=2*cm, leftMargin=2*cm,
-                                topMargin=2*cm, bottomMargin=2*cm)
-        
-        styles = getSampleStyleSheet()
-        title_style = ParagraphStyle(
-            'CustomTitle',
-            parent=styles['Heading1'],
-            fontSize=18,
-            textColor=colors.HexColor('#333333'),
-            spaceAfter=30,
-            alignment=TA_CENTER
-        )
-        
-        normal_style = styles['Normal']
-        heading_style = styles['Heading2']
-        bold_style = ParagraphStyle(
-            'BoldStyle',
-            parent=normal_style,
-            fontSize=11,
-            fontName='Helvetica-Bold'
-        )
-        
-        story = []
-        
-        # Título
-        story.append(Paragraph("Confirmación de Solicitud de Socio", title_style))
-        story.append(Paragraph(f"Asociación de Vecinos de Montealto", 
-                              ParagraphStyle('Subtitle', parent=normal_style, 
-                                           fontSize=12, textColor=colors.grey, 
-                                           alignment=TA_CENTER)))
-        story.append(Spacer(1, 0.5*cm))
-        
-        # Información de pago
-        story.append(Paragraph("Información de Pago", heading_style))
-        story.append(Spacer(1, 0.2*cm))
-        
-        forma_pago_texto = "Bizum" if solicitud.forma_de_pago == 'bizum' else ("Transferencia" if solicitud.forma_de_pago == 'transferencia' else ("Efectivo" if solicitud.forma_de_pago == 'efectivo' else "Contado"))
-        story.append(Paragraph(f"Forma de pago elegida: {forma_pago_texto}", normal_style))
-        
-        if solicitud.forma_de_pago == 'bizum':
-            story.append(Paragraph(f"Realiza el Bizum de 20€ al número: {NUMERO_BIZUM}", normal_style))
-            story.append(Paragraph(f"Concepto: {nombre_usuario}", normal_style))
-        elif solicitud.forma_de_pago == 'transferencia':
-            story.append(Paragraph(f"Realiza la transferencia de 20€ a la cuenta: {NUMERO_CUENTA}", normal_style))
-            story.append(Paragraph(f"Concepto: {nombre_usuario}", normal_style))
-        elif solicitud.forma_de_pago == 'efectivo':
-            story.append(Paragraph("Una vez completado el formulario, diríjete a la asociación para formalizar la inscripción.", normal_style))
-        
-        story.append(Spacer(1, 0.3*cm))
-        
-        # Credenciales de acceso
-        story.append(Paragraph("Credenciales de Acceso", heading_style))
-        story.append(Spacer(1, 0.2*cm))
-        story.append(Paragraph(f"Nombre de Usuario: {nombre_usuario}", normal_style))
-        story.append(Paragraph(f"Contraseña: {password}", normal_style))
-        story.append(Spacer(1, 0.3*cm))
-        
-        # Datos del socio
-        story.append(Paragraph("Datos del Socio", heading_style))
-        story.append(Spacer(1, 0.2*cm))
-        
-        # Crear tabla con los datos del socio usando Paragraph para las etiquetas
-        nombre_completo = f"{solicitud.nombre} {solicitud.primer_apellido}"
-        if solicitud.segundo_apellido:
-            nombre_completo += f" {solicitud.segundo_apellido}"
-        
-        # Formatear fecha de nacimiento
-        fecha_nacimiento_str = solicitud.fecha_nacimiento.strftime('%d/%m/%Y') if solicitud.fecha_nacimiento else 'No especificada'
-        
-        datos_socio = [
-            [Paragraph("Nombre:", bold_style), Paragraph(nombre_completo, normal_style)],
-            [Paragraph("Móvil:", bold_style), Paragraph(solicitud.movil, normal_style)],
-            [Paragraph("Fecha de Nacimiento:", bold_style), Paragraph(fecha_nacimiento_str, normal_style)],
-            [Paragraph("Miembros de la Unidad Familiar:", bold_style), Paragraph(str(solicitud.miembros_unidad_familiar), normal_style)],
-            [Paragraph("Fecha de Solicitud:", bold_style), Paragraph(solicitud.fecha_solicitud.strftime('%d/%m/%Y %H:%M') if solicitud.fecha_solicitud else 'No especificada', normal_style)],
-        ]
-        
-        # Agregar dirección si está disponible
-        if solicitud.calle and solicitud.numero and solicitud.poblacion:
-            direccion = f"{solicitud.calle} {solicitud.numero}"
-            if solicitud.piso:
-                direccion += f", {solicitud.piso}"
-            direccion += f", {solicitud.poblacion}"
-            datos_socio.append([Paragraph("Dirección:", bold_style), Paragraph(direccion, normal_style)])
-        
-        table_socio = Table(datos_socio, colWidths=[6*cm, 10*cm])
-        table_socio.setStyle(TableStyle([
-            ('ALIGN', (0, 0), (0, -1), 'LEFT'),
-            ('ALIGN', (1, 0), (1, -1), 'LEFT'),
-            ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-            ('FONTSIZE', (0, 0), (-1, -1), 10),
-            ('LEFTPADDING', (0, 0), (-1, -1), 5),
-            ('RIGHTPADDING', (0, 0), (-1, -1), 5),
-            ('TOPPADDING', (0, 0), (-1, -1), 5),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 5),
-        ]))
-        story.append(table_socio)
-        
-        # Beneficiarios
-        if solicitud.beneficiarios:
-            story.append(Spacer(1, 0.3*cm))
-            story.append(Paragraph("Beneficiarios", heading_style))
-            story.append(Spacer(1, 0.2*cm))
-            
-            datos_beneficiarios = [
-                [Paragraph("Nombre", bold_style), Paragraph("Primer Apellido", bold_style), 
-                 Paragraph("Segundo Apellido", bold_style), Paragraph("Año Nacimiento", bold_style)]
-            ]
-            
-            for beneficiario in solicitud.beneficiarios:
-                datos_beneficiarios.append([
-                    Paragraph(beneficiario.nombre, normal_style),
-                    Paragraph(beneficiario.primer_apellido, normal_style),
-                    Paragraph(beneficiario.segundo_apellido or '', normal_style),
-                    Paragraph(str(beneficiario.ano_nacimiento), normal_style)
-                ])
-            
-            table_beneficiarios = Table(datos_beneficiarios, colWidths=[4*cm, 4*cm, 4*cm, 4*cm])
-            table_beneficiarios.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#E0E0E0')),
-                ('TEXTCOLOR', (0, 0), (-1, 0), colors.black),
-                ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                ('FONTSIZE', (0, 0), (-1, 0), 10),
-                ('FONTSIZE', (0, 1), (-1, -1), 9),
-                ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-                ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-                ('GRID', (0, 0), (-1, -1), 1, colors.black),
-                ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#f9f9f9')]),
-            ]))
-            story.append(table_beneficiarios)
-        
-        # Nota final
-        story.append(Spacer(1, 0.5*cm))
-        nota_style = ParagraphStyle('Nota', parent=normal_style, fontSize=9, textColor=colors.grey, alignment=TA_CENTER, fontName='Helvetica-Oblique')
-        story.append(Paragraph("Una vez realizado el pago, el equipo de tesorería de la asociación lo comprobará y te dará la confirmidad en breve.", nota_style))
-        
-        doc.build(story)
-        buffer.seek(0)
-        pdf_bytes = buffer.read()
+        pdf_bytes = informes.pdf_confirmacion_solicitud(solicitud, nombre_usuario, password, NUMERO_BIZUM, NUMERO_CUENTA)
         
     except Exception as e:
         flash(f'No se pudo generar el PDF: {str(e)}', 'error')
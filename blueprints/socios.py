@@ -1,53 +1,27 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, make_response, current_app
+from flask import Blueprint, render_template, request, redirect, url_for, flash, make_response
 from flask_login import login_required, current_user
 from models import User, Actividad, Inscripcion, Beneficiario, db
 from datetime import datetime, timedelta
-from io import BytesIO
-from reportlab.lib.pagesizes import A4
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import cm
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, Image, PageTemplate, Frame
-from reportlab.pdfgen import canvas
-from reportlab.lib import colors
-from reportlab.lib.enums import TA_CENTER, TA_LEFT
-import os
+from services import informes, panel_socio, verificacion
+from services.versiones import condicional
 
 socios_bp = Blueprint('socios', __name__)
 
 @socios_bp.route('/dashboard')
 @login_required
+@condicional('actividades', 'inscripciones', 'beneficiarios', 'users')
 def dashboard():
     if not current_user.is_socio():
         flash('No tienes permisos para acceder a esta página.', 'error')
         return redirect(url_for('admin.dashboard'))
     
-    # Todas las actividades disponibles
-    actividades_disponibles = Actividad.query.filter(
-        Actividad.fecha > datetime.utcnow()
-    ).order_by(Actividad.fecha).all()
-    
-    # Obtener todas las inscripciones del socio (suyas y de sus beneficiarios)
-    inscripciones = Inscripcion.query.filter_by(user_id=current_user.id).all()
-    
-    # Obtener actividades únicas de las inscripciones
-    actividades_ids = {insc.actividad_id for insc in inscripciones}
-    actividades_inscrito = Actividad.query.filter(Actividad.id.in_(actividades_ids)).order_by(Actividad.fecha).all()
-    
-    # Crear un diccionario de inscripciones por actividad
-    inscripciones_por_actividad = {}
-    for insc in inscripciones:
-        if insc.actividad_id not in inscripciones_por_actividad:
-            inscripciones_por_actividad[insc.actividad_id] = []
-        inscripciones_por_actividad[insc.actividad_id].append(insc)
-    
-    # Cargar beneficiarios del socio
-    beneficiarios = Beneficiario.query.filter_by(socio_id=current_user.id).order_by(Beneficiario.nombre).all()
+    # Actividades, familia y a quién se puede inscribir en cada una (dos consultas)
+    panel = panel_socio.datos(current_user)
     
     return render_template('socios/dashboard.html',
-                         actividades_disponibles=actividades_disponibles,
-                         actividades_inscrito=actividades_inscrito,
-                         inscripciones_por_actividad=inscripciones_por_actividad,
-                         beneficiarios=beneficiarios)
+                         actividades_disponibles=panel['proximas'],
+                         actividades_inscrito=panel['inscritas'],
+                         familia=panel['familia'])
 
 @socios_bp.route('/perfil')
 @login_required
@@ -60,6 +34,7 @@ def perfil():
 
 @socios_bp.route('/actividades')
 @login_required
+@condicional('actividades', 'inscripciones', 'beneficiarios', 'users')
 def actividades():
     if not current_user.is_socio():
         flash('No tienes permisos para acceder a esta página.', 'error')
@@ -240,29 +215,22 @@ def cancelar_inscripcion(actividad_id):
 
 @socios_bp.route('/mis-actividades')
 @login_required
+@condicional('actividades', 'inscripciones', 'beneficiarios', 'users')
 def mis_actividades():
     if not current_user.is_socio():
         flash('No tienes permisos para acceder a esta página.', 'error')
         return redirect(url_for('admin.dashboard'))
     
-    # Obtener todas las inscripciones del socio (suyas y de sus beneficiarios)
-    inscripciones = Inscripcion.query.filter_by(user_id=current_user.id).all()
-    
-    # Obtener actividades únicas de las inscripciones
-    actividades_ids = {insc.actividad_id for insc in inscripciones}
-    actividades_inscrito = Actividad.query.filter(Actividad.id.in_(actividades_ids)).order_by(Actividad.fecha).all()
-    
-    # Crear un diccionario de inscripciones por actividad
-    inscripciones_por_actividad = {}
-    for insc in inscripciones:
-        if insc.actividad_id not in inscripciones_por_actividad:
-            inscripciones_por_actividad[insc.actividad_id] = []
-        inscripciones_por_actividad[insc.actividad_id].append(insc)
+    # Próximas actividades de la familia y una página del historial (por cursor, de la más reciente)
+    cursor = request.args.get('antes')
+    proximas = [] if cursor else panel_socio.datos(current_user)['inscritas']
+    pasadas, siguiente = panel_socio.historial(current_user, cursor)
     
     return render_template('socios/mis_actividades.html', 
-                         actividades=actividades_inscrito,
-                         inscripciones_por_actividad=inscripciones_por_actividad,
-                         ahora=datetime.utcnow())
+                         proximas=proximas,
+                         pasadas=pasadas,
+                         siguiente=siguiente,
+                         cursor=cursor)
 
 @socios_bp.route('/descargar-carnet')
 @login_required
@@ -276,128 +244,8 @@ def descargar_carnet():
     beneficiarios = Beneficiario.query.filter_by(socio_id=current_user.id).order_by(Beneficiario.nombre).all()
     
     try:
-        buffer = BytesIO()
-        
-        # Función para dibujar el fondo azul - se ejecutará en cada página
-        def add_background(canvas, doc):
-            # Dibujar el fondo azul que cubre toda la página
-            canvas.saveState()
-            canvas.setFillColor(colors.HexColor('#E3F2FD'))
-            canvas.rect(0, 0, A4[0], A4[1], fill=1, stroke=0)
-            canvas.restoreState()
-        
-        doc = SimpleDocTemplate(buffer, pagesize=A4, 
-                                rightMargin=2*cm, leftMargin=2*cm,
-                                topMargin=1*cm, bottomMargin=2*cm,
-                                onFirstPage=add_background,
-                                onLaterPages=add_background)
-        
-        styles = getSampleStyleSheet()
-        title_style = ParagraphStyle(
-            'CustomTitle',
-            parent=styles['Heading1'],
-            fontSize=20,
-            textColor=colors.HexColor('#333333'),
-            spaceAfter=20,
-            alignment=TA_CENTER,
-            fontName='Helvetica-Bold'
-        )
-        
-        normal_style = styles['Normal']
-        bold_style = ParagraphStyle(
-            'BoldStyle',
-            parent=normal_style,
-            fontSize=11,
-            fontName='Helvetica-Bold'
-        )
-        
-        story = []
-        
-        # Logo del carnet
-        logo_path = os.path.join(current_app.root_path, 'static', 'logo_carnet.jpg')
-        if os.path.exists(logo_path):
-            logo = Image(logo_path, width=300, height=200)
-            logo.hAlign = 'CENTER'
-            story.append(logo)
-            story.append(Spacer(1, 0.5*cm))
-        
-        # Título con año en curso
-        año_actual = datetime.now().year
-        story.append(Paragraph(f"CARNET DE SOCIO {año_actual}", title_style))
-        story.append(Spacer(1, 0.5*cm))
-        
-        # Datos del socio
-        story.append(Paragraph("Datos del Socio", bold_style))
-        story.append(Spacer(1, 0.2*cm))
-        
-        # Crear tabla con los datos del socio
-        fecha_validez_str = current_user.fecha_validez.strftime('%d/%m/%Y') if current_user.fecha_validez else 'No especificada'
-        datos_socio = [
-            [Paragraph("Nombre:", bold_style), Paragraph(current_user.nombre, normal_style)],
-            [Paragraph("Número de Socio:", bold_style), Paragraph(current_user.numero_socio or 'No asignado', normal_style)],
-            [Paragraph("Fecha de Alta:", bold_style), Paragraph(current_user.fecha_alta.strftime('%d/%m/%Y') if current_user.fecha_alta else 'No especificada', normal_style)],
-            [Paragraph("Válido hasta:", bold_style), Paragraph(fecha_validez_str, bold_style)],
-        ]
-        
-        # Agregar dirección si está disponible
-        if current_user.calle and current_user.numero and current_user.poblacion:
-            direccion = f"{current_user.calle} {current_user.numero}"
-            if current_user.piso:
-                direccion += f", {current_user.piso}"
-            direccion += f", {current_user.poblacion}"
-            datos_socio.append([Paragraph("Dirección:", bold_style), Paragraph(direccion, normal_style)])
-        
-        table_socio = Table(datos_socio, colWidths=[5*cm, 11*cm])
-        table_socio.setStyle(TableStyle([
-            ('ALIGN', (0, 0), (0, -1), 'LEFT'),
-            ('ALIGN', (1, 0), (1, -1), 'LEFT'),
-            ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-            ('FONTSIZE', (0, 0), (-1, -1), 10),
-            ('LEFTPADDING', (0, 0), (-1, -1), 5),
-            ('RIGHTPADDING', (0, 0), (-1, -1), 5),
-            ('TOPPADDING', (0, 0), (-1, -1), 5),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 5),
-        ]))
-        story.append(table_socio)
-        
-        # Beneficiarios
-        if beneficiarios:
-            story.append(Spacer(1, 0.5*cm))
-            story.append(Paragraph("Beneficiarios", bold_style))
-            story.append(Spacer(1, 0.2*cm))
-            
-            datos_beneficiarios = [
-                [Paragraph("Nombre", bold_style), Paragraph("Primer Apellido", bold_style), 
-                 Paragraph("Segundo Apellido", bold_style), Paragraph("Año Nacimiento", bold_style)]
-            ]
-            
-            for beneficiario in beneficiarios:
-                datos_beneficiarios.append([
-                    Paragraph(beneficiario.nombre, normal_style),
-                    Paragraph(beneficiario.primer_apellido, normal_style),
-                    Paragraph(beneficiario.segundo_apellido or '', normal_style),
-                    Paragraph(str(beneficiario.ano_nacimiento), normal_style)
-                ])
-            
-            table_beneficiarios = Table(datos_beneficiarios, colWidths=[4*cm, 4*cm, 4*cm, 4*cm])
-            table_beneficiarios.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#E0E0E0')),
-                ('TEXTCOLOR', (0, 0), (-1, 0), colors.black),
-                ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                ('FONTSIZE', (0, 0), (-1, 0), 10),
-                ('FONTSIZE', (0, 1), (-1, -1), 9),
-                ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-                ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-                ('GRID', (0, 0), (-1, -1), 1, colors.black),
-                ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#f9f9f9')]),
-            ]))
-            story.append(table_beneficiarios)
-        
-        # Construir el PDF - el callback dibujará el fondo en cada página
-        doc.build(story)
-        buffer.seek(0)
-        pdf_bytes = buffer.read()
+        pdf_bytes = informes.pdf_carnet(informes.datos_carnet(
+            current_user, beneficiarios, qr=verificacion.url_verificacion(current_user.id)))
         
     except Exception as e:
         flash(f'No se pudo generar el carnet: {str(e)}', 'error')
@@ -0,0 +1,60 @@
+"""
+Script para generar los archivos estáticos con huella de contenido
+
+Primero prepara Bootstrap y Bootstrap Icons en static/vendor: los descarga
+una vez a instance/librerias, quita el CSS que no usan nuestras plantillas
+y recorta la fuente de iconos a los bi-* que aparecen en el código (ver
+services/librerias.py). Después copia CSS/JS/SVG/fuentes a static/dist con
+el hash en el nombre, crea sus versiones .gz/.br y escribe
+static/dist/manifest.json (ver services/estaticos.py). Por último genera el
+CSS crítico de la portada (services/critico.py). Ejecutar en cada despliegue, antes de reiniciar
+gunicorn, y después de subir fotos o imágenes nuevas a static/.
+
+Uso:
+    python construir_estaticos.py
+    python construir_estaticos.py --sin-librerias   # no tocar static/vendor
+    python construir_estaticos.py --cache DIR       # otra carpeta con los originales de las librerías
+"""
+import argparse
+import os
+
+from services import critico, estaticos, librerias
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+STATIC_DIR = os.path.join(BASE_DIR, 'static')
+INSTANCE_DIR = os.path.join(BASE_DIR, 'instance')
+CACHE_LIBRERIAS = os.path.join(INSTANCE_DIR, 'librerias')
+
+
+def _kb(n):
+    return f"{n / 1024:.1f} KB"
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Genera los archivos estáticos con huella de contenido')
+    parser.add_argument('--sin-librerias', action='store_true', help='No regenerar Bootstrap y Bootstrap Icons en static/vendor')
+    parser.add_argument('--cache', default=CACHE_LIBRERIAS, help='Carpeta donde se descargan los originales de las librerías')
+    args = parser.parse_args()
+
+    if not args.sin_librerias:
+        resumen = librerias.construir(BASE_DIR, STATIC_DIR, args.cache)
+        if resumen is None:
+            print("[WARNING] Faltan archivos de las librerías; las páginas seguirán usando el CDN")
+        else:
+            print(f"[INFO] bootstrap.min.css: {_kb(resumen['bootstrap_css'][0])} -> {_kb(resumen['bootstrap_css'][1])}")
+            print(f"[INFO] bootstrap-icons.css: {_kb(resumen['iconos_css'][0])} -> {_kb(resumen['iconos_css'][1])} "
+                  f"({resumen['iconos']} iconos)")
+            print(f"[INFO] bootstrap-icons.woff2: {_kb(resumen['fuente'][0])} -> {_kb(resumen['fuente'][1])}")
+
+    if not estaticos.BROTLI_AVAILABLE:
+        print("[WARNING] brotli no está instalado. Solo se generarán las versiones .gz.")
+    manifiesto, nuevas = estaticos.construir(STATIC_DIR)
+    con_huella = sum(1 for entrada in manifiesto.values() if entrada['v'] is None)
+    print(f"[INFO] {len(manifiesto)} archivo(s) en el manifiesto, {con_huella} copiado(s) a dist/ ({nuevas} nuevo(s))")
+
+    for pagina, tamano in critico.generar(BASE_DIR, STATIC_DIR, INSTANCE_DIR, manifiesto).items():
+        print(f"[INFO] CSS crítico de {pagina}: {_kb(tamano)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -35,9 +35,19 @@ limit_request_field_size = 8190
 # Configuración de threads (si se usa worker_class = "gthread")
 # threads = 2
 
-
-
-
-
-
-
+def post_fork(server, worker):
+    """Precarga en cada worker los estilos y logos usados en los PDFs"""
+    try:
+        from services.informes import precargar
+        precargar()
+    except Exception as e:
+        server.log.warning(f"No se pudieron precargar los recursos de PDF: {e}")
+
+
+def worker_exit(server, worker):
+    """Guarda las métricas que el worker aún no había volcado (max_requests lo recicla)"""
+    try:
+        from services.metricas import volcar
+        volcar()
+    except Exception as e:
+        server.log.warning(f"No se pudieron guardar las métricas del worker: {e}")
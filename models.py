@@ -1,6 +1,6 @@
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
-from werkzeug.security import generate_password_hash, check_password_hash
+from services import contrasenas
 from datetime import datetime, timedelta
 
 # Inicializar SQLAlchemy aquí
@@ -24,6 +24,10 @@ class User(UserMixin, db.Model):
     numero = db.Column(db.String(20), nullable=True)
     piso = db.Column(db.String(20), nullable=True)  # Opcional
     poblacion = db.Column(db.String(100), nullable=True)
+    forma_de_pago = db.Column(db.String(20), nullable=True)  # 'bizum', 'transferencia', 'efectivo' (para las renovaciones)
+    
+    # Socios vencidos / por vencer: rango sobre fecha_validez dentro de un rol (ver services/vencimientos.py)
+    __table_args__ = (db.Index('ix_users_rol_fecha_validez', 'rol', 'fecha_validez'),)
     
     # Relaciones
     inscripciones = db.relationship('Inscripcion', backref='usuario', lazy=True, cascade='all, delete-orphan')
@@ -36,12 +40,12 @@ class User(UserMixin, db.Model):
         return año_actual - self.ano_nacimiento
     
     def set_password(self, password):
-        """Hash y guarda la contraseña"""
-        self.password_hash = generate_password_hash(password)
+        """Hash y guarda la contraseña (con la política de PASSWORD_HASH, ver services/contrasenas.py)"""
+        self.password_hash = contrasenas.generar(password)
     
     def check_password(self, password):
         """Verifica la contraseña"""
-        return check_password_hash(self.password_hash, password)
+        return contrasenas.comprobar(self.password_hash, password)
     
     def is_directiva(self):
         """Verifica si el usuario es de la directiva"""
@@ -65,11 +69,12 @@ class User(UserMixin, db.Model):
 
 class Actividad(db.Model):
     __tablename__ = 'actividades'
+    __table_args__ = {'sqlite_autoincrement': True}  # Ids sin reutilizar: las archivadas conservan el suyo (services/archivo.py)
     
     id = db.Column(db.Integer, primary_key=True)
     nombre = db.Column(db.String(200), nullable=False)
     descripcion = db.Column(db.Text, nullable=True)
-    fecha = db.Column(db.DateTime, nullable=False)
+    fecha = db.Column(db.DateTime, nullable=False, index=True)
     aforo_maximo = db.Column(db.Integer, nullable=False)
     edad_minima = db.Column(db.Integer, nullable=True)  # Edad mínima requerida (None = sin restricción)
     edad_maxima = db.Column(db.Integer, nullable=True)  # Edad máxima permitida (None = sin restricción)
@@ -134,12 +139,15 @@ class Inscripcion(db.Model):
     beneficiario_id = db.Column(db.Integer, db.ForeignKey('beneficiarios.id'), nullable=True)  # Opcional: si es inscripción de beneficiario
     fecha_inscripcion = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
     asiste = db.Column(db.Boolean, nullable=False, default=False)  # Campo para marcar asistencia
+    asistencia_actualizada = db.Column(db.DateTime, nullable=True)  # Último cambio de asistencia (control de conflictos)
     
     # Relaciones
     beneficiario = db.relationship('Beneficiario', backref='inscripciones')
     
     # Restricción única: un usuario o beneficiario solo puede inscribirse una vez por actividad
-    __table_args__ = (db.UniqueConstraint('user_id', 'actividad_id', 'beneficiario_id', name='unique_inscripcion'),)
+    # ix_inscripciones_user_actividad: actividades de una familia (panel e historial del socio)
+    __table_args__ = (db.UniqueConstraint('user_id', 'actividad_id', 'beneficiario_id', name='unique_inscripcion'),
+                      db.Index('ix_inscripciones_user_actividad', 'user_id', 'actividad_id'))
     
     def __repr__(self):
         if self.beneficiario_id:
@@ -170,6 +178,7 @@ class SolicitudSocio(db.Model):
     
     # Relaciones
     beneficiarios = db.relationship('BeneficiarioSolicitud', backref='solicitud', lazy=True, cascade='all, delete-orphan')
+    telefonos = db.relationship('Telefono', backref='solicitud', lazy=True, cascade='all, delete-orphan')
     
     def __repr__(self):
         return f'<SolicitudSocio {self.nombre} {self.primer_apellido} - {self.estado}>'
@@ -191,7 +200,7 @@ class Beneficiario(db.Model):
     __tablename__ = 'beneficiarios'
     
     id = db.Column(db.Integer, primary_key=True)
-    socio_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    socio_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
     nombre = db.Column(db.String(100), nullable=False)
     primer_apellido = db.Column(db.String(100), nullable=False)
     segundo_apellido = db.Column(db.String(100), nullable=True)
@@ -205,6 +214,42 @@ class Beneficiario(db.Model):
     def __repr__(self):
         return f'<Beneficiario {self.nombre} {self.primer_apellido}>'
 
+class ActividadArchivada(db.Model):
+    """Actividad antigua sacada de 'actividades' (mismo id). Ver services/archivo.py"""
+    __tablename__ = 'actividades_archivo'
+    
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)  # El de la tabla actividades
+    nombre = db.Column(db.String(200), nullable=False)
+    descripcion = db.Column(db.Text, nullable=True)
+    fecha = db.Column(db.DateTime, nullable=False, index=True)
+    aforo_maximo = db.Column(db.Integer, nullable=False)
+    edad_minima = db.Column(db.Integer, nullable=True)
+    edad_maxima = db.Column(db.Integer, nullable=True)
+    bloqueada_inscripcion = db.Column(db.Boolean, nullable=False, default=False)
+    fecha_creacion = db.Column(db.DateTime, nullable=False)
+    archivada = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<ActividadArchivada {self.nombre}>'
+
+class InscripcionArchivada(db.Model):
+    """Inscripción de una actividad archivada (sin claves ajenas: es histórico)"""
+    __tablename__ = 'inscripciones_archivo'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    inscripcion_id = db.Column(db.Integer, nullable=False)  # El que tenía en inscripciones (SQLite puede reutilizarlo)
+    user_id = db.Column(db.Integer, nullable=False)
+    actividad_id = db.Column(db.Integer, db.ForeignKey('actividades_archivo.id'), nullable=False, index=True)
+    beneficiario_id = db.Column(db.Integer, nullable=True)
+    fecha_inscripcion = db.Column(db.DateTime, nullable=False)
+    asiste = db.Column(db.Boolean, nullable=False, default=False)
+    asistencia_actualizada = db.Column(db.DateTime, nullable=True)
+    
+    __table_args__ = (db.Index('ix_inscripciones_archivo_user_actividad', 'user_id', 'actividad_id'),)
+    
+    def __repr__(self):
+        return f'<InscripcionArchivada User {self.user_id} - Actividad {self.actividad_id}>'
+
 class RegistroFinanciero(db.Model):
     """Modelo para registrar ingresos y gastos de la asociación"""
     __tablename__ = 'registros_financieros'
@@ -218,3 +263,164 @@ class RegistroFinanciero(db.Model):
     
     def __repr__(self):
         return f'<RegistroFinanciero {self.tipo} {self.descripcion} {self.importe}€>'
+
+class Renovacion(db.Model):
+    """Registro de una renovación masiva de socios (ver services/renovaciones.py)"""
+    __tablename__ = 'renovaciones'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    fecha = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    usuario = db.Column(db.String(120), nullable=True)  # Quién la lanzó
+    filtro = db.Column(db.String(500), nullable=False)  # Descripción legible del filtro
+    fecha_validez = db.Column(db.DateTime, nullable=False)  # Nueva fecha de validez
+    socios = db.Column(db.Integer, nullable=False, default=0)
+    beneficiarios = db.Column(db.Integer, nullable=False, default=0)
+    duracion_ms = db.Column(db.Integer, nullable=True)
+    
+    # Relaciones
+    detalle = db.relationship('RenovacionSocio', backref='renovacion', lazy=True, cascade='all, delete-orphan')
+    
+    def __repr__(self):
+        return f'<Renovacion {self.fecha} {self.socios} socios>'
+
+class RenovacionSocio(db.Model):
+    """Socio renovado en una renovación masiva, con la validez que tenía antes"""
+    __tablename__ = 'renovaciones_socios'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    renovacion_id = db.Column(db.Integer, db.ForeignKey('renovaciones.id'), nullable=False, index=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    validez_anterior = db.Column(db.DateTime, nullable=False)
+    
+    def __repr__(self):
+        return f'<RenovacionSocio {self.renovacion_id} - User {self.user_id}>'
+
+class ListaVencimientos(db.Model):
+    """Lista diaria de socios vencidos y por vencer, con sus totales (ver services/vencimientos.py)"""
+    __tablename__ = 'listas_vencimientos'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    fecha = db.Column(db.Date, nullable=False, index=True)  # Día al que corresponde la lista
+    generada = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    por_vencer = db.Column(db.Integer, nullable=False, default=0)
+    vencidos = db.Column(db.Integer, nullable=False, default=0)
+    beneficiarios = db.Column(db.Integer, nullable=False, default=0)  # Beneficiarios de esos socios
+    duracion_ms = db.Column(db.Integer, nullable=True)
+    
+    def __repr__(self):
+        return f'<ListaVencimientos {self.fecha} {self.por_vencer}/{self.vencidos}>'
+
+class Vencimiento(db.Model):
+    """Socio vencido o por vencer en la lista del día"""
+    __tablename__ = 'vencimientos'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    lista_id = db.Column(db.Integer, db.ForeignKey('listas_vencimientos.id'), nullable=False, index=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    numero_socio = db.Column(db.String(10), nullable=True)
+    nombre = db.Column(db.String(100), nullable=False)
+    nombre_usuario = db.Column(db.String(120), nullable=False)
+    forma_de_pago = db.Column(db.String(20), nullable=True)
+    fecha_validez = db.Column(db.DateTime, nullable=False)
+    estado = db.Column(db.String(20), nullable=False)  # 'vencido' o 'por_vencer'
+    beneficiarios = db.Column(db.Integer, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f'<Vencimiento {self.numero_socio} {self.estado}>'
+
+class InformeEstadisticas(db.Model):
+    """Cabecera de las estadísticas precalculadas, con los totales del momento (ver services/estadisticas.py)"""
+    __tablename__ = 'informes_estadisticas'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    generado = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    socios = db.Column(db.Integer, nullable=False, default=0)  # Con la suscripción en vigor
+    beneficiarios = db.Column(db.Integer, nullable=False, default=0)  # Con la suscripción en vigor
+    actividades = db.Column(db.Integer, nullable=False, default=0)  # Incluidas las archivadas
+    inscripciones = db.Column(db.Integer, nullable=False, default=0)
+    asistencias = db.Column(db.Integer, nullable=False, default=0)
+    duracion_ms = db.Column(db.Integer, nullable=True)
+    
+    def __repr__(self):
+        return f'<InformeEstadisticas {self.generado}>'
+
+class EstadisticaMes(db.Model):
+    """Altas y actividad de un mes"""
+    __tablename__ = 'estadisticas_meses'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    informe_id = db.Column(db.Integer, db.ForeignKey('informes_estadisticas.id'), nullable=False, index=True)
+    mes = db.Column(db.String(7), nullable=False)  # 'AAAA-MM'
+    altas_socios = db.Column(db.Integer, nullable=False, default=0)
+    altas_beneficiarios = db.Column(db.Integer, nullable=False, default=0)  # Por la fecha de alta del titular
+    actividades = db.Column(db.Integer, nullable=False, default=0)
+    plazas = db.Column(db.Integer, nullable=False, default=0)  # Suma de aforos
+    inscripciones = db.Column(db.Integer, nullable=False, default=0)
+    asistencias = db.Column(db.Integer, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f'<EstadisticaMes {self.mes}>'
+
+class EstadisticaEdad(db.Model):
+    """Socios y beneficiarios en vigor de un tramo de edad"""
+    __tablename__ = 'estadisticas_edades'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    informe_id = db.Column(db.Integer, db.ForeignKey('informes_estadisticas.id'), nullable=False, index=True)
+    orden = db.Column(db.Integer, nullable=False)
+    tramo = db.Column(db.String(20), nullable=False)
+    socios = db.Column(db.Integer, nullable=False, default=0)
+    beneficiarios = db.Column(db.Integer, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f'<EstadisticaEdad {self.tramo}>'
+
+class EstadisticaActividad(db.Model):
+    """Inscripción, asistencia y ocupación de una actividad (también de las archivadas)"""
+    __tablename__ = 'estadisticas_actividades'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    informe_id = db.Column(db.Integer, db.ForeignKey('informes_estadisticas.id'), nullable=False, index=True)
+    actividad_id = db.Column(db.Integer, nullable=False)  # Puede estar en actividades_archivo
+    nombre = db.Column(db.String(200), nullable=False)
+    fecha = db.Column(db.DateTime, nullable=False)
+    archivada = db.Column(db.Boolean, nullable=False, default=False)
+    aforo = db.Column(db.Integer, nullable=False)
+    inscritos = db.Column(db.Integer, nullable=False, default=0)
+    asistencias = db.Column(db.Integer, nullable=False, default=0)
+    
+    @property
+    def ocupacion(self):
+        """Porcentaje de plazas ocupadas"""
+        return round(100 * self.inscritos / self.aforo) if self.aforo else 0
+    
+    @property
+    def asistencia(self):
+        """Porcentaje de inscritos que asistieron"""
+        return round(100 * self.asistencias / self.inscritos) if self.inscritos else 0
+    
+    def __repr__(self):
+        return f'<EstadisticaActividad {self.nombre}>'
+
+class VersionTabla(db.Model):
+    """Contador de cambios por tabla, para los ETag de las vistas (ver services/versiones.py)"""
+    __tablename__ = 'versiones_tablas'
+    
+    tabla = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    actualizado = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<VersionTabla {self.tabla} v{self.version}>'
+
+class Telefono(db.Model):
+    """Móvil normalizado -> solicitud (y socio, una vez confirmada). Ver services/telefonos.py"""
+    __tablename__ = 'telefonos'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    numero = db.Column(db.String(20), nullable=False, unique=True)  # Solo dígitos, sin prefijo +34
+    solicitud_id = db.Column(db.Integer, db.ForeignKey('solicitudes_socio.id'), nullable=True, index=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True, index=True)
+    
+    def __repr__(self):
+        return f'<Telefono {self.numero}>'
@@ -70,6 +70,7 @@ fi
 print_info "Configurando servicio systemd..."
 if [ -f "/home/asociacion/asociacion_vps/systemd/asociacion.service" ]; then
     cp /home/asociacion/asociacion_vps/systemd/asociacion.service /etc/systemd/system/
+    cp /home/asociacion/asociacion_vps/systemd/asociacion-worker.service /etc/systemd/system/
     systemctl daemon-reload
     print_info "Servicio systemd configurado"
 else
@@ -133,18 +134,20 @@ echo "   cd /home/asociacion/asociacion_vps"
 echo "   python3 -m venv venv"
 echo "   source venv/bin/activate"
 echo "   pip install -r requirements.txt"
+echo "   python actualizar_galerias.py   # miniaturas y manifiesto de las galerías (repetir al subir fotos)"
+echo "   python construir_estaticos.py   # Bootstrap recortado, CSS/JS con huella y precomprimidos (repetir en cada despliegue)"
 echo ""
 echo "3. Revisa y ajusta el archivo .env si es necesario"
 echo ""
 echo "4. Inicia el servicio:"
-echo "   systemctl enable asociacion.service"
+echo "   systemctl enable asociacion.service asociacion-worker.service"
 echo "   systemctl start asociacion.service"
 echo ""
 echo "5. Reinicia Nginx:"
 echo "   systemctl restart nginx"
 echo ""
 echo "6. Verifica el estado:"
-echo "   systemctl status asociacion.service"
+echo "   systemctl status asociacion.service asociacion-worker.service"
 echo "   curl http://localhost"
 echo ""
 
@@ -0,0 +1,230 @@
+"""
+Archivo de actividades antiguas
+
+actividades e inscripciones solo crecen, y los listados de la directiva, el
+PDF de actividades, la exportación de datos y las cuentas de inscritos
+recorren todo. archivar() pasa las actividades anteriores al corte
+(ARCHIVO_DIAS días, por defecto un año) y sus inscripciones a
+actividades_archivo e inscripciones_archivo, en una sola transacción con
+INSERT ... SELECT y DELETE. Así las tablas de trabajo solo tienen la
+temporada actual.
+
+Lo hace la tarea diaria 'archivar_actividades' de la cola; la directiva
+también puede lanzarla desde /admin/actividades/archivo.
+
+Los informes históricos leen las dos partes a la vez con las vistas
+actividades_historico e inscripciones_historico (UNION ALL, con la columna
+archivada), que crear_vistas() vuelve a crear en cada arranque.
+
+Las actividades archivadas conservan su id. Para que no se repitan ids entre
+las dos tablas, actividades es AUTOINCREMENT (SQLite no vuelve a dar el id de
+una fila borrada) y su contador en sqlite_sequence no queda nunca por debajo
+del id archivado más alto. preparar_ids() rehace al arrancar la tabla de las
+bases creadas sin AUTOINCREMENT y ajusta el contador.
+"""
+from datetime import datetime, timedelta
+import time
+
+from flask import current_app, has_app_context
+from sqlalchemy import (Boolean, Column, DateTime, Integer, MetaData, String, Table, Text, delete, func, insert,
+                        literal, select, text)
+from sqlalchemy.schema import CreateTable
+
+from models import Actividad, ActividadArchivada, Inscripcion, InscripcionArchivada, db
+
+DIAS_POR_DEFECTO = 365
+
+# Las vistas no son tablas del modelo (db.create_all no debe crearlas)
+_vistas = MetaData()
+
+actividades_historico = Table(
+    'actividades_historico', _vistas,
+    Column('id', Integer, primary_key=True),
+    Column('nombre', String(200)),
+    Column('descripcion', Text),
+    Column('fecha', DateTime),
+    Column('aforo_maximo', Integer),
+    Column('edad_minima', Integer),
+    Column('edad_maxima', Integer),
+    Column('archivada', Boolean),
+)
+
+inscripciones_historico = Table(
+    'inscripciones_historico', _vistas,
+    Column('user_id', Integer),
+    Column('actividad_id', Integer),
+    Column('beneficiario_id', Integer),
+    Column('fecha_inscripcion', DateTime),
+    Column('asiste', Boolean),
+    Column('archivada', Boolean),
+)
+
+_COLUMNAS_ACTIVIDAD = ['id', 'nombre', 'descripcion', 'fecha', 'aforo_maximo', 'edad_minima', 'edad_maxima',
+                       'bloqueada_inscripcion', 'fecha_creacion']
+_COLUMNAS_INSCRIPCION = ['inscripcion_id', 'user_id', 'actividad_id', 'beneficiario_id', 'fecha_inscripcion',
+                         'asiste', 'asistencia_actualizada']
+
+_SQL_VISTAS = (
+    'DROP VIEW IF EXISTS actividades_historico',
+    'CREATE VIEW actividades_historico AS '
+    'SELECT id, nombre, descripcion, fecha, aforo_maximo, edad_minima, edad_maxima, 0 AS archivada FROM actividades '
+    'UNION ALL '
+    'SELECT id, nombre, descripcion, fecha, aforo_maximo, edad_minima, edad_maxima, 1 FROM actividades_archivo',
+    'DROP VIEW IF EXISTS inscripciones_historico',
+    'CREATE VIEW inscripciones_historico AS '
+    'SELECT user_id, actividad_id, beneficiario_id, fecha_inscripcion, asiste, 0 AS archivada FROM inscripciones '
+    'UNION ALL '
+    'SELECT user_id, actividad_id, beneficiario_id, fecha_inscripcion, asiste, 1 FROM inscripciones_archivo',
+)
+
+
+def _rehacer_tabla(conn):
+    """Copia actividades en una tabla nueva con AUTOINCREMENT y la pone en su lugar (claves ajenas desactivadas)"""
+    nueva = Actividad.__table__.to_metadata(MetaData(), name='actividades_nueva')
+    columnas = ', '.join(columna.name for columna in Actividad.__table__.columns)
+    # La vista apunta a actividades y SQLite no deja renombrar con ella rota; crear_vistas() la vuelve a crear
+    conn.execute(text('DROP VIEW IF EXISTS actividades_historico'))
+    conn.execute(CreateTable(nueva))
+    conn.execute(text(f'INSERT INTO actividades_nueva ({columnas}) SELECT {columnas} FROM actividades'))
+    conn.execute(text('DROP TABLE actividades'))
+    conn.execute(text('ALTER TABLE actividades_nueva RENAME TO actividades'))
+    for indice in Actividad.__table__.indexes:
+        indice.create(conn)
+    if conn.exec_driver_sql('PRAGMA foreign_key_check').first() is not None:
+        raise RuntimeError('inscripciones con actividades que no existen después de rehacer la tabla')
+
+
+def _ajustar_contador(conn):
+    """Sube el contador de ids de actividades hasta el id archivado más alto"""
+    alto = conn.execute(select(func.max(ActividadArchivada.id))).scalar()
+    if alto is None:
+        return
+    actual = conn.execute(text("SELECT seq FROM sqlite_sequence WHERE name = 'actividades'")).scalar()
+    if actual is None:
+        conn.execute(text("INSERT INTO sqlite_sequence (name, seq) VALUES ('actividades', :alto)"), {'alto': alto})
+    elif actual < alto:
+        conn.execute(text("UPDATE sqlite_sequence SET seq = :alto WHERE name = 'actividades'"), {'alto': alto})
+
+
+def preparar_ids():
+    """Deja actividades con AUTOINCREMENT y el contador por encima de los ids archivados (create_app, antes de crear_vistas)
+
+    SQLite no permite añadir AUTOINCREMENT con ALTER TABLE: en las bases
+    anteriores se rehace la tabla una vez. Devuelve True si la ha rehecho.
+    """
+    if db.engine.dialect.name != 'sqlite':
+        return False
+    rehecha = False
+    with db.engine.connect() as conn:
+        # Fuera de una transacción: dentro SQLite ignora el PRAGMA
+        conn.exec_driver_sql('PRAGMA foreign_keys=OFF')
+        try:
+            # IMMEDIATE: si varios procesos arrancan a la vez, solo uno rehace la tabla
+            conn.exec_driver_sql('BEGIN IMMEDIATE')
+            sql = conn.execute(text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'actividades'")).scalar()
+            if sql and 'AUTOINCREMENT' not in sql.upper():
+                _rehacer_tabla(conn)
+                rehecha = True
+            _ajustar_contador(conn)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.exec_driver_sql('PRAGMA foreign_keys=ON')
+    if rehecha:
+        print("[INFO] Tabla 'actividades' rehecha con AUTOINCREMENT (los ids ya no se reutilizan)")
+    return rehecha
+
+
+def ajustar_contador():
+    """_ajustar_contador en la sesión actual, para después de importar actividades archivadas (sin commit)"""
+    if db.engine.dialect.name == 'sqlite':
+        _ajustar_contador(db.session)
+
+
+def crear_vistas():
+    """(Re)crea las vistas de las dos partes (create_app, después de db.create_all)"""
+    with db.engine.begin() as conn:
+        for sentencia in _SQL_VISTAS:
+            conn.execute(text(sentencia))
+
+
+def corte(dias=None, ahora=None):
+    """Fecha a partir de la cual las actividades se quedan en la tabla de trabajo"""
+    if dias is None:
+        dias = current_app.config['ARCHIVO_DIAS'] if has_app_context() else DIAS_POR_DEFECTO
+    return (ahora or datetime.utcnow()) - timedelta(days=dias)
+
+
+def _condicion(fecha_corte):
+    return Actividad.fecha < fecha_corte
+
+
+def previsualizar(fecha_corte=None):
+    """{'actividades', 'inscripciones', 'corte'} que se archivarían ahora"""
+    fecha_corte = fecha_corte or corte()
+    ids = select(Actividad.id).where(_condicion(fecha_corte)).scalar_subquery()
+    actividades, inscripciones = db.session.execute(select(
+        select(func.count()).select_from(Actividad).where(Actividad.id.in_(ids)).scalar_subquery(),
+        select(func.count()).select_from(Inscripcion).where(Inscripcion.actividad_id.in_(ids)).scalar_subquery(),
+    )).one()
+    return {'actividades': actividades, 'inscripciones': inscripciones, 'corte': fecha_corte}
+
+
+def archivar(fecha_corte=None):
+    """Mueve al archivo las actividades anteriores al corte y sus inscripciones
+
+    Devuelve {'actividades', 'inscripciones', 'corte', 'duracion_ms'}.
+    """
+    inicio = time.perf_counter()
+    fecha_corte = fecha_corte or corte()
+    condicion = _condicion(fecha_corte)
+    try:
+        # Con el primer INSERT la transacción ya tiene el cerrojo de escritura: el conjunto no cambia
+        actividades = db.session.execute(insert(ActividadArchivada).from_select(
+            _COLUMNAS_ACTIVIDAD + ['archivada'],
+            select(*(getattr(Actividad, columna) for columna in _COLUMNAS_ACTIVIDAD), literal(datetime.utcnow()))
+            .where(condicion),
+        )).rowcount
+        if not actividades:
+            db.session.rollback()
+            return {'actividades': 0, 'inscripciones': 0, 'corte': fecha_corte, 'duracion_ms': 0}
+        ids = select(Actividad.id).where(condicion)
+        inscripciones = db.session.execute(insert(InscripcionArchivada).from_select(
+            _COLUMNAS_INSCRIPCION,
+            select(Inscripcion.id, Inscripcion.user_id, Inscripcion.actividad_id, Inscripcion.beneficiario_id,
+                   Inscripcion.fecha_inscripcion, Inscripcion.asiste, Inscripcion.asistencia_actualizada)
+            .where(Inscripcion.actividad_id.in_(ids)),
+        )).rowcount
+        db.session.execute(delete(Inscripcion).where(Inscripcion.actividad_id.in_(ids))
+                           .execution_options(synchronize_session=False))
+        db.session.execute(delete(Actividad).where(condicion)
+                           .execution_options(synchronize_session=False))
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    db.session.expire_all()
+    return {'actividades': actividades, 'inscripciones': inscripciones, 'corte': fecha_corte,
+            'duracion_ms': int((time.perf_counter() - inicio) * 1000)}
+
+
+def resumen_por_año():
+    """Actividades, inscripciones y asistencias por año en las dos partes (vistas), del más reciente al más antiguo"""
+    año = func.strftime('%Y', actividades_historico.c.fecha)
+    inscritos = (select(inscripciones_historico.c.actividad_id,
+                        func.count().label('inscripciones'),
+                        func.sum(func.coalesce(inscripciones_historico.c.asiste, 0), type_=Integer).label('asistencias'))
+                 .group_by(inscripciones_historico.c.actividad_id).subquery())
+    filas = db.session.execute(
+        select(año.label('año'),
+               func.count(actividades_historico.c.id),
+               func.sum(actividades_historico.c.archivada, type_=Integer),
+               func.coalesce(func.sum(inscritos.c.inscripciones), 0),
+               func.coalesce(func.sum(inscritos.c.asistencias, type_=Integer), 0))
+        .select_from(actividades_historico.outerjoin(inscritos, inscritos.c.actividad_id == actividades_historico.c.id))
+        .group_by(año).order_by(año.desc())
+    ).all()
+    return [{'año': fila[0], 'actividades': fila[1], 'archivadas': fila[2] or 0, 'inscripciones': fila[3],
+             'asistencias': fila[4]} for fila in filas]
@@ -0,0 +1,155 @@
+"""
+Caché de páginas públicas completas para visitantes anónimos
+
+Las vistas decoradas con @cachear (portada, galerías, formulario de hazte
+socio) pintan exactamente lo mismo para cualquier visitante sin sesión. La
+primera petición guarda el HTML en PAGINAS_CACHE_DIR (un disco local o
+/dev/shm, compartido por todos los workers de gunicorn) y las siguientes lo
+sirven sin pasar por Jinja hasta que caduca (PAGINAS_CACHE_TTL).
+
+No se usa la caché si hay sesión (usuario identificado, mensajes flash
+pendientes) o cookie de "recordarme", ni se guarda una respuesta que no sea
+200 o que ponga cookies. La clave incluye una versión que cambia en cada
+arranque, así que tras un despliegue nunca se sirve HTML con plantillas o
+rutas de estáticos antiguas.
+
+Las respuestas llevan ETag (el navegador revalida y recibe 304) y
+Cache-Control con s-maxage para que nginx pueda hacer además micro-caché.
+"""
+from functools import wraps
+import hashlib
+import json
+import os
+import shutil
+import time
+
+from flask import current_app, request, session, make_response
+
+CACHE_NGINX = 10  # segundos que nginx puede servir su propia copia
+LIMPIAR_CADA = 600  # segundos entre barridos de entradas caducadas (por proceso)
+
+_estado = {'version': None, 'limpiado': 0.0}
+
+
+def iniciar(app):
+    """Nueva versión de la caché (create_app; con preload_app la comparten todos los workers)"""
+    _estado['version'] = hashlib.sha1(f'{time.time()}:{os.getpid()}'.encode()).hexdigest()[:10]
+    os.makedirs(app.config['PAGINAS_CACHE_DIR'], exist_ok=True)
+
+
+def _anonimo():
+    """True si la petición no tiene nada que haga la página distinta para este visitante"""
+    return not session and not request.cookies.get('remember_token')
+
+
+def _clave(args, variante):
+    partes = [_estado['version'] or '', request.path, variante or '']
+    partes += [f'{nombre}={request.args.get(nombre, "")}' for nombre in args]
+    return hashlib.sha1('|'.join(partes).encode('utf-8')).hexdigest()
+
+
+def _ruta(endpoint, clave):
+    return os.path.join(current_app.config['PAGINAS_CACHE_DIR'], endpoint, f'{clave}.html')
+
+
+def _leer(ruta):
+    """(metadatos, cuerpo) de una entrada vigente, o None"""
+    try:
+        with open(ruta, 'rb') as f:
+            meta = json.loads(f.readline())
+            if meta['expira'] < time.time():
+                return None
+            return meta, f.read()
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def _guardar(ruta, meta, cuerpo):
+    os.makedirs(os.path.dirname(ruta), exist_ok=True)
+    temporal = f'{ruta}.{os.getpid()}.tmp'
+    with open(temporal, 'wb') as f:
+        f.write(json.dumps(meta).encode('utf-8') + b'\n')
+        f.write(cuerpo)
+    os.replace(temporal, ruta)
+
+
+def _limpiar(directorio):
+    """Borra las entradas caducadas (y las de versiones anteriores, que ya no se leen)"""
+    ahora = time.time()
+    if ahora - _estado['limpiado'] < LIMPIAR_CADA:
+        return
+    _estado['limpiado'] = ahora
+    ttl = current_app.config['PAGINAS_CACHE_TTL']
+    for raiz, _, archivos in os.walk(directorio):
+        for nombre in archivos:
+            ruta = os.path.join(raiz, nombre)
+            try:
+                if os.stat(ruta).st_mtime + ttl < ahora:
+                    os.remove(ruta)
+            except OSError:
+                pass
+
+
+def _respuesta(cuerpo, meta, estado_cache):
+    respuesta = make_response(cuerpo, meta['status'])
+    respuesta.mimetype = meta['mimetype']
+    respuesta.set_etag(meta['etag'])
+    respuesta.headers['Cache-Control'] = f'public, max-age=0, s-maxage={CACHE_NGINX}'
+    respuesta.headers['X-Cache'] = estado_cache
+    # Quien tenga cookie de sesión recibe otra página (nginx guarda una copia por cada valor)
+    respuesta.vary.add('Cookie')
+    return respuesta.make_conditional(request)
+
+
+def cachear(args=(), variante=None, ttl=None):
+    """Decorador de vistas públicas cacheables
+
+    args: parámetros de la query que cambian la página (el resto se ignoran).
+    variante: función sin argumentos que devuelve un texto corto si la
+    página tiene varias versiones para anónimos (p. ej. con o sin CSS crítico).
+    """
+    def decorador(vista):
+        @wraps(vista)
+        def envoltorio(*a, **kw):
+            duracion = current_app.config['PAGINAS_CACHE_TTL'] if ttl is None else ttl
+            if request.method != 'GET' or not duracion or not _anonimo():
+                respuesta = make_response(vista(*a, **kw))
+                respuesta.headers['X-Cache'] = 'BYPASS'
+                return respuesta
+
+            ruta = _ruta(request.endpoint, _clave(args, variante() if variante else None))
+            entrada = _leer(ruta)
+            if entrada is not None:
+                meta, cuerpo = entrada
+                return _respuesta(cuerpo, meta, 'HIT')
+
+            respuesta = make_response(vista(*a, **kw))
+            # Solo páginas completas, iguales para todos: nada de errores, redirecciones ni cookies
+            if respuesta.status_code != 200 or 'Set-Cookie' in respuesta.headers or session:
+                respuesta.headers['X-Cache'] = 'BYPASS'
+                return respuesta
+            cuerpo = respuesta.get_data()
+            meta = {
+                'status': respuesta.status_code,
+                'mimetype': respuesta.mimetype,
+                'etag': hashlib.sha1(cuerpo).hexdigest()[:16],
+                'expira': time.time() + duracion,
+                'ruta': request.full_path,
+            }
+            try:
+                _guardar(ruta, meta, cuerpo)
+                _limpiar(current_app.config['PAGINAS_CACHE_DIR'])
+            except OSError as e:
+                print(f"[WARNING] No se pudo guardar la página en caché: {e}")
+            return _respuesta(cuerpo, meta, 'MISS')
+        return envoltorio
+    return decorador
+
+
+def purgar(app, *endpoints):
+    """Borra las páginas cacheadas de esos endpoints (de todos si no se indica ninguno)"""
+    directorio = app.config['PAGINAS_CACHE_DIR']
+    if not endpoints:
+        endpoints = os.listdir(directorio) if os.path.isdir(directorio) else []
+    for endpoint in endpoints:
+        shutil.rmtree(os.path.join(directorio, endpoint), ignore_errors=True)
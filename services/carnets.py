@@ -0,0 +1,172 @@
+"""
+Generación de carnets por lotes
+
+La directiva imprime en la renovación los carnets de todos los socios (o de
+un subconjunto). El lote se procesa fuera de la petición:
+
+  1. Se consultan los socios del filtro y sus beneficiarios con una única
+     consulta agrupada (nada de una consulta por socio).
+  2. Los carnets se reparten en trozos de TAMANO_TROZO y cada trozo se
+     maqueta en un proceso del pool (ReportLab es CPU puro, los hilos no
+     ayudan por el GIL).
+  3. Los trozos se unen en un único PDF si pypdf está instalado; si no, se
+     entregan todos juntos en un ZIP.
+
+El lote es un trabajo de la cola (services/tareas.py), que guarda el
+progreso y sirve el archivo resultante desde /admin/jobs.
+"""
+import os
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime, timedelta
+from itertools import groupby
+from multiprocessing import get_context
+
+from sqlalchemy import func
+
+from models import User, Beneficiario, db
+from services import informes, verificacion
+
+try:
+    from pypdf import PdfWriter
+    PYPDF_AVAILABLE = True
+except ImportError:
+    PYPDF_AVAILABLE = False
+    print("[WARNING] pypdf no está disponible. Los lotes de carnets se entregarán como ZIP")
+
+FILTROS = {
+    'todos': 'Todos los socios',
+    'por_vencer': 'Próximos a vencer (30 días)',
+    'nuevos': 'Altas de este año',
+    'poblacion': 'Por población',
+}
+
+TAMANO_TROZO = 50
+
+
+# ---------------------------------------------------------------------------
+# Consultas
+# ---------------------------------------------------------------------------
+
+def consultar_socios(filtro, poblacion=None):
+    """Consulta de socios según el filtro elegido, ordenada por número de socio"""
+    ahora = datetime.utcnow()
+    consulta = User.query.filter(User.rol == 'socio')
+    if filtro == 'por_vencer':
+        consulta = consulta.filter(User.fecha_validez <= ahora + timedelta(days=30),
+                                   User.fecha_validez > ahora)
+    elif filtro == 'nuevos':
+        consulta = consulta.filter(User.fecha_alta >= datetime(ahora.year, 1, 1))
+    elif filtro == 'poblacion':
+        consulta = consulta.filter(func.upper(User.poblacion) == (poblacion or '').upper())
+    elif filtro != 'todos':
+        raise ValueError(f'Filtro desconocido: {filtro}')
+    return consulta.order_by(User.numero_socio, User.nombre)
+
+
+def descripcion(filtro, poblacion=None):
+    """Texto del filtro para el listado de lotes"""
+    return FILTROS[filtro] + (f': {poblacion}' if filtro == 'poblacion' and poblacion else '')
+
+
+def poblaciones():
+    """Poblaciones distintas de los socios, para el selector del formulario"""
+    filas = db.session.query(User.poblacion).filter(
+        User.rol == 'socio', User.poblacion.isnot(None), User.poblacion != ''
+    ).distinct().order_by(User.poblacion).all()
+    return [fila[0] for fila in filas]
+
+
+def cargar_datos(filtro, poblacion=None, url_base=None):
+    """Datos de carnet (diccionarios) de los socios del filtro
+
+    Los beneficiarios de todos los socios se cargan en una sola consulta
+    ordenada por socio y se agrupan en memoria. Cada carnet lleva el QR de
+    verificación con la URL construida sobre url_base.
+    """
+    socios = consultar_socios(filtro, poblacion).all()
+    por_socio = {}
+    if socios:
+        beneficiarios = Beneficiario.query.filter(
+            Beneficiario.socio_id.in_(consultar_socios(filtro, poblacion).with_entities(User.id))
+        ).order_by(Beneficiario.socio_id, Beneficiario.nombre).all()
+        por_socio = {socio_id: list(grupo)
+                     for socio_id, grupo in groupby(beneficiarios, key=lambda b: b.socio_id)}
+    return [informes.datos_carnet(s, por_socio.get(s.id, []), qr=verificacion.url_verificacion(s.id, url_base))
+            for s in socios]
+
+
+# ---------------------------------------------------------------------------
+# Generación
+# ---------------------------------------------------------------------------
+
+def _trozos(lista, tamano):
+    return [lista[i:i + tamano] for i in range(0, len(lista), tamano)]
+
+
+def _unir(ruta, partes):
+    """Une los PDF parciales en carnets.pdf (o en un ZIP sin pypdf)"""
+    if len(partes) == 1:
+        os.replace(os.path.join(ruta, partes[0]), os.path.join(ruta, 'carnets.pdf'))
+        return 'carnets.pdf'
+    if PYPDF_AVAILABLE:
+        escritor = PdfWriter()
+        for parte in partes:
+            escritor.append(os.path.join(ruta, parte))
+        with open(os.path.join(ruta, 'carnets.pdf'), 'wb') as f:
+            escritor.write(f)
+        nombre = 'carnets.pdf'
+    else:
+        with zipfile.ZipFile(os.path.join(ruta, 'carnets.zip'), 'w', zipfile.ZIP_DEFLATED) as zf:
+            for parte in partes:
+                zf.write(os.path.join(ruta, parte), parte)
+        nombre = 'carnets.zip'
+    for parte in partes:
+        os.remove(os.path.join(ruta, parte))
+    return nombre
+
+
+def generar(directorio, filtro, poblacion=None, progreso=None, procesos=None, url_base=None):
+    """Genera los carnets del filtro en `directorio` (dentro de un contexto de app)
+
+    Devuelve el nombre del archivo final (carnets.pdf o carnets.zip) o None
+    si ningún socio cumple el filtro. progreso(procesados, total) se llama
+    tras cada trozo y puede lanzar una excepción para cancelar.
+    """
+    datos = cargar_datos(filtro, poblacion, url_base)
+    if not datos:
+        return None
+
+    trozos = _trozos(datos, TAMANO_TROZO)
+    procesos = max(1, min(procesos or os.cpu_count() or 1, len(trozos)))
+    if progreso:
+        progreso(0, len(datos))
+
+    partes = [f'parte_{i:03d}.pdf' for i in range(len(trozos))]
+    procesados = 0
+    if procesos == 1:
+        for parte, trozo in zip(partes, trozos):
+            with open(os.path.join(directorio, parte), 'wb') as f:
+                f.write(informes.pdf_carnets(trozo))
+            procesados += len(trozo)
+            if progreso:
+                progreso(procesados, len(datos))
+    else:
+        # spawn: no heredar conexiones ni hilos del proceso que lanza el lote
+        with ProcessPoolExecutor(max_workers=procesos, mp_context=get_context('spawn')) as pool:
+            futuros = {pool.submit(informes.pdf_carnets, trozo): (parte, len(trozo))
+                       for parte, trozo in zip(partes, trozos)}
+            try:
+                for futuro in as_completed(futuros):
+                    parte, cantidad = futuros[futuro]
+                    with open(os.path.join(directorio, parte), 'wb') as f:
+                        f.write(futuro.result())
+                    procesados += cantidad
+                    if progreso:
+                        progreso(procesados, len(datos))
+            except BaseException:
+                for futuro in futuros:
+                    futuro.cancel()
+                raise
+
+    return _unir(directorio, partes)
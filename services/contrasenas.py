@@ -0,0 +1,101 @@
+"""
+Política de hash de las contraseñas
+
+El algoritmo y el coste se eligen con PASSWORD_HASH: el nombre de una de
+las POLITICAS o directamente un método de Werkzeug ("pbkdf2:sha256:200000",
+"scrypt:16384:8:1"...). Cada hash guardado lleva delante el método con el
+que se hizo, así que conviven hashes de varias políticas: al iniciar sesión
+con éxito, si el del socio no es el de la política actual se rehace con ella
+(sirve para subir o bajar el coste sin pedir a nadie que cambie la
+contraseña).
+
+Crear muchos hashes seguidos (administradores al arrancar, datos de prueba)
+se reparte entre varios procesos con generar_varios(); una petición normal
+hace un solo hash y no lo necesita.
+
+benchmark_contrasenas.py mide los inicios de sesión por segundo y worker de
+cada política.
+"""
+from concurrent.futures import ProcessPoolExecutor
+import os
+
+from flask import current_app, has_app_context
+from werkzeug.security import DEFAULT_PBKDF2_ITERATIONS, check_password_hash, generate_password_hash
+
+# Nombre -> método de Werkzeug (de más caro a más barato)
+POLITICAS = {
+    'pbkdf2-600k': 'pbkdf2:sha256:600000',
+    'pbkdf2-260k': 'pbkdf2:sha256:260000',
+    'pbkdf2-100k': 'pbkdf2:sha256:100000',
+    'scrypt-32k': 'scrypt:32768:8:1',
+    'scrypt-16k': 'scrypt:16384:8:1',
+}
+# La de Werkzeug 2.3, con la que están hechos los hashes actuales
+POR_DEFECTO = 'pbkdf2-600k'
+
+# Por debajo de esto no compensa arrancar procesos
+MINIMO_PARA_PROCESOS = 4
+
+
+def resolver(politica):
+    """Método de Werkzeug de una política (nombre de POLITICAS o método tal cual). ValueError si no vale"""
+    metodo = _normalizar(POLITICAS.get(politica, politica))
+    if metodo.split(':')[0] not in ('pbkdf2', 'scrypt'):
+        raise ValueError('solo se admiten pbkdf2 y scrypt')
+    generate_password_hash('prueba', method=metodo)
+    return metodo
+
+
+def _normalizar(metodo):
+    """Método con todos sus parámetros ("pbkdf2" -> "pbkdf2:sha256:600000")"""
+    partes = metodo.split(':')
+    if partes[0] == 'pbkdf2':
+        partes += ['sha256', str(DEFAULT_PBKDF2_ITERATIONS)][len(partes) - 1:]
+    elif partes[0] == 'scrypt':
+        partes += ['32768', '8', '1'][len(partes) - 1:]
+    return ':'.join(partes)
+
+
+def metodo_actual():
+    """Método de la política configurada (PASSWORD_HASH); fuera de la app, el de POR_DEFECTO"""
+    if has_app_context():
+        return current_app.config['PASSWORD_HASH']
+    return POLITICAS[POR_DEFECTO]
+
+
+def metodo_de(hash_guardado):
+    """Método con el que se hizo un hash guardado"""
+    return _normalizar(hash_guardado.split('$', 1)[0]) if hash_guardado else ''
+
+
+def generar(password, metodo=None):
+    return generate_password_hash(password, method=metodo or metodo_actual())
+
+
+def comprobar(hash_guardado, password):
+    return check_password_hash(hash_guardado, password)
+
+
+def necesita_rehash(hash_guardado):
+    """True si el hash no es de la política actual (más caro o más barato)"""
+    return metodo_de(hash_guardado) != metodo_actual()
+
+
+def _generar(argumentos):
+    password, metodo = argumentos
+    return generate_password_hash(password, method=metodo)
+
+
+def generar_varios(passwords, metodo=None, procesos=None):
+    """Hashes de varias contraseñas, en paralelo con un pool de procesos si son bastantes"""
+    metodo = metodo or metodo_actual()
+    passwords = list(passwords)
+    procesos = min(procesos or os.cpu_count() or 1, len(passwords))
+    if len(passwords) < MINIMO_PARA_PROCESOS or procesos < 2:
+        return [generate_password_hash(password, method=metodo) for password in passwords]
+    try:
+        with ProcessPoolExecutor(max_workers=procesos) as pool:
+            return list(pool.map(_generar, [(password, metodo) for password in passwords]))
+    except (OSError, RuntimeError) as e:
+        print(f"[WARNING] No se pudo usar un pool de procesos para los hashes: {e}")
+        return [generate_password_hash(password, method=metodo) for password in passwords]
@@ -0,0 +1,134 @@
+"""
+CSS crítico de las páginas públicas más visitadas
+
+construir_estaticos.py genera, para cada página de PAGINAS, el CSS mínimo
+para pintar lo que se ve al cargar: las reglas de Bootstrap, los iconos y
+style.css cuyos selectores usan clases que aparecen en las plantillas antes
+de la marca MARCA_FIN. Se guarda en instance/critico/<pagina>.css.
+
+En la primera visita la plantilla lo incrusta en un <style> y carga las
+hojas completas (ya con huella, cacheables un año) sin bloquear el pintado.
+Cuando terminan de cargar se guarda una cookie con la versión del CSS; con
+ella, las visitas siguientes enlazan las hojas normalmente (están en la
+caché del navegador) y el HTML no lleva el CSS crítico.
+"""
+import hashlib
+import os
+import re
+
+from flask import request
+
+from services import librerias
+
+# Página -> plantillas (en orden de pintado) y hojas de static/ que se recortan
+PAGINAS = {
+    'portada': {
+        'plantillas': ['base.html', 'auth/login.html'],
+        'hojas': ['vendor/bootstrap.min.css', 'vendor/bootstrap-icons.css', 'css/style.css'],
+    },
+}
+
+# Lo que hay después de esta marca en una plantilla no cuenta para el CSS crítico
+MARCA_FIN = '{# fin-css-critico #}'
+CARPETA = 'critico'  # dentro de instance/
+COOKIE = 'css_version'
+
+_URL_CSS = re.compile(r'url\(\s*([\'"]?)([^\'")]+)\1\s*\)')
+
+_cache = {}  # pagina -> {'css', 'version'} o None
+
+
+def _compactar(css):
+    """Quita comentarios y espacios sobrantes (style.css no está minificado)"""
+    css = re.sub(r'/\*(?!!).*?\*/', '', css, flags=re.S)
+    css = re.sub(r'\s+', ' ', css)
+    return re.sub(r'\s*([{};])\s*', r'\1', css).strip()
+
+
+def _urls_absolutas(css, hoja, manifiesto, static_url_path):
+    """url() relativas a la hoja -> rutas absolutas (el <style> se resuelve respecto a la página)"""
+    carpeta = os.path.dirname(hoja)
+
+    def sustituir(m):
+        url = m.group(2).strip()
+        if url.startswith(('data:', '/', '#')) or '://' in url:
+            return m.group(0)
+        relativa = os.path.normpath(os.path.join(carpeta, url.split('?')[0].split('#')[0])).replace(os.sep, '/')
+        entrada = manifiesto.get(relativa)
+        if entrada is None:
+            ruta = relativa
+        else:
+            ruta = entrada['ruta'] + (f"?v={entrada['v']}" if entrada['v'] else '')
+        return f'url("{static_url_path}/{ruta}")'
+
+    return _URL_CSS.sub(sustituir, css)
+
+
+def _version(manifiesto, hojas):
+    """Cambia cuando cambia alguna de las hojas completas"""
+    partes = [manifiesto.get(hoja, {}).get('ruta', hoja) for hoja in hojas]
+    return hashlib.sha1('|'.join(partes).encode('utf-8')).hexdigest()[:10]
+
+
+def generar(raiz, static_folder, instance_path, manifiesto, static_url_path='/static'):
+    """Escribe el CSS crítico de cada página. Devuelve {pagina: bytes} (sin las que faltan hojas)"""
+    destino = os.path.join(instance_path, CARPETA)
+    os.makedirs(destino, exist_ok=True)
+    resultado = {}
+    for pagina, config in PAGINAS.items():
+        rutas = [os.path.join(static_folder, hoja) for hoja in config['hojas']]
+        salida = os.path.join(destino, f'{pagina}.css')
+        if not all(os.path.exists(ruta) for ruta in rutas):
+            # Sin Bootstrap local no tiene sentido: la página enlaza el CDN como siempre
+            if os.path.exists(salida):
+                os.remove(salida)
+            continue
+
+        visible = []
+        for plantilla in config['plantillas']:
+            with open(os.path.join(raiz, 'templates', plantilla), 'r', encoding='utf-8') as f:
+                visible.append(f.read().split(MARCA_FIN)[0])
+        usadas = librerias.clases_visibles('\n'.join(visible))
+
+        partes = []
+        for hoja, ruta in zip(config['hojas'], rutas):
+            with open(ruta, 'r', encoding='utf-8') as f:
+                css = librerias.purgar(f.read(), usadas, estricto=True)
+            partes.append(_urls_absolutas(_compactar(css), hoja, manifiesto, static_url_path))
+        version = _version(manifiesto, config['hojas'])
+        contenido = f'/* {version} */' + ''.join(partes)
+
+        temporal = f'{salida}.{os.getpid()}.tmp'
+        with open(temporal, 'w', encoding='utf-8') as f:
+            f.write(contenido)
+        os.replace(temporal, salida)
+        resultado[pagina] = len(contenido.encode('utf-8'))
+    return resultado
+
+
+def cargar(app):
+    """Lee el CSS crítico generado (create_app, antes del fork de gunicorn)"""
+    _cache.clear()
+    for pagina in PAGINAS:
+        ruta = os.path.join(app.instance_path, CARPETA, f'{pagina}.css')
+        try:
+            with open(ruta, 'r', encoding='utf-8') as f:
+                contenido = f.read()
+        except OSError:
+            _cache[pagina] = None
+            continue
+        version = re.match(r'/\* (\w+) \*/', contenido)
+        _cache[pagina] = {'css': contenido, 'version': version.group(1) if version else '',
+                          'hojas': PAGINAS[pagina]['hojas']}
+
+
+def css_critico(pagina):
+    """{'css', 'version', 'hojas'} si hay que incrustar el CSS crítico en esta petición
+
+    None si no se ha generado o si el navegador ya tiene las hojas completas
+    (cookie con la versión actual).
+    """
+    critico = _cache.get(pagina)
+    if critico is None or request.cookies.get(COOKIE) == critico['version']:
+        return None
+    return critico
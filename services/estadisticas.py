@@ -0,0 +1,216 @@
+"""
+Estadísticas de socios y actividades para la directiva (/admin/estadisticas)
+
+Calcularlas al abrir la página obliga a recorrer users, beneficiarios y todas
+las inscripciones (también las del archivo). generar() las deja
+precalculadas en cuatro tablas pequeñas que la página y la exportación leen
+directamente:
+
+- informes_estadisticas: cuándo se generaron y los totales;
+- estadisticas_actividades: inscritos, asistencias y aforo de cada actividad,
+  con un INSERT ... SELECT sobre las vistas de services/archivo.py;
+- estadisticas_meses: altas de socios y beneficiarios por mes (los
+  beneficiarios no tienen fecha de alta: cuentan en el mes de alta del
+  titular) y las actividades del mes, agrupando la tabla anterior;
+- estadisticas_edades: socios y beneficiarios en vigor por tramo de edad.
+
+Las vuelve a generar cada noche la tarea diaria 'estadisticas' de la cola, o
+la directiva con el botón Actualizar. Como con la lista de vencimientos, si
+al consultarlas no son de hoy se generan en ese momento.
+"""
+from datetime import datetime
+import time
+
+from sqlalchemy import Integer, case, delete, func, insert, literal, select
+
+from models import (Beneficiario, EstadisticaActividad, EstadisticaEdad, EstadisticaMes, InformeEstadisticas, User,
+                    db)
+from services import archivo
+
+# (desde, hasta, etiqueta); hasta None = sin límite
+TRAMOS_EDAD = [
+    (0, 11, '0 a 11'),
+    (12, 17, '12 a 17'),
+    (18, 29, '18 a 29'),
+    (30, 44, '30 a 44'),
+    (45, 64, '45 a 64'),
+    (65, None, '65 o más'),
+]
+SIN_DATO = 'Sin dato'
+
+MESES_PANEL = 24
+ACTIVIDADES_PANEL = 50
+
+
+def _tramo_sql(ano_nacimiento, ahora):
+    """Expresión SQL con el índice del tramo de edad (len(TRAMOS_EDAD) si no hay año de nacimiento)"""
+    edad = ahora.year - ano_nacimiento
+    condiciones = [(edad <= hasta if hasta is not None else edad >= desde, orden)
+                   for orden, (desde, hasta, _) in enumerate(TRAMOS_EDAD)]
+    return case(*condiciones, else_=len(TRAMOS_EDAD))
+
+
+def _actividades(informe):
+    """INSERT ... SELECT de una fila por actividad (trabajo y archivo)"""
+    actividades = archivo.actividades_historico
+    inscripciones = archivo.inscripciones_historico
+    por_actividad = (select(inscripciones.c.actividad_id,
+                            func.count().label('inscritos'),
+                            func.sum(inscripciones.c.asiste, type_=Integer).label('asistencias'))
+                     .group_by(inscripciones.c.actividad_id).subquery())
+    db.session.execute(insert(EstadisticaActividad).from_select(
+        ['informe_id', 'actividad_id', 'nombre', 'fecha', 'archivada', 'aforo', 'inscritos', 'asistencias'],
+        select(literal(informe.id), actividades.c.id, actividades.c.nombre, actividades.c.fecha,
+               actividades.c.archivada, actividades.c.aforo_maximo,
+               func.coalesce(por_actividad.c.inscritos, 0), func.coalesce(por_actividad.c.asistencias, 0))
+        .select_from(actividades.outerjoin(por_actividad, por_actividad.c.actividad_id == actividades.c.id)),
+    ))
+
+
+def _meses(informe):
+    mes_alta = func.strftime('%Y-%m', User.fecha_alta)
+    meses = {}
+
+    def fila(mes):
+        return meses.setdefault(mes, {'informe_id': informe.id, 'mes': mes, 'altas_socios': 0,
+                                      'altas_beneficiarios': 0, 'actividades': 0, 'plazas': 0,
+                                      'inscripciones': 0, 'asistencias': 0})
+
+    for mes, socios in db.session.execute(
+            select(mes_alta, func.count()).where(User.rol == 'socio').group_by(mes_alta)).all():
+        fila(mes)['altas_socios'] = socios
+    for mes, beneficiarios in db.session.execute(
+            select(mes_alta, func.count()).select_from(Beneficiario).join(User, Beneficiario.socio_id == User.id)
+            .group_by(mes_alta)).all():
+        fila(mes)['altas_beneficiarios'] = beneficiarios
+
+    mes_actividad = func.strftime('%Y-%m', EstadisticaActividad.fecha)
+    for mes, actividades, plazas, inscritos, asistencias in db.session.execute(
+            select(mes_actividad, func.count(), func.sum(EstadisticaActividad.aforo),
+                   func.sum(EstadisticaActividad.inscritos), func.sum(EstadisticaActividad.asistencias))
+            .where(EstadisticaActividad.informe_id == informe.id).group_by(mes_actividad)).all():
+        fila(mes).update(actividades=actividades, plazas=plazas, inscripciones=inscritos, asistencias=asistencias)
+
+    if meses:
+        db.session.execute(insert(EstadisticaMes), list(meses.values()))
+
+
+def _edades(informe, ahora):
+    cuentas = {}
+    for modelo, clave, condicion in (
+            (User, 'socios', User.rol == 'socio'),
+            (Beneficiario, 'beneficiarios', None)):
+        tramo = _tramo_sql(modelo.ano_nacimiento, ahora)
+        consulta = select(tramo, func.count()).where(modelo.fecha_validez >= ahora).group_by(tramo)
+        if condicion is not None:
+            consulta = consulta.where(condicion)
+        for orden, total in db.session.execute(consulta).all():
+            cuentas.setdefault(orden, {})[clave] = total
+
+    etiquetas = [etiqueta for _, _, etiqueta in TRAMOS_EDAD] + [SIN_DATO]
+    filas = [{'informe_id': informe.id, 'orden': orden, 'tramo': etiqueta,
+              'socios': cuentas.get(orden, {}).get('socios', 0),
+              'beneficiarios': cuentas.get(orden, {}).get('beneficiarios', 0)}
+             for orden, etiqueta in enumerate(etiquetas)]
+    # 'Sin dato' solo si hay alguno
+    if not (filas[-1]['socios'] or filas[-1]['beneficiarios']):
+        filas.pop()
+    db.session.execute(insert(EstadisticaEdad), filas)
+    informe.socios = sum(fila['socios'] for fila in filas)
+    informe.beneficiarios = sum(fila['beneficiarios'] for fila in filas)
+
+
+def generar(ahora=None):
+    """Vuelve a calcular todas las estadísticas (sustituye a las anteriores). Devuelve el InformeEstadisticas"""
+    inicio = time.perf_counter()
+    ahora = ahora or datetime.utcnow()
+    informe = InformeEstadisticas(generado=ahora)
+    try:
+        for modelo in (EstadisticaActividad, EstadisticaMes, EstadisticaEdad, InformeEstadisticas):
+            db.session.execute(delete(modelo))
+        db.session.add(informe)
+        db.session.flush()
+        _actividades(informe)
+        _meses(informe)
+        _edades(informe, ahora)
+        informe.actividades, informe.inscripciones, informe.asistencias = db.session.execute(
+            select(func.count(), func.coalesce(func.sum(EstadisticaActividad.inscritos), 0),
+                   func.coalesce(func.sum(EstadisticaActividad.asistencias), 0))
+            .where(EstadisticaActividad.informe_id == informe.id)
+        ).one()
+        informe.duracion_ms = int((time.perf_counter() - inicio) * 1000)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return informe
+
+
+def actual():
+    """Últimas estadísticas generadas, o None"""
+    return InformeEstadisticas.query.order_by(InformeEstadisticas.id.desc()).first()
+
+
+def al_dia():
+    """Estadísticas de hoy; si el worker aún no las ha generado, se generan ahora"""
+    informe = actual()
+    if informe is None or informe.generado.date() != datetime.utcnow().date():
+        informe = generar()
+    return informe
+
+
+def meses(informe, ultimos=None):
+    """Meses en orden, con 'total_socios' (acumulado de altas) y las tasas de ocupación y asistencia
+
+    Con ultimos solo devuelve los últimos meses (el acumulado cuenta desde el principio).
+    """
+    filas = EstadisticaMes.query.filter_by(informe_id=informe.id).order_by(EstadisticaMes.mes).all()
+    total = 0
+    resultado = []
+    for fila in filas:
+        total += fila.altas_socios
+        resultado.append({
+            'mes': fila.mes,
+            'altas_socios': fila.altas_socios,
+            'altas_beneficiarios': fila.altas_beneficiarios,
+            'total_socios': total,
+            'actividades': fila.actividades,
+            'plazas': fila.plazas,
+            'inscripciones': fila.inscripciones,
+            'asistencias': fila.asistencias,
+            'ocupacion': round(100 * fila.inscripciones / fila.plazas) if fila.plazas else 0,
+            'asistencia': round(100 * fila.asistencias / fila.inscripciones) if fila.inscripciones else 0,
+        })
+    return resultado[-ultimos:] if ultimos else resultado
+
+
+def edades(informe):
+    """Tramos de edad en orden"""
+    return EstadisticaEdad.query.filter_by(informe_id=informe.id).order_by(EstadisticaEdad.orden).all()
+
+
+def actividades(informe, limite=None):
+    """Actividades de la más reciente a la más antigua"""
+    consulta = (EstadisticaActividad.query.filter_by(informe_id=informe.id)
+                .order_by(EstadisticaActividad.fecha.desc(), EstadisticaActividad.actividad_id.desc()))
+    return consulta.limit(limite).all() if limite else consulta.all()
+
+
+def medias(informe):
+    """Ocupación media de las actividades ya hechas y asistencia media de las que tienen la asistencia pasada
+
+    Devuelve {'ocupacion', 'asistencia', 'realizadas', 'con_asistencia'} (porcentajes enteros).
+    """
+    pasadas = (EstadisticaActividad.informe_id == informe.id, EstadisticaActividad.fecha <= informe.generado)
+    realizadas, aforo, inscritos = db.session.execute(
+        select(func.count(), func.sum(EstadisticaActividad.aforo), func.sum(EstadisticaActividad.inscritos))
+        .where(*pasadas)).one()
+    con_asistencia, inscritos_pasados, asistencias = db.session.execute(
+        select(func.count(), func.sum(EstadisticaActividad.inscritos), func.sum(EstadisticaActividad.asistencias))
+        .where(*pasadas, EstadisticaActividad.asistencias > 0)).one()
+    return {
+        'ocupacion': round(100 * inscritos / aforo) if aforo else 0,
+        'asistencia': round(100 * asistencias / inscritos_pasados) if inscritos_pasados else 0,
+        'realizadas': realizadas,
+        'con_asistencia': con_asistencia,
+    }
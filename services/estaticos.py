@@ -0,0 +1,235 @@
+"""
+Archivos estáticos con huella de contenido
+
+construir_estaticos.py recorre static/ y genera static/dist/manifest.json:
+
+- CSS, JS, SVG y fuentes se copian a static/dist con el hash del contenido
+  en el nombre (css/style.css -> dist/css/style.3f2a1b9c04.css) y, los de
+  texto, con sus versiones precomprimidas .gz y .br al lado para que nginx
+  las sirva con gzip_static/brotli_static.
+- El resto (fotos, vídeos) no se duplica: su URL lleva el hash en ?v=.
+- Dentro de los CSS copiados, las referencias url(...) relativas (fuentes,
+  imágenes) se reescriben a sus rutas con huella, y la huella del CSS se
+  calcula sobre el contenido ya reescrito.
+
+url_for_estatico() sustituye a url_for en las plantillas (create_app lo
+registra como url_for de Jinja), así que url_for('static', filename=...)
+devuelve siempre una URL que cambia con el contenido y se puede cachear
+como immutable. Un archivo que no esté en el manifiesto (subido después
+del build) recibe igualmente ?v= con su hash, calculado una vez por proceso.
+"""
+import gzip
+import hashlib
+import json
+import os
+import posixpath
+import re
+import shutil
+import threading
+
+from flask import current_app, url_for
+
+try:
+    import brotli
+    BROTLI_AVAILABLE = True
+except ImportError:
+    BROTLI_AVAILABLE = False
+
+CARPETA_DIST = 'dist'
+NOMBRE_MANIFIESTO = 'manifest.json'
+
+# Extensiones que se copian con el hash en el nombre
+COPIAR = ('.css', '.js', '.svg', '.woff2', '.woff', '.ttf')
+# Extensiones de texto que además se precomprimen
+COMPRIMIR = ('.css', '.js', '.svg')
+# Carpetas de static/ que no se procesan (dist es la salida; las miniaturas ya llevan el hash en el nombre)
+EXCLUIR = (CARPETA_DIST, 'miniaturas')
+
+_URL_CSS = re.compile(r'url\(\s*([\'"]?)([^\'")]+)\1\s*\)')
+
+_lock = threading.Lock()
+_manifiesto = {}
+_hashes = {}  # ruta -> (mtime, hash) de los archivos que no están en el manifiesto
+
+
+def hash_archivo(ruta):
+    """Hash corto del contenido de un archivo"""
+    h = hashlib.sha1()
+    with open(ruta, 'rb') as f:
+        for bloque in iter(lambda: f.read(1024 * 1024), b''):
+            h.update(bloque)
+    return h.hexdigest()[:10]
+
+
+def _archivos(static_folder):
+    """Rutas relativas (con /) de los archivos de static/ a procesar"""
+    for raiz, carpetas, archivos in os.walk(static_folder):
+        relativa = os.path.relpath(raiz, static_folder)
+        if relativa == '.':
+            carpetas[:] = [c for c in carpetas if c not in EXCLUIR]
+            relativa = ''
+        carpetas.sort()
+        for nombre in sorted(archivos):
+            if nombre.startswith('.'):
+                continue
+            yield f'{relativa}/{nombre}'.lstrip('/').replace(os.sep, '/')
+
+
+def _precomprimir(ruta):
+    """Crea ruta.gz (y ruta.br si hay brotli) junto al archivo"""
+    with open(ruta, 'rb') as f:
+        datos = f.read()
+    with open(ruta + '.gz', 'wb') as f:
+        # mtime=0: el mismo contenido produce siempre el mismo .gz
+        f.write(gzip.compress(datos, compresslevel=9, mtime=0))
+    if BROTLI_AVAILABLE:
+        with open(ruta + '.br', 'wb') as f:
+            f.write(brotli.compress(datos, quality=11))
+
+
+def _reescribir_css(relativa, contenido, manifiesto):
+    """Cambia las url() relativas del CSS por las rutas con huella del manifiesto
+
+    Las rutas resultantes son relativas a la copia en dist/, que es desde
+    donde el navegador las resolverá.
+    """
+    carpeta = posixpath.dirname(relativa)
+    carpeta_dist = posixpath.join(CARPETA_DIST, carpeta)
+
+    def sustituir(m):
+        url = m.group(2).strip()
+        if url.startswith(('data:', '/', '#')) or '://' in url:
+            return m.group(0)
+        ruta, separador, resto = url.partition('?')
+        if not separador:
+            ruta, separador, resto = url.partition('#')
+        entrada = manifiesto.get(posixpath.normpath(posixpath.join(carpeta, ruta)))
+        if entrada is None:
+            return m.group(0)
+        nueva = posixpath.relpath(entrada['ruta'], carpeta_dist)
+        if entrada['v']:
+            nueva = f"{nueva}?v={entrada['v']}"
+        elif separador == '#':
+            nueva = f'{nueva}#{resto}'
+        return f'url("{nueva}")'
+
+    return _URL_CSS.sub(sustituir, contenido)
+
+
+def construir(static_folder):
+    """Genera las copias con huella, sus versiones comprimidas y el manifiesto
+
+    Es incremental: una copia que ya existe (mismo hash) no se vuelve a
+    escribir. Las copias de versiones anteriores que ya no están en el
+    manifiesto se borran. Los CSS se procesan al final, cuando ya se conocen
+    las rutas de todo lo que pueden referenciar. Devuelve (manifiesto,
+    copias_nuevas).
+    """
+    dist = os.path.join(static_folder, CARPETA_DIST)
+    manifiesto = {}
+    nuevas = 0
+    en_uso = set()
+    archivos = sorted(_archivos(static_folder), key=lambda r: r.lower().endswith('.css'))
+    for relativa in archivos:
+        origen = os.path.join(static_folder, relativa)
+        base, extension = os.path.splitext(relativa)
+        contenido = None
+        if extension.lower() == '.css':
+            with open(origen, 'r', encoding='utf-8') as f:
+                contenido = _reescribir_css(relativa, f.read(), manifiesto).encode('utf-8')
+            huella = hashlib.sha1(contenido).hexdigest()[:10]
+        else:
+            huella = hash_archivo(origen)
+        if extension.lower() not in COPIAR:
+            manifiesto[relativa] = {'ruta': relativa, 'v': huella}
+            continue
+
+        ruta_dist = f'{base}.{huella}{extension}'
+        destino = os.path.join(dist, ruta_dist)
+        en_uso.add(os.path.normpath(destino))
+        comprimir = extension.lower() in COMPRIMIR
+        if comprimir:
+            en_uso.add(os.path.normpath(destino + '.gz'))
+            en_uso.add(os.path.normpath(destino + '.br'))
+        if not os.path.exists(destino):
+            os.makedirs(os.path.dirname(destino), exist_ok=True)
+            if contenido is not None:
+                with open(destino, 'wb') as f:
+                    f.write(contenido)
+            else:
+                shutil.copy2(origen, destino)
+            nuevas += 1
+        if comprimir and (not os.path.exists(destino + '.gz')
+                          or (BROTLI_AVAILABLE and not os.path.exists(destino + '.br'))):
+            _precomprimir(destino)
+        manifiesto[relativa] = {'ruta': f'{CARPETA_DIST}/{ruta_dist}', 'v': None}
+
+    # Limpiar copias de versiones anteriores
+    ruta_manifiesto = os.path.join(dist, NOMBRE_MANIFIESTO)
+    if os.path.isdir(dist):
+        for raiz, _, archivos in os.walk(dist):
+            for nombre in archivos:
+                ruta = os.path.normpath(os.path.join(raiz, nombre))
+                if ruta not in en_uso and ruta != os.path.normpath(ruta_manifiesto):
+                    os.remove(ruta)
+
+    os.makedirs(dist, exist_ok=True)
+    temporal = f'{ruta_manifiesto}.{os.getpid()}.tmp'
+    with open(temporal, 'w', encoding='utf-8') as f:
+        json.dump(manifiesto, f, ensure_ascii=False, indent=0, sort_keys=True)
+    os.replace(temporal, ruta_manifiesto)
+    return manifiesto, nuevas
+
+
+def cargar(app):
+    """Carga el manifiesto en este proceso (create_app, antes del fork de gunicorn)"""
+    global _manifiesto
+    ruta = os.path.join(app.static_folder, CARPETA_DIST, NOMBRE_MANIFIESTO)
+    try:
+        with open(ruta, 'r', encoding='utf-8') as f:
+            _manifiesto = json.load(f)
+    except FileNotFoundError:
+        _manifiesto = {}
+        print("[INFO] Sin manifiesto de estáticos; ejecuta construir_estaticos.py para generarlo")
+    except (OSError, ValueError) as e:
+        _manifiesto = {}
+        print(f"[WARNING] No se pudo leer el manifiesto de estáticos: {e}")
+    with _lock:
+        _hashes.clear()
+
+
+def _huella_directa(static_folder, filename):
+    """Hash de un archivo que no está en el manifiesto (cacheado mientras no cambie)"""
+    ruta = os.path.join(static_folder, filename)
+    try:
+        mtime = os.stat(ruta).st_mtime
+    except OSError:
+        return None
+    cacheado = _hashes.get(filename)
+    if cacheado and cacheado[0] == mtime:
+        return cacheado[1]
+    huella = hash_archivo(ruta)
+    with _lock:
+        _hashes[filename] = (mtime, huella)
+    return huella
+
+
+def disponible(filename):
+    """True si el archivo está en el manifiesto o existe en static/"""
+    return filename in _manifiesto or os.path.isfile(os.path.join(current_app.static_folder, filename))
+
+
+def url_for_estatico(endpoint, **values):
+    """url_for que pone la huella de contenido en las URLs de static"""
+    if endpoint == 'static' and 'filename' in values:
+        filename = values['filename']
+        entrada = _manifiesto.get(filename)
+        if entrada is not None:
+            values['filename'] = entrada['ruta']
+            if entrada['v']:
+                values['v'] = entrada['v']
+        elif not filename.startswith('miniaturas/'):
+            huella = _huella_directa(current_app.static_folder, filename)
+            if huella:
+                values['v'] = huella
+    return url_for(endpoint, **values)
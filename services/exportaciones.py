@@ -0,0 +1,524 @@
+"""
+Exportaciones y copias de seguridad de la directiva
+
+Cada función genera el archivo completo y devuelve (datos, nombre, mimetype).
+Las usan tanto las vistas síncronas de blueprints/admin.py como las tareas
+en segundo plano de services/tareas.py, así que no dependen de la petición:
+los errores que hay que mostrar al usuario se lanzan como ErrorExportacion y
+el avance se notifica con el callback opcional progreso(procesados, total).
+"""
+import json
+import os
+import shutil
+import subprocess
+from datetime import datetime
+from io import BytesIO
+
+from openpyxl import Workbook
+from openpyxl.styles import Font, PatternFill, Alignment
+
+from sqlalchemy.orm import close_all_sessions
+
+from models import User, Actividad, Inscripcion, SolicitudSocio, BeneficiarioSolicitud, Beneficiario, ActividadArchivada, InscripcionArchivada, db
+from services import estadisticas, vencimientos
+
+MIMETYPE_EXCEL = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+
+class ErrorExportacion(Exception):
+    """Error con un mensaje apto para mostrar a la directiva"""
+
+
+def _avisar(progreso, procesados, total):
+    if progreso and (procesados % 100 == 0 or procesados == total):
+        progreso(procesados, total)
+
+
+def _direccion_completa(obj):
+    direccion_completa = ""
+    if obj.calle and obj.numero and obj.poblacion:
+        direccion_completa = f"{obj.calle} {obj.numero}"
+        if obj.piso:
+            direccion_completa += f", {obj.piso}"
+        direccion_completa += f", {obj.poblacion}"
+    return direccion_completa
+
+
+def _hoja(ws, headers, filas, column_widths, progreso=None, total=0):
+    """Escribe la cabecera con el estilo de la asociación y las filas en la hoja"""
+    # Estilos para encabezados
+    header_fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
+    header_font = Font(bold=True, color="FFFFFF", size=11)
+    header_alignment = Alignment(horizontal="center", vertical="center")
+
+    for col_num, header in enumerate(headers, 1):
+        cell = ws.cell(row=1, column=col_num)
+        cell.value = header
+        cell.fill = header_fill
+        cell.font = header_font
+        cell.alignment = header_alignment
+
+    for row_num, row_data in enumerate(filas, 2):
+        for col_num, value in enumerate(row_data, 1):
+            ws.cell(row=row_num, column=col_num, value=value)
+        _avisar(progreso, row_num - 1, total)
+
+    for col_num, width in enumerate(column_widths, 1):
+        ws.column_dimensions[ws.cell(row=1, column=col_num).column_letter].width = width
+
+
+def _libro_excel(titulo, headers, filas, column_widths, progreso=None, total=0):
+    """Crea el libro con la cabecera de la asociación y devuelve sus bytes"""
+    wb = Workbook()
+    ws = wb.active
+    ws.title = titulo
+    _hoja(ws, headers, filas, column_widths, progreso, total)
+
+    output = BytesIO()
+    wb.save(output)
+    return output.getvalue()
+
+
+def excel_socios(progreso=None):
+    """Todos los socios en Excel"""
+    # El estado de la suscripción sale de la misma consulta
+    socios = db.session.query(User, vencimientos.estado_sql()).filter(User.rol == 'socio').order_by(User.nombre).all()
+
+    headers = [
+        'Número Socio', 'Nombre', 'Nombre Usuario', 'Fecha Alta', 'Fecha Validez', 'Estado',
+        'Año Nacimiento', 'Fecha Nacimiento', 'Calle', 'Número', 'Piso', 'Población',
+        'Dirección Completa', 'Contraseña'
+    ]
+    filas = ([
+        socio.numero_socio or '',
+        socio.nombre,
+        socio.nombre_usuario,
+        socio.fecha_alta.strftime('%d/%m/%Y') if socio.fecha_alta else '',
+        socio.fecha_validez.strftime('%d/%m/%Y') if socio.fecha_validez else '',
+        vencimientos.ESTADOS[estado],
+        socio.ano_nacimiento or '',
+        socio.fecha_nacimiento.strftime('%d/%m/%Y') if socio.fecha_nacimiento else '',
+        socio.calle or '',
+        socio.numero or '',
+        socio.piso or '',
+        socio.poblacion or '',
+        _direccion_completa(socio),
+        socio.password_plain or ''
+    ] for socio, estado in socios)
+    column_widths = [12, 25, 20, 12, 12, 12, 12, 12, 20, 8, 10, 15, 40, 15]
+
+    datos = _libro_excel("Socios", headers, filas, column_widths, progreso, len(socios))
+    filename = f"socios_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
+    return datos, filename, MIMETYPE_EXCEL
+
+
+def excel_vencimientos(progreso=None):
+    """Lista del día de socios vencidos y por vencer en Excel (ver services/vencimientos.py)"""
+    lista = vencimientos.de_hoy()
+    filas_lista = vencimientos.listado(lista)
+
+    headers = ['Número Socio', 'Nombre', 'Nombre Usuario', 'Forma de Pago', 'Fecha Validez', 'Estado',
+               'Días', 'Beneficiarios']
+    filas = ([
+        fila.numero_socio or '',
+        fila.nombre,
+        fila.nombre_usuario,
+        fila.forma_de_pago or '',
+        fila.fecha_validez.strftime('%d/%m/%Y'),
+        vencimientos.ESTADOS[fila.estado],
+        (fila.fecha_validez.date() - lista.fecha).days,
+        fila.beneficiarios,
+    ] for fila in filas_lista)
+    column_widths = [12, 25, 20, 14, 12, 12, 8, 14]
+
+    datos = _libro_excel(f"Vencimientos {lista.fecha.strftime('%d-%m-%Y')}", headers, filas, column_widths,
+                         progreso, len(filas_lista))
+    filename = f"vencimientos_{lista.fecha.strftime('%Y%m%d')}.xlsx"
+    return datos, filename, MIMETYPE_EXCEL
+
+
+def excel_estadisticas(progreso=None):
+    """Estadísticas precalculadas en Excel: una hoja por mes, por edad y por actividad (ver services/estadisticas.py)"""
+    informe = estadisticas.al_dia()
+    meses = estadisticas.meses(informe)
+    actividades = estadisticas.actividades(informe)
+
+    wb = Workbook()
+    ws = wb.active
+    ws.title = 'Por mes'
+    _hoja(ws, ['Mes', 'Altas socios', 'Total socios', 'Altas beneficiarios', 'Actividades', 'Plazas',
+               'Inscripciones', 'Ocupación %', 'Asistencias', 'Asistencia %'],
+          ([mes['mes'], mes['altas_socios'], mes['total_socios'], mes['altas_beneficiarios'], mes['actividades'],
+            mes['plazas'], mes['inscripciones'], mes['ocupacion'], mes['asistencias'], mes['asistencia']]
+           for mes in meses),
+          [10, 12, 12, 18, 12, 10, 14, 13, 12, 13])
+    _hoja(wb.create_sheet('Por edad'), ['Edad', 'Socios', 'Beneficiarios'],
+          ([tramo.tramo, tramo.socios, tramo.beneficiarios] for tramo in estadisticas.edades(informe)),
+          [12, 10, 14])
+    _hoja(wb.create_sheet('Por actividad'),
+          ['Fecha', 'Actividad', 'Aforo', 'Inscritos', 'Ocupación %', 'Asistencias', 'Asistencia %', 'Archivada'],
+          ([actividad.fecha.strftime('%d/%m/%Y'), actividad.nombre, actividad.aforo, actividad.inscritos,
+            actividad.ocupacion, actividad.asistencias, actividad.asistencia, 'Sí' if actividad.archivada else 'No']
+           for actividad in actividades),
+          [12, 35, 8, 10, 13, 12, 13, 10], progreso, len(actividades))
+
+    output = BytesIO()
+    wb.save(output)
+    filename = f"estadisticas_{informe.generado.strftime('%Y%m%d')}.xlsx"
+    return output.getvalue(), filename, MIMETYPE_EXCEL
+
+
+def excel_solicitudes_confirmadas(progreso=None):
+    """Solicitudes confirmadas (estado 'activa') en Excel"""
+    from blueprints.admin import calcular_nombre_usuario_solicitud
+
+    solicitudes = SolicitudSocio.query.filter_by(estado='activa').order_by(SolicitudSocio.fecha_confirmacion.desc()).all()
+
+    headers = [
+        'Fecha Solicitud', 'Fecha Confirmación', 'Nombre', 'Primer Apellido', 'Segundo Apellido',
+        'Móvil', 'Móvil 2', 'Calle', 'Número', 'Piso', 'Población', 'Dirección Completa',
+        'Fecha Nacimiento', 'Miembros Familia', 'Forma de Pago', 'Nombre Usuario', 'Contraseña'
+    ]
+    filas = ([
+        solicitud.fecha_solicitud.strftime('%d/%m/%Y %H:%M') if solicitud.fecha_solicitud else '',
+        solicitud.fecha_confirmacion.strftime('%d/%m/%Y %H:%M') if solicitud.fecha_confirmacion else '',
+        solicitud.nombre,
+        solicitud.primer_apellido,
+        solicitud.segundo_apellido or '',
+        solicitud.movil,
+        solicitud.movil2 or '',
+        solicitud.calle or '',
+        solicitud.numero or '',
+        solicitud.piso or '',
+        solicitud.poblacion or '',
+        _direccion_completa(solicitud),
+        solicitud.fecha_nacimiento.strftime('%d/%m/%Y') if solicitud.fecha_nacimiento else '',
+        solicitud.miembros_unidad_familiar,
+        solicitud.forma_de_pago,
+        calcular_nombre_usuario_solicitud(solicitud),
+        solicitud.password_solicitud or ''
+    ] for solicitud in solicitudes)
+    column_widths = [18, 18, 15, 15, 15, 12, 12, 20, 8, 10, 15, 40, 15, 12, 12, 20, 15]
+
+    datos = _libro_excel("Solicitudes Confirmadas", headers, filas, column_widths, progreso, len(solicitudes))
+    filename = f"solicitudes_confirmadas_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
+    return datos, filename, MIMETYPE_EXCEL
+
+
+def _iso(valor):
+    return valor.isoformat() if valor else None
+
+
+def json_datos(progreso=None):
+    """Copia de todos los datos en JSON (formato que lee importar_datos)"""
+    datos = {
+        'fecha_exportacion': datetime.utcnow().isoformat(),
+        'version': '1.0',
+        'usuarios': [],
+        'actividades': [],
+        'inscripciones': [],
+        'beneficiarios': [],
+        'solicitudes_socio': [],
+        'beneficiarios_solicitud': [],
+        'actividades_archivo': [],
+        'inscripciones_archivo': []
+    }
+    tablas = 8
+
+    for usuario in User.query.all():
+        datos['usuarios'].append({
+            'id': usuario.id,
+            'nombre': usuario.nombre,
+            'nombre_usuario': usuario.nombre_usuario,
+            'password_hash': usuario.password_hash,
+            'password_plain': usuario.password_plain,
+            'rol': usuario.rol,
+            'fecha_alta': _iso(usuario.fecha_alta),
+            'fecha_validez': _iso(usuario.fecha_validez),
+            'ano_nacimiento': usuario.ano_nacimiento,
+            'fecha_nacimiento': _iso(usuario.fecha_nacimiento),
+            'numero_socio': usuario.numero_socio,
+            'calle': usuario.calle,
+            'numero': usuario.numero,
+            'piso': usuario.piso,
+            'poblacion': usuario.poblacion,
+            'forma_de_pago': usuario.forma_de_pago
+        })
+    if progreso:
+        progreso(1, tablas)
+
+    for actividad in Actividad.query.all():
+        datos['actividades'].append({
+            'id': actividad.id,
+            'nombre': actividad.nombre,
+            'descripcion': actividad.descripcion,
+            'fecha': _iso(actividad.fecha),
+            'aforo_maximo': actividad.aforo_maximo,
+            'edad_minima': actividad.edad_minima,
+            'edad_maxima': actividad.edad_maxima,
+            'fecha_creacion': _iso(actividad.fecha_creacion)
+        })
+    if progreso:
+        progreso(2, tablas)
+
+    for inscripcion in Inscripcion.query.all():
+        datos['inscripciones'].append({
+            'id': inscripcion.id,
+            'user_id': inscripcion.user_id,
+            'actividad_id': inscripcion.actividad_id,
+            'beneficiario_id': inscripcion.beneficiario_id,
+            'fecha_inscripcion': _iso(inscripcion.fecha_inscripcion),
+            'asiste': inscripcion.asiste
+        })
+    if progreso:
+        progreso(3, tablas)
+
+    for beneficiario in Beneficiario.query.all():
+        datos['beneficiarios'].append({
+            'id': beneficiario.id,
+            'socio_id': beneficiario.socio_id,
+            'nombre': beneficiario.nombre,
+            'primer_apellido': beneficiario.primer_apellido,
+            'segundo_apellido': beneficiario.segundo_apellido,
+            'ano_nacimiento': beneficiario.ano_nacimiento,
+            'fecha_validez': _iso(beneficiario.fecha_validez),
+            'numero_beneficiario': beneficiario.numero_beneficiario
+        })
+    if progreso:
+        progreso(4, tablas)
+
+    for solicitud in SolicitudSocio.query.all():
+        datos['solicitudes_socio'].append({
+            'id': solicitud.id,
+            'nombre': solicitud.nombre,
+            'primer_apellido': solicitud.primer_apellido,
+            'segundo_apellido': solicitud.segundo_apellido,
+            'movil': solicitud.movil,
+            'movil2': solicitud.movil2,
+            'fecha_nacimiento': _iso(solicitud.fecha_nacimiento),
+            'miembros_unidad_familiar': solicitud.miembros_unidad_familiar,
+            'forma_de_pago': solicitud.forma_de_pago,
+            'estado': solicitud.estado,
+            'fecha_solicitud': _iso(solicitud.fecha_solicitud),
+            'fecha_confirmacion': _iso(solicitud.fecha_confirmacion),
+            'password_solicitud': solicitud.password_solicitud,
+            'calle': solicitud.calle,
+            'numero': solicitud.numero,
+            'piso': solicitud.piso,
+            'poblacion': solicitud.poblacion
+        })
+    if progreso:
+        progreso(5, tablas)
+
+    for ben_sol in BeneficiarioSolicitud.query.all():
+        datos['beneficiarios_solicitud'].append({
+            'id': ben_sol.id,
+            'solicitud_id': ben_sol.solicitud_id,
+            'nombre': ben_sol.nombre,
+            'primer_apellido': ben_sol.primer_apellido,
+            'segundo_apellido': ben_sol.segundo_apellido,
+            'ano_nacimiento': ben_sol.ano_nacimiento
+        })
+    if progreso:
+        progreso(6, tablas)
+
+    for actividad in ActividadArchivada.query.all():
+        datos['actividades_archivo'].append({
+            'id': actividad.id,
+            'nombre': actividad.nombre,
+            'descripcion': actividad.descripcion,
+            'fecha': _iso(actividad.fecha),
+            'aforo_maximo': actividad.aforo_maximo,
+            'edad_minima': actividad.edad_minima,
+            'edad_maxima': actividad.edad_maxima,
+            'bloqueada_inscripcion': actividad.bloqueada_inscripcion,
+            'fecha_creacion': _iso(actividad.fecha_creacion),
+            'archivada': _iso(actividad.archivada)
+        })
+    if progreso:
+        progreso(7, tablas)
+
+    for inscripcion in InscripcionArchivada.query.all():
+        datos['inscripciones_archivo'].append({
+            'inscripcion_id': inscripcion.inscripcion_id,
+            'user_id': inscripcion.user_id,
+            'actividad_id': inscripcion.actividad_id,
+            'beneficiario_id': inscripcion.beneficiario_id,
+            'fecha_inscripcion': _iso(inscripcion.fecha_inscripcion),
+            'asiste': inscripcion.asiste,
+            'asistencia_actualizada': _iso(inscripcion.asistencia_actualizada)
+        })
+    if progreso:
+        progreso(8, tablas)
+
+    json_data = json.dumps(datos, indent=2, ensure_ascii=False)
+    filename = f"backup_asociacion_{datetime.now().strftime('%Y%m%d_%H%M%S')}.txt"
+    return json_data.encode('utf-8'), filename, 'text/plain'
+
+
+# ---------------------------------------------------------------------------
+# Base de datos completa
+# ---------------------------------------------------------------------------
+
+def ruta_sqlite(app):
+    """Ruta del archivo SQLite (instance/ primero, luego el directorio raíz)"""
+    database_url = app.config.get('SQLALCHEMY_DATABASE_URI', 'sqlite:///asociacion.db')
+    db_path = database_url.replace('sqlite:///', '')
+    if not os.path.isabs(db_path):
+        instance_path = os.path.join(app.instance_path, db_path)
+        if os.path.exists(instance_path):
+            db_path = instance_path
+        elif os.path.exists(db_path):
+            pass
+        else:
+            # Si no existe en ninguna ubicación, usar instance/
+            db_path = instance_path
+    return db_path
+
+
+def _datos_postgres(database_url):
+    from urllib.parse import urlparse
+    parsed = urlparse(database_url)
+    env = os.environ.copy()
+    env['PGPASSWORD'] = parsed.password
+    conexion = ['-h', parsed.hostname, '-p', str(parsed.port or 5432),
+                '-U', parsed.username, '-d', parsed.path.lstrip('/')]
+    return conexion, env
+
+
+def copia_base_datos(app):
+    """Base de datos completa: el archivo .db en SQLite o un dump SQL en PostgreSQL"""
+    database_url = app.config.get('SQLALCHEMY_DATABASE_URI', 'sqlite:///asociacion.db')
+    fecha_str = datetime.now().strftime('%Y%m%d_%H%M%S')
+
+    if 'sqlite' in database_url.lower():
+        db_path = ruta_sqlite(app)
+        if not os.path.exists(db_path):
+            raise ErrorExportacion(f'No se encontró el archivo de base de datos SQLite en: {db_path}')
+
+        # Cerrar todas las conexiones y hacer checkpoint de WAL para asegurar consistencia
+        try:
+            close_all_sessions()
+            db.engine.dispose()
+
+            from sqlalchemy import text
+            with db.engine.connect() as conn:
+                conn.execute(text('PRAGMA wal_checkpoint(FULL);'))
+                conn.commit()
+
+            close_all_sessions()
+            db.engine.dispose()
+        except Exception as e:
+            print(f"[WARNING] No se pudo hacer checkpoint de WAL: {e}")
+
+        with open(db_path, 'rb') as f:
+            db_data = f.read()
+        return db_data, f'backup_bd_completa_{fecha_str}.db', 'application/x-sqlite3'
+
+    elif 'postgres' in database_url.lower():
+        conexion, env = _datos_postgres(database_url)
+        cmd = ['pg_dump'] + conexion + ['--no-owner', '--no-acl', '--clean', '--if-exists']
+
+        try:
+            subprocess.run(['pg_dump', '--version'], capture_output=True, timeout=5)
+        except (subprocess.TimeoutExpired, FileNotFoundError, OSError):
+            raise ErrorExportacion('pg_dump no está disponible en el sistema. La descarga de PostgreSQL requiere que pg_dump esté instalado.')
+
+        try:
+            result = subprocess.run(cmd, env=env, capture_output=True, text=True,
+                                    timeout=300)  # 5 minutos máximo
+        except subprocess.TimeoutExpired:
+            raise ErrorExportacion('La operación de dump tardó demasiado tiempo. Inténtalo de nuevo.')
+        except FileNotFoundError:
+            raise ErrorExportacion('pg_dump no está disponible en el sistema. La descarga de PostgreSQL requiere que pg_dump esté instalado.')
+
+        if result.returncode != 0:
+            error_msg = result.stderr if result.stderr else 'Error desconocido al generar dump'
+            raise ErrorExportacion(f'Error al generar dump de PostgreSQL: {error_msg}')
+
+        return result.stdout.encode('utf-8'), f'backup_bd_completa_{fecha_str}.sql', 'application/sql'
+
+    raise ErrorExportacion('Tipo de base de datos no soportado para descarga completa.')
+
+
+def restaurar_base_datos(app, archivo_data, motivo='restauracion'):
+    """Sustituye la base de datos por la copia recibida
+
+    Devuelve una lista de avisos (mensaje, categoría) para mostrar con flash.
+    En SQLite se guarda antes una copia del archivo actual junto a él.
+    """
+    database_url = app.config.get('SQLALCHEMY_DATABASE_URI', 'sqlite:///asociacion.db')
+    avisos = []
+
+    if 'sqlite' in database_url.lower():
+        db_path = ruta_sqlite(app)
+
+        if len(archivo_data) == 0:
+            raise ErrorExportacion('El archivo de base de datos está vacío.')
+
+        # Validar que sea un archivo SQLite válido (debe empezar con "SQLite format 3")
+        if not archivo_data.startswith(b'SQLite format 3\x00'):
+            raise ErrorExportacion('El archivo no parece ser un archivo SQLite válido.')
+
+        # Cerrar todas las conexiones antes de restaurar
+        close_all_sessions()
+        db.engine.dispose()
+
+        # Hacer backup del archivo actual antes de restaurar
+        if os.path.exists(db_path):
+            backup_actual = f"{db_path}.backup_antes_{motivo}_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+            try:
+                shutil.copy2(db_path, backup_actual)
+                avisos.append((f'Se creó un backup del archivo actual en: {backup_actual}', 'info'))
+            except Exception as e:
+                avisos.append((f'Advertencia: No se pudo crear backup del archivo actual: {e}', 'warning'))
+
+        # Eliminar archivos auxiliares de WAL si existen (para evitar inconsistencias)
+        for archivo_aux in (f"{db_path}-shm", f"{db_path}-wal", f"{db_path}.shm", f"{db_path}.wal"):
+            if os.path.exists(archivo_aux):
+                try:
+                    os.remove(archivo_aux)
+                except Exception as e:
+                    print(f"[WARNING] No se pudo eliminar archivo auxiliar {archivo_aux}: {e}")
+
+        db_dir = os.path.dirname(db_path)
+        if db_dir and not os.path.exists(db_dir):
+            os.makedirs(db_dir, exist_ok=True)
+
+        with open(db_path, 'wb') as f:
+            f.write(archivo_data)
+
+        if not os.path.exists(db_path) or os.path.getsize(db_path) != len(archivo_data):
+            raise ErrorExportacion('Error al escribir el archivo de base de datos. La restauración puede estar incompleta.')
+
+        # Reiniciar conexiones de SQLAlchemy
+        close_all_sessions()
+        db.engine.dispose()
+        return avisos
+
+    elif 'postgres' in database_url.lower():
+        conexion, env = _datos_postgres(database_url)
+        contenido_sql = archivo_data.decode('utf-8')
+
+        try:
+            subprocess.run(['psql', '--version'], capture_output=True, timeout=5)
+        except (subprocess.TimeoutExpired, FileNotFoundError, OSError):
+            raise ErrorExportacion('psql no está disponible en el sistema. La restauración de PostgreSQL requiere que psql esté instalado.')
+
+        try:
+            result = subprocess.run(['psql'] + conexion + ['-f', '-'], input=contenido_sql, env=env,
+                                    capture_output=True, text=True, timeout=600)  # 10 minutos máximo
+        except subprocess.TimeoutExpired:
+            raise ErrorExportacion('La operación de restauración tardó demasiado tiempo. Inténtalo de nuevo.')
+        except FileNotFoundError:
+            raise ErrorExportacion('psql no está disponible en el sistema. La restauración de PostgreSQL requiere que psql esté instalado.')
+
+        if result.returncode != 0:
+            error_msg = result.stderr if result.stderr else 'Error desconocido al restaurar'
+            raise ErrorExportacion(f'Error al restaurar PostgreSQL: {error_msg}')
+
+        close_all_sessions()
+        db.engine.dispose()
+        return avisos
+
+    raise ErrorExportacion('Tipo de base de datos no soportado para restauración.')
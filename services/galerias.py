@@ -0,0 +1,293 @@
+"""
+Manifiesto de las galerías de fotos (static/galerias)
+
+En lugar de recorrer las carpetas en cada visita, el contenido de cada
+carpeta (imágenes con sus dimensiones, vídeo y mtime de la carpeta) se
+guarda en un manifiesto JSON (GALERIAS_MANIFIESTO). create_app() lo carga al
+arrancar, así que con preload_app todos los workers de gunicorn lo heredan
+ya construido, y la vista de la galería queda en una consulta a un
+diccionario.
+
+Cada COMPROBAR_CADA segundos se comprueba el mtime de las carpetas y del
+propio JSON: si se han subido fotos se vuelve a escanear solo la carpeta
+cambiada, y si otro proceso (o actualizar_galerias.py) ha reescrito el JSON
+se recarga.
+
+Cada imagen lleva además el hash de su contenido y, si ya se han generado,
+sus versiones reducidas (services/miniaturas.py) para el srcset.
+"""
+from bisect import bisect_right
+import json
+import os
+import threading
+import time
+
+from services import cache_paginas, miniaturas
+
+if miniaturas.PIL_AVAILABLE:
+    from PIL import Image
+
+# Secciones de "Nuestras Fiestas": cada una usa una o varias carpetas físicas de static/galerias
+SECCIONES = {
+    'nuevo-parque': {
+        'titulo': 'Nuevo Parque',
+        'icono': 'bi bi-tree-fill',
+        'carpetas': ['inauguracion-parque'],
+    },
+    # Alias para que también funcione si se usa la carpeta como slug en la URL
+    'inauguracion-parque': {
+        'titulo': 'Nuevo Parque',
+        'icono': 'bi bi-tree-fill',
+        'carpetas': ['inauguracion-parque'],
+    },
+    'navidad': {
+        'titulo': 'El Barrio de la Navidad',
+        'icono': 'bi bi-snow',
+        'carpetas': ['navidad'],
+    },
+    'ferias-y-fiestas': {
+        'titulo': 'Ferias y Fiestas',
+        'icono': 'bi bi-calendar-event',
+        # Ferias y Fiestas incluirá también las fotos de Semana Cultural
+        'carpetas': ['ferias-y-fiestas', 'semanacultural'],
+    },
+    'halloween': {
+        'titulo': 'Halloween',
+        'icono': 'bi bi-ghost',
+        'carpetas': ['halloween'],
+    },
+    'cabalgata': {
+        'titulo': 'Cabalgata',
+        'icono': 'bi bi-truck',
+        'carpetas': ['cabalgata'],
+    },
+    'estrellas': {
+        'titulo': 'Estrellas',
+        'icono': 'bi bi-stars',
+        'carpetas': ['estrellas'],
+    },
+    'concetracionmotera': {
+        'titulo': 'Concentración Motera',
+        'icono': 'bi bi-flag',
+        'carpetas': ['concetracionmotera'],
+        'tipo': 'video',
+    },
+}
+
+IMAGEN_EXTENSIONES = ('.jpg', '.jpeg', '.png', '.gif', '.webp')
+VIDEO_EXTENSIONES = ('.mp4', '.webm', '.ogg', '.mov', '.m4v')
+
+# Orientaciones EXIF que giran la imagen 90º (ancho y alto intercambiados)
+_ORIENTACIONES_GIRADAS = (5, 6, 7, 8)
+
+COMPROBAR_CADA = 30  # segundos
+TAMANO_PAGINA = 24  # fotos por página en la galería y en su API
+
+_lock = threading.Lock()
+_estado = {
+    'carpetas': {},        # carpeta -> entrada del manifiesto
+    'secciones': {},       # seccion -> datos ya combinados para la plantilla
+    'comprobado': 0.0,
+    'mtime_json': None,
+}
+
+
+def carpetas_usadas():
+    """Carpetas físicas referenciadas por alguna sección"""
+    return sorted({carpeta for config in SECCIONES.values() for carpeta in config['carpetas']})
+
+
+def _mtime(ruta):
+    try:
+        return os.stat(ruta).st_mtime
+    except OSError:
+        return None
+
+
+def _dimensiones(ruta):
+    """(ancho, alto) tal como se ve la foto (con la orientación EXIF aplicada)"""
+    if not miniaturas.PIL_AVAILABLE:
+        return None, None
+    try:
+        with Image.open(ruta) as imagen:
+            ancho, alto = imagen.size
+            if imagen.getexif().get(0x0112) in _ORIENTACIONES_GIRADAS:
+                ancho, alto = alto, ancho
+            return ancho, alto
+    except Exception:
+        return None, None
+
+
+def escanear_carpeta(static_folder, carpeta, anterior=None):
+    """Entrada del manifiesto para una carpeta de static/galerias
+
+    Las dimensiones y el hash de las fotos que no han cambiado (mismo tamaño
+    y mtime) se reutilizan de la entrada anterior para no volver a leerlas.
+    Las versiones reducidas se comprueban siempre.
+    """
+    directorio = os.path.join(static_folder, 'galerias', carpeta)
+    entrada = {'mtime': _mtime(directorio), 'imagenes': [], 'video': None}
+    if entrada['mtime'] is None:
+        return entrada
+
+    previas = {imagen['archivo']: imagen for imagen in (anterior or {}).get('imagenes', [])}
+    with os.scandir(directorio) as it:
+        elementos = sorted((e for e in it if e.is_file()), key=lambda e: e.name)
+    for elemento in elementos:
+        nombre_lower = elemento.name.lower()
+        if nombre_lower.endswith(IMAGEN_EXTENSIONES):
+            info = elemento.stat()
+            imagen = previas.get(elemento.name)
+            if not (imagen and imagen['tamano'] == info.st_size and imagen['mtime'] == info.st_mtime
+                    and imagen.get('hash')):
+                ancho, alto = _dimensiones(elemento.path)
+                imagen = {
+                    'archivo': elemento.name,
+                    'ruta': f'galerias/{carpeta}/{elemento.name}',
+                    'ancho': ancho,
+                    'alto': alto,
+                    'tamano': info.st_size,
+                    'mtime': info.st_mtime,
+                    'hash': miniaturas.hash_archivo(elemento.path),
+                }
+            else:
+                imagen = dict(imagen)
+            imagen['versiones'] = miniaturas.versiones(static_folder, imagen['hash'], imagen['ancho'])
+            entrada['imagenes'].append(imagen)
+        elif nombre_lower.endswith(VIDEO_EXTENSIONES) and entrada['video'] is None:
+            entrada['video'] = f'galerias/{carpeta}/{elemento.name}'
+    return entrada
+
+
+def construir(static_folder, anterior=None, forzar=False):
+    """Manifiesto completo; solo se reescanean las carpetas cuyo mtime ha cambiado
+
+    Con forzar se reescanean todas (p. ej. tras generar miniaturas), aunque
+    se siguen reutilizando los datos de las fotos que no han cambiado.
+    """
+    anterior = anterior or {}
+    manifiesto = {}
+    for carpeta in carpetas_usadas():
+        previa = anterior.get(carpeta)
+        directorio = os.path.join(static_folder, 'galerias', carpeta)
+        if not forzar and previa is not None and previa['mtime'] == _mtime(directorio):
+            manifiesto[carpeta] = previa
+        else:
+            manifiesto[carpeta] = escanear_carpeta(static_folder, carpeta, previa)
+    return manifiesto
+
+
+def fotos(manifiesto):
+    """Todas las imágenes del manifiesto (para generar sus miniaturas)"""
+    return [imagen for entrada in manifiesto.values() for imagen in entrada.get('imagenes', [])]
+
+
+def leer(ruta):
+    """Manifiesto guardado en disco ({} si no existe o no se puede leer)"""
+    try:
+        with open(ruta, 'r', encoding='utf-8') as f:
+            datos = json.load(f)
+        return datos.get('carpetas', {})
+    except (OSError, ValueError):
+        return {}
+
+
+def guardar(ruta, manifiesto):
+    """Escribe el manifiesto de forma atómica (los demás workers nunca ven un JSON a medias)"""
+    os.makedirs(os.path.dirname(ruta), exist_ok=True)
+    temporal = f'{ruta}.{os.getpid()}.tmp'
+    with open(temporal, 'w', encoding='utf-8') as f:
+        json.dump({'generado': time.time(), 'carpetas': manifiesto}, f, ensure_ascii=False)
+    os.replace(temporal, ruta)
+
+
+def _publicar(manifiesto, mtime_json):
+    _estado['carpetas'] = manifiesto
+    _estado['secciones'] = {}
+    _estado['mtime_json'] = mtime_json
+    _estado['comprobado'] = time.monotonic()
+
+
+def actualizar(app, forzar=False):
+    """Reconstruye lo que haya cambiado, guarda el JSON y lo publica en este proceso
+
+    Devuelve True si el manifiesto ha cambiado.
+    """
+    ruta = app.config['GALERIAS_MANIFIESTO']
+    with _lock:
+        anterior = _estado['carpetas'] or leer(ruta)
+        manifiesto = construir(app.static_folder, anterior, forzar)
+        cambiado = forzar or manifiesto != anterior or not os.path.exists(ruta)
+        if cambiado:
+            guardar(ruta, manifiesto)
+            # Las páginas de galería cacheadas ya no reflejan las carpetas
+            cache_paginas.purgar(app, 'auth.galeria')
+        _publicar(manifiesto, _mtime(ruta))
+    return cambiado
+
+
+def iniciar(app):
+    """Carga el manifiesto al arrancar (lo construye si falta o está desfasado)"""
+    try:
+        actualizar(app)
+    except Exception as e:
+        print(f"[WARNING] No se pudo preparar el manifiesto de galerías: {e}")
+
+
+def _comprobar(app):
+    """Revisa, como mucho cada COMPROBAR_CADA segundos, si hay que recargar o reescanear"""
+    if time.monotonic() - _estado['comprobado'] < COMPROBAR_CADA:
+        return
+    ruta = app.config['GALERIAS_MANIFIESTO']
+    mtime_json = _mtime(ruta)
+    if mtime_json is not None and mtime_json != _estado['mtime_json']:
+        # Otro proceso ha reescrito el manifiesto
+        with _lock:
+            _publicar(leer(ruta), mtime_json)
+    carpetas = _estado['carpetas']
+    for carpeta in carpetas_usadas():
+        entrada = carpetas.get(carpeta)
+        directorio = os.path.join(app.static_folder, 'galerias', carpeta)
+        if entrada is None or entrada['mtime'] != _mtime(directorio):
+            actualizar(app)
+            return
+    _estado['comprobado'] = time.monotonic()
+
+
+def galeria(app, seccion):
+    """Datos de una sección para la plantilla, o None si la sección no existe
+
+    {'config', 'imagenes' (entradas del manifiesto ordenadas por ruta), 'video'}
+    """
+    config = SECCIONES.get(seccion)
+    if config is None:
+        return None
+    _comprobar(app)
+    datos = _estado['secciones'].get(seccion)
+    if datos is None:
+        carpetas = _estado['carpetas']
+        imagenes = []
+        video = None
+        for carpeta in config['carpetas']:
+            entrada = carpetas.get(carpeta) or {}
+            imagenes.extend(entrada.get('imagenes', []))
+            if video is None:
+                video = entrada.get('video')
+        imagenes.sort(key=lambda imagen: imagen['ruta'])
+        datos = {'config': config, 'imagenes': imagenes, 'video': video,
+                 'claves': [imagen['ruta'] for imagen in imagenes]}
+        _estado['secciones'][seccion] = datos
+    return datos
+
+
+def pagina(datos, cursor=None, tamano=TAMANO_PAGINA):
+    """Una página de fotos de la sección a partir del cursor
+
+    El cursor es la ruta de la última foto ya mostrada, no una posición: si
+    se suben fotos mientras alguien navega, la siguiente página sigue justo
+    después de lo que ya tiene. Devuelve (imagenes, siguiente_cursor o None).
+    """
+    inicio = bisect_right(datos['claves'], cursor) if cursor else 0
+    imagenes = datos['imagenes'][inicio:inicio + tamano]
+    siguiente = imagenes[-1]['ruta'] if imagenes and inicio + tamano < len(datos['imagenes']) else None
+    return imagenes, siguiente
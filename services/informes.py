@@ -0,0 +1,518 @@
+"""
+Motor compartido de generación de PDFs (ReportLab)
+
+Los estilos de párrafo, los estilos de tabla y los logos decodificados se
+construyen una sola vez por proceso. precargar() se llama desde post_fork en
+gunicorn_config.py para que el primer PDF de cada worker no pague ese coste.
+
+Los documentos se describen de forma declarativa como una lista de bloques
+(tuplas con datos simples) que construir_pdf() convierte en flowables:
+
+    ('logo', nombre_archivo, ancho, alto)
+    ('titulo', texto, estilo)
+    ('parrafo', texto, estilo)
+    ('espacio', alto_en_cm)
+    ('tabla', filas, estilo_tabla, anchos_en_cm)
+    ('qr', texto, lado_en_cm)
+    ('salto_pagina',)
+
+En las filas de una tabla cada celda es un texto plano o una tupla
+(texto, estilo) que se convierte en Paragraph. Al ser datos simples, los
+bloques se pueden enviar a otros procesos (ver carnets por lotes).
+"""
+from datetime import datetime
+from functools import lru_cache
+from io import BytesIO
+import os
+import threading
+
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.lib.units import cm
+from reportlab.lib.utils import ImageReader
+from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, PageBreak, Flowable
+from reportlab.lib import colors
+from reportlab.lib.enums import TA_CENTER
+from reportlab.graphics.barcode.qr import QrCodeWidget
+from reportlab.graphics.shapes import Drawing
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'static')
+
+# Logos que se decodifican al arrancar cada worker
+LOGOS_PRECARGADOS = ('logo_carnet.jpg', 'logo.jpg')
+
+_lock = threading.Lock()
+
+
+@lru_cache(maxsize=None)
+def obtener_estilos():
+    """Devuelve el diccionario de estilos de párrafo compartido por todos los PDFs"""
+    base = getSampleStyleSheet()
+    normal = base['Normal']
+    return {
+        'normal': normal,
+        'seccion': base['Heading2'],
+        'titulo': ParagraphStyle(
+            'Titulo',
+            parent=base['Heading1'],
+            fontSize=18,
+            textColor=colors.HexColor('#333333'),
+            spaceAfter=30,
+            alignment=TA_CENTER
+        ),
+        'titulo_carnet': ParagraphStyle(
+            'TituloCarnet',
+            parent=base['Heading1'],
+            fontSize=20,
+            textColor=colors.HexColor('#333333'),
+            spaceAfter=20,
+            alignment=TA_CENTER,
+            fontName='Helvetica-Bold'
+        ),
+        'negrita': ParagraphStyle('Negrita', parent=normal, fontSize=11, fontName='Helvetica-Bold'),
+        'fecha': ParagraphStyle('Fecha', parent=normal, fontSize=10, textColor=colors.grey, alignment=TA_CENTER),
+        'subtitulo': ParagraphStyle('Subtitulo', parent=normal, fontSize=12, textColor=colors.grey, alignment=TA_CENTER),
+        'nota': ParagraphStyle('Nota', parent=normal, fontSize=9, textColor=colors.grey, alignment=TA_CENTER, fontName='Helvetica-Oblique'),
+        'usuario_col': ParagraphStyle('UsuarioCol', parent=normal, fontSize=8, leading=10),
+        'fecha_col': ParagraphStyle('FechaCol', parent=normal, fontSize=7, leading=8, alignment=TA_CENTER),
+    }
+
+
+@lru_cache(maxsize=None)
+def obtener_estilos_tabla():
+    """Devuelve los TableStyle compartidos (se pueden reutilizar entre tablas)"""
+    cabecera_oscura = [
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#333333')),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+        ('GRID', (0, 0), (-1, -1), 1, colors.black),
+    ]
+    filas_alternas = [
+        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+        ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#f9f9f9')]),
+    ]
+    return {
+        'listado': TableStyle(cabecera_oscura + filas_alternas + [
+            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+            ('FONTSIZE', (0, 0), (-1, 0), 11),
+        ]),
+        'estadisticas': TableStyle(cabecera_oscura + [
+            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+            ('FONTSIZE', (0, 0), (-1, 0), 11),
+            ('FONTSIZE', (0, 1), (-1, 1), 14),
+        ]),
+        'inscritos': TableStyle(cabecera_oscura + filas_alternas + [
+            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+            ('ALIGN', (0, 0), (0, -1), 'CENTER'),  # Columna #
+            ('ALIGN', (3, 1), (3, -1), 'CENTER'),   # Columna edad
+            ('ALIGN', (4, 1), (4, -1), 'CENTER'),   # Columna fecha
+            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+            ('FONTSIZE', (0, 0), (-1, 0), 9),
+            ('FONTSIZE', (0, 1), (-1, -1), 9),
+            ('FONTSIZE', (4, 1), (4, -1), 7),
+        ]),
+        'datos': TableStyle([
+            ('ALIGN', (0, 0), (0, -1), 'LEFT'),
+            ('ALIGN', (1, 0), (1, -1), 'LEFT'),
+            ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+            ('FONTSIZE', (0, 0), (-1, -1), 10),
+            ('LEFTPADDING', (0, 0), (-1, -1), 5),
+            ('RIGHTPADDING', (0, 0), (-1, -1), 5),
+            ('TOPPADDING', (0, 0), (-1, -1), 5),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 5),
+        ]),
+        'beneficiarios': TableStyle(filas_alternas + [
+            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#E0E0E0')),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.black),
+            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, 0), 10),
+            ('FONTSIZE', (0, 1), (-1, -1), 9),
+            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+            ('GRID', (0, 0), (-1, -1), 1, colors.black),
+        ]),
+    }
+
+
+@lru_cache(maxsize=None)
+def obtener_logo(nombre):
+    """Devuelve el ImageReader de un logo de static/ (None si no existe)"""
+    ruta = os.path.join(STATIC_DIR, nombre)
+    if not os.path.exists(ruta):
+        return None
+    with open(ruta, 'rb') as f:
+        datos = f.read()
+    lector = ImageReader(BytesIO(datos))
+    lector.getSize()  # Forzar la lectura de la cabecera ahora y no en el primer PDF
+    return lector
+
+
+def precargar():
+    """Construye estilos y decodifica logos (llamar una vez por proceso)"""
+    with _lock:
+        obtener_estilos()
+        obtener_estilos_tabla()
+        for nombre in LOGOS_PRECARGADOS:
+            obtener_logo(nombre)
+
+
+def limpiar_cache():
+    """Vacía las cachés del módulo (útil en benchmarks y tras cambiar los logos)"""
+    obtener_estilos.cache_clear()
+    obtener_estilos_tabla.cache_clear()
+    obtener_logo.cache_clear()
+
+
+class Logo(Flowable):
+    """Flowable que dibuja un ImageReader ya decodificado"""
+
+    def __init__(self, lector, ancho, alto):
+        super().__init__()
+        self.lector = lector
+        self.width = ancho
+        self.height = alto
+        self.hAlign = 'CENTER'
+
+    def wrap(self, availWidth, availHeight):
+        return self.width, self.height
+
+    def draw(self):
+        self.canv.drawImage(self.lector, 0, 0, width=self.width, height=self.height)
+
+
+def _fondo_azul(canvas, doc):
+    """Fondo azul claro a página completa (carnets)"""
+    canvas.saveState()
+    canvas.setFillColor(colors.HexColor('#E3F2FD'))
+    canvas.rect(0, 0, A4[0], A4[1], fill=1, stroke=0)
+    canvas.restoreState()
+
+
+FONDOS = {
+    'azul': _fondo_azul,
+}
+
+
+def _qr(texto, lado):
+    """Código QR de `lado` puntos, centrado"""
+    widget = QrCodeWidget(texto, barLevel='M')
+    x1, y1, x2, y2 = widget.getBounds()
+    dibujo = Drawing(lado, lado, transform=[lado / (x2 - x1), 0, 0, lado / (y2 - y1), 0, 0])
+    dibujo.add(widget)
+    dibujo.hAlign = 'CENTER'
+    return dibujo
+
+
+def _celda(valor, estilos):
+    if isinstance(valor, tuple):
+        texto, estilo = valor
+        return Paragraph(texto, estilos[estilo])
+    return valor
+
+
+def _flowables(bloques):
+    estilos = obtener_estilos()
+    estilos_tabla = obtener_estilos_tabla()
+    story = []
+    for bloque in bloques:
+        tipo = bloque[0]
+        if tipo == 'logo':
+            _, nombre, ancho, alto = bloque
+            lector = obtener_logo(nombre)
+            if lector is not None:
+                story.append(Logo(lector, ancho, alto))
+                story.append(Spacer(1, 0.5*cm))
+        elif tipo in ('titulo', 'parrafo'):
+            texto = bloque[1]
+            estilo = bloque[2] if len(bloque) > 2 else ('titulo' if tipo == 'titulo' else 'normal')
+            story.append(Paragraph(texto, estilos[estilo]))
+        elif tipo == 'espacio':
+            story.append(Spacer(1, bloque[1]*cm))
+        elif tipo == 'tabla':
+            _, filas, estilo_tabla, anchos = bloque
+            tabla = Table([[_celda(c, estilos) for c in fila] for fila in filas],
+                          colWidths=[a*cm for a in anchos])
+            tabla.setStyle(estilos_tabla[estilo_tabla])
+            story.append(tabla)
+        elif tipo == 'qr':
+            story.append(_qr(bloque[1], bloque[2]*cm))
+        elif tipo == 'salto_pagina':
+            story.append(PageBreak())
+        else:
+            raise ValueError(f'Tipo de bloque desconocido: {tipo}')
+    return story
+
+
+def construir_pdf(bloques, fondo=None, margen_superior=2):
+    """Genera el PDF descrito por la lista de bloques y devuelve sus bytes"""
+    buffer = BytesIO()
+    opciones = {}
+    if fondo:
+        opciones['onFirstPage'] = FONDOS[fondo]
+        opciones['onLaterPages'] = FONDOS[fondo]
+    doc = SimpleDocTemplate(buffer, pagesize=A4,
+                            rightMargin=2*cm, leftMargin=2*cm,
+                            topMargin=margen_superior*cm, bottomMargin=2*cm,
+                            **opciones)
+    doc.build(_flowables(bloques))
+    return buffer.getvalue()
+
+
+def _direccion(obj):
+    """Dirección en una línea, o None si faltan datos"""
+    if not (obj.calle and obj.numero and obj.poblacion):
+        return None
+    direccion = f"{obj.calle} {obj.numero}"
+    if obj.piso:
+        direccion += f", {obj.piso}"
+    return direccion + f", {obj.poblacion}"
+
+
+# ---------------------------------------------------------------------------
+# Documentos
+# ---------------------------------------------------------------------------
+
+def pdf_listado_actividades(actividades, ahora):
+    """Listado de todas las actividades"""
+    bloques = [
+        ('titulo', "Listado de Actividades"),
+        ('parrafo', f"Generado el {ahora.strftime('%d/%m/%Y a las %H:%M')}", 'fecha'),
+        ('espacio', 0.5),
+        ('parrafo', f"<b>Total de actividades:</b> {len(actividades)}"),
+        ('espacio', 0.3),
+    ]
+
+    if actividades:
+        filas = [['Actividad', 'Fecha', 'Inscritos', 'Estado']]
+        for actividad in actividades:
+            estado = "Próxima" if actividad.fecha > ahora else "Pasada"
+            fecha_str = f"{actividad.fecha.strftime('%d/%m/%Y')}<br/>{actividad.fecha.strftime('%H:%M')}"
+            inscritos_str = f"{actividad.numero_inscritos()}/{actividad.aforo_maximo}"
+
+            descripcion = actividad.descripcion[:50] + "..." if actividad.descripcion and len(actividad.descripcion) > 50 else (actividad.descripcion or "")
+            nombre_completo = f"<b>{actividad.nombre}</b>"
+            if descripcion:
+                nombre_completo += f"<br/><i>{descripcion}</i>"
+
+            filas.append([
+                (nombre_completo, 'normal'),
+                (fecha_str, 'normal'),
+                (inscritos_str, 'normal'),
+                (estado, 'normal'),
+            ])
+        bloques.append(('tabla', filas, 'listado', [7, 3, 3, 3]))
+    else:
+        bloques.append(('parrafo', "No hay actividades registradas."))
+
+    return construir_pdf(bloques)
+
+
+def pdf_inscritos(actividad, inscritos, ahora):
+    """Listado de inscritos de una actividad con estadísticas de asistencia
+
+    inscritos: filas de services.inscritos.listado()
+    """
+    bloques = [
+        ('titulo', "Listado de Inscritos"),
+        ('parrafo', f"Generado el {ahora.strftime('%d/%m/%Y a las %H:%M')}", 'fecha'),
+        ('espacio', 0.5),
+        ('parrafo', f"<b>{actividad.nombre}</b>", 'seccion'),
+    ]
+    if actividad.descripcion:
+        bloques.append(('parrafo', f"<i>{actividad.descripcion}</i>"))
+    bloques += [
+        ('parrafo', f"<b>Fecha:</b> {actividad.fecha.strftime('%d/%m/%Y a las %H:%M')}"),
+        ('parrafo', f"<b>Aforo máximo:</b> {actividad.aforo_maximo} personas"),
+        ('espacio', 0.3),
+    ]
+
+    # Estadísticas
+    asistentes = sum(1 for i in inscritos if i.asiste)
+    no_asistentes = len(inscritos) - asistentes
+    plazas_libres = actividad.aforo_maximo - len(inscritos)
+    bloques += [
+        ('tabla', [
+            ['Total Inscritos', 'Asistieron', 'No Asistieron', 'Plazas Libres'],
+            [str(len(inscritos)), str(asistentes), str(no_asistentes), str(plazas_libres)],
+        ], 'estadisticas', [4, 4, 4, 4]),
+        ('espacio', 0.5),
+    ]
+
+    if inscritos:
+        filas = [['#', 'Nombre', 'Nombre de Usuario', 'Edad', 'Fecha Inscrip.', 'Asistencia']]
+        for idx, inscrito in enumerate(inscritos, 1):
+            if inscrito.es_beneficiario:
+                nombre_usuario_mostrar = f"Benef. de {inscrito.socio_nombre}"
+            else:
+                nombre_usuario_mostrar = inscrito.nombre_usuario
+            edad = inscrito.edad
+
+            filas.append([
+                str(idx),
+                (inscrito.nombre, 'normal'),
+                (nombre_usuario_mostrar, 'usuario_col'),
+                str(edad) if edad is not None else '-',
+                (inscrito.fecha_inscripcion.strftime('%d/%m/%Y<br/>%H:%M'), 'fecha_col'),
+                "Asistió" if inscrito.asiste else "No asistió",
+            ])
+        # Más ancho para nombre de usuario; fecha más estrecha y pequeña
+        bloques.append(('tabla', filas, 'inscritos', [0.7, 3.8, 6.5, 1, 2.2, 2.3]))
+    else:
+        bloques.append(('parrafo', "No hay inscripciones para esta actividad."))
+
+    return construir_pdf(bloques)
+
+
+def datos_carnet(socio, beneficiarios, qr=None):
+    """Extrae los datos de un carnet a un diccionario simple (serializable)
+
+    qr: URL de verificación a codificar en el carnet (ver services/verificacion.py)
+    """
+    return {
+        'nombre': socio.nombre,
+        'numero_socio': socio.numero_socio,
+        'fecha_alta': socio.fecha_alta.strftime('%d/%m/%Y') if socio.fecha_alta else None,
+        'fecha_validez': socio.fecha_validez.strftime('%d/%m/%Y') if socio.fecha_validez else None,
+        'direccion': _direccion(socio),
+        'beneficiarios': [
+            (b.nombre, b.primer_apellido, b.segundo_apellido or '', str(b.ano_nacimiento))
+            for b in beneficiarios
+        ],
+        'qr': qr,
+    }
+
+
+def bloques_carnet(datos, año=None):
+    """Bloques de un carnet de socio (una página)"""
+    año = año or datetime.now().year
+    filas_socio = [
+        [("Nombre:", 'negrita'), (datos['nombre'], 'normal')],
+        [("Número de Socio:", 'negrita'), (datos['numero_socio'] or 'No asignado', 'normal')],
+        [("Fecha de Alta:", 'negrita'), (datos['fecha_alta'] or 'No especificada', 'normal')],
+        [("Válido hasta:", 'negrita'), (datos['fecha_validez'] or 'No especificada', 'negrita')],
+    ]
+    if datos['direccion']:
+        filas_socio.append([("Dirección:", 'negrita'), (datos['direccion'], 'normal')])
+
+    bloques = [
+        ('logo', 'logo_carnet.jpg', 300, 200),
+        ('titulo', f"CARNET DE SOCIO {año}", 'titulo_carnet'),
+        ('espacio', 0.5),
+        ('parrafo', "Datos del Socio", 'negrita'),
+        ('espacio', 0.2),
+        ('tabla', filas_socio, 'datos', [5, 11]),
+    ]
+
+    if datos['beneficiarios']:
+        filas = [[("Nombre", 'negrita'), ("Primer Apellido", 'negrita'),
+                  ("Segundo Apellido", 'negrita'), ("Año Nacimiento", 'negrita')]]
+        filas += [[(valor, 'normal') for valor in fila] for fila in datos['beneficiarios']]
+        bloques += [
+            ('espacio', 0.5),
+            ('parrafo', "Beneficiarios", 'negrita'),
+            ('espacio', 0.2),
+            ('tabla', filas, 'beneficiarios', [4, 4, 4, 4]),
+        ]
+
+    if datos.get('qr'):
+        bloques += [
+            ('espacio', 0.5),
+            ('qr', datos['qr'], 3.5),
+            ('parrafo', "Escanea el código para verificar el carnet", 'nota'),
+        ]
+    return bloques
+
+
+def pdf_carnet(datos):
+    """Carnet de socio con fondo azul"""
+    return construir_pdf(bloques_carnet(datos), fondo='azul', margen_superior=1)
+
+
+def pdf_carnets(lista_datos):
+    """Varios carnets en un único PDF, uno por página (impresión por lotes)"""
+    año = datetime.now().year
+    bloques = []
+    for i, datos in enumerate(lista_datos):
+        if i:
+            bloques.append(('salto_pagina',))
+        bloques += bloques_carnet(datos, año)
+    return construir_pdf(bloques, fondo='azul', margen_superior=1)
+
+
+def pdf_confirmacion_solicitud(solicitud, nombre_usuario, password, numero_bizum, numero_cuenta):
+    """Resumen de una solicitud de socio con los datos de pago y acceso"""
+    forma_pago_texto = {
+        'bizum': "Bizum",
+        'transferencia': "Transferencia",
+        'efectivo': "Efectivo",
+    }.get(solicitud.forma_de_pago, "Contado")
+
+    bloques = [
+        ('titulo', "Confirmación de Solicitud de Socio"),
+        ('parrafo', "Asociación de Vecinos de Montealto", 'subtitulo'),
+        ('espacio', 0.5),
+        ('parrafo', "Información de Pago", 'seccion'),
+        ('espacio', 0.2),
+        ('parrafo', f"Forma de pago elegida: {forma_pago_texto}"),
+    ]
+    if solicitud.forma_de_pago == 'bizum':
+        bloques.append(('parrafo', f"Realiza el Bizum de 20€ al número: {numero_bizum}"))
+        bloques.append(('parrafo', f"Concepto: {nombre_usuario}"))
+    elif solicitud.forma_de_pago == 'transferencia':
+        bloques.append(('parrafo', f"Realiza la transferencia de 20€ a la cuenta: {numero_cuenta}"))
+        bloques.append(('parrafo', f"Concepto: {nombre_usuario}"))
+    elif solicitud.forma_de_pago == 'efectivo':
+        bloques.append(('parrafo', "Una vez completado el formulario, diríjete a la asociación para formalizar la inscripción."))
+
+    bloques += [
+        ('espacio', 0.3),
+        ('parrafo', "Credenciales de Acceso", 'seccion'),
+        ('espacio', 0.2),
+        ('parrafo', f"Nombre de Usuario: {nombre_usuario}"),
+        ('parrafo', f"Contraseña: {password}"),
+        ('espacio', 0.3),
+        ('parrafo', "Datos del Socio", 'seccion'),
+        ('espacio', 0.2),
+    ]
+
+    nombre_completo = f"{solicitud.nombre} {solicitud.primer_apellido}"
+    if solicitud.segundo_apellido:
+        nombre_completo += f" {solicitud.segundo_apellido}"
+    fecha_nacimiento_str = solicitud.fecha_nacimiento.strftime('%d/%m/%Y') if solicitud.fecha_nacimiento else 'No especificada'
+    fecha_solicitud_str = solicitud.fecha_solicitud.strftime('%d/%m/%Y %H:%M') if solicitud.fecha_solicitud else 'No especificada'
+
+    filas_socio = [
+        [("Nombre:", 'negrita'), (nombre_completo, 'normal')],
+        [("Móvil:", 'negrita'), (solicitud.movil, 'normal')],
+        [("Fecha de Nacimiento:", 'negrita'), (fecha_nacimiento_str, 'normal')],
+        [("Miembros de la Unidad Familiar:", 'negrita'), (str(solicitud.miembros_unidad_familiar), 'normal')],
+        [("Fecha de Solicitud:", 'negrita'), (fecha_solicitud_str, 'normal')],
+    ]
+    direccion = _direccion(solicitud)
+    if direccion:
+        filas_socio.append([("Dirección:", 'negrita'), (direccion, 'normal')])
+    bloques.append(('tabla', filas_socio, 'datos', [6, 10]))
+
+    if solicitud.beneficiarios:
+        filas = [[("Nombre", 'negrita'), ("Primer Apellido", 'negrita'),
+                  ("Segundo Apellido", 'negrita'), ("Año Nacimiento", 'negrita')]]
+        for beneficiario in solicitud.beneficiarios:
+            filas.append([
+                (beneficiario.nombre, 'normal'),
+                (beneficiario.primer_apellido, 'normal'),
+                (beneficiario.segundo_apellido or '', 'normal'),
+                (str(beneficiario.ano_nacimiento), 'normal'),
+            ])
+        bloques += [
+            ('espacio', 0.3),
+            ('parrafo', "Beneficiarios", 'seccion'),
+            ('espacio', 0.2),
+            ('tabla', filas, 'beneficiarios', [4, 4, 4, 4]),
+        ]
+
+    bloques += [
+        ('espacio', 0.5),
+        ('parrafo', "Una vez realizado el pago, el equipo de tesorería de la asociación lo comprobará y te dará la confirmidad en breve.", 'nota'),
+    ]
+    return construir_pdf(bloques)
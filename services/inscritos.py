@@ -0,0 +1,221 @@
+"""
+Listado de inscritos de una actividad
+
+Una sola consulta (inscripciones + socio + beneficiario opcional) devuelve
+filas planas con lo que muestran la vista de inscritos, el PDF y el marcado
+de asistencia. Así el coste del listado es una consulta sea cual sea el
+número de inscritos, sin cargas perezosas de inscripcion.usuario ni
+inscripcion.beneficiario por fila.
+
+Para pasar lista sin cobertura, la página de control de asistencia descarga
+el listado una vez (datos_control) y envía los cambios acumulados por lotes
+(sincronizar), que se aplican todos en una sola transacción.
+"""
+from collections import namedtuple
+from datetime import datetime
+
+from sqlalchemy import select, update, case, bindparam
+
+from models import User, Inscripcion, Beneficiario, db
+
+_CAMPOS = (
+    'id', 'actividad_id', 'fecha_inscripcion', 'asiste', 'asistencia_actualizada', 'beneficiario_id',
+    'socio_id', 'socio_nombre', 'nombre_usuario', 'numero_socio',
+    'ben_nombre', 'ben_primer_apellido', 'ben_segundo_apellido', 'numero_beneficiario',
+    'ano_nacimiento',
+)
+
+
+class FilaInscrito(namedtuple('FilaInscrito', _CAMPOS)):
+    """Inscrito tal como se muestra en los listados"""
+    __slots__ = ()
+
+    @property
+    def es_beneficiario(self):
+        return self.beneficiario_id is not None
+
+    @property
+    def nombre(self):
+        """Nombre completo del inscrito (socio o beneficiario)"""
+        if not self.es_beneficiario:
+            return self.socio_nombre
+        nombre = f"{self.ben_nombre} {self.ben_primer_apellido}"
+        if self.ben_segundo_apellido:
+            nombre += f" {self.ben_segundo_apellido}"
+        return nombre
+
+    @property
+    def nombre_corto(self):
+        """Nombre sin segundo apellido, para mensajes"""
+        if not self.es_beneficiario:
+            return self.socio_nombre
+        return f"{self.ben_nombre} {self.ben_primer_apellido}"
+
+    @property
+    def numero(self):
+        """Número de socio o de beneficiario"""
+        return self.numero_beneficiario if self.es_beneficiario else self.numero_socio
+
+    @property
+    def edad(self):
+        if not self.ano_nacimiento:
+            return None
+        return datetime.now().year - self.ano_nacimiento
+
+
+def _consulta():
+    return (
+        select(
+            Inscripcion.id,
+            Inscripcion.actividad_id,
+            Inscripcion.fecha_inscripcion,
+            Inscripcion.asiste,
+            Inscripcion.asistencia_actualizada,
+            Inscripcion.beneficiario_id,
+            User.id,
+            User.nombre,
+            User.nombre_usuario,
+            User.numero_socio,
+            Beneficiario.nombre,
+            Beneficiario.primer_apellido,
+            Beneficiario.segundo_apellido,
+            Beneficiario.numero_beneficiario,
+            case((Inscripcion.beneficiario_id.isnot(None), Beneficiario.ano_nacimiento),
+                 else_=User.ano_nacimiento),
+        )
+        .join(User, User.id == Inscripcion.user_id)
+        .outerjoin(Beneficiario, Beneficiario.id == Inscripcion.beneficiario_id)
+    )
+
+
+def listado(actividad_id):
+    """Inscritos de una actividad por orden de inscripción"""
+    consulta = (_consulta()
+                .where(Inscripcion.actividad_id == actividad_id)
+                .order_by(Inscripcion.fecha_inscripcion, Inscripcion.id))
+    return [FilaInscrito(*fila) for fila in db.session.execute(consulta)]
+
+
+def obtener(actividad_id, inscripcion_id):
+    """Un inscrito de la actividad, o None si la inscripción no es de ella"""
+    fila = db.session.execute(
+        _consulta().where(Inscripcion.id == inscripcion_id, Inscripcion.actividad_id == actividad_id)
+    ).first()
+    return FilaInscrito(*fila) if fila else None
+
+
+def resumen(actividad, filas):
+    """Totales de asistencia y plazas a partir del listado ya cargado"""
+    asistentes = sum(1 for fila in filas if fila.asiste)
+    return {
+        'total': len(filas),
+        'asistentes': asistentes,
+        'no_asistentes': len(filas) - asistentes,
+        'plazas_libres': actividad.aforo_maximo - len(filas),
+    }
+
+
+def marcar_asistencia(inscripcion_id, asiste):
+    """Guarda la asistencia con un UPDATE directo, sin cargar la inscripción"""
+    db.session.execute(
+        update(Inscripcion).where(Inscripcion.id == inscripcion_id)
+        .values(asiste=asiste, asistencia_actualizada=datetime.utcnow())
+    )
+
+
+def version(fecha):
+    """Marca de versión de la asistencia de una fila ('' si nunca se ha tocado)"""
+    return fecha.isoformat() if fecha else ''
+
+
+def fila_control(fila):
+    """Fila compacta para la página de control: [id, nombre, número, beneficiario, asiste, versión]"""
+    return [fila.id, fila.nombre, fila.numero or '', 1 if fila.es_beneficiario else 0,
+            1 if fila.asiste else 0, version(fila.asistencia_actualizada)]
+
+
+def datos_control(actividad, filas, ahora):
+    """Listado completo para descargar una vez en la página de control de asistencia"""
+    return {
+        'actividad': {'id': actividad.id, 'nombre': actividad.nombre},
+        'campos': ['id', 'nombre', 'numero', 'beneficiario', 'asiste', 'version'],
+        'filas': [fila_control(fila) for fila in filas],
+        'servidor': version(ahora),
+    }
+
+
+def sincronizar(actividad_id, cambios, desde=None):
+    """
+    Aplica un lote de cambios de asistencia en una sola transacción.
+
+    Cada cambio es {'id', 'asiste', 'version'}, donde version es la que tenía
+    la fila cuando el cliente la vio por última vez. Por fila:
+
+    - 'aplicado': nadie la había tocado desde entonces, se guarda el cambio.
+    - 'sin_cambios': el servidor ya tiene ese mismo valor.
+    - 'conflicto': otro miembro de la directiva la cambió antes y con otro
+      valor; se conserva el del servidor y se devuelve para que el cliente
+      lo adopte.
+    - 'no_encontrada': la inscripción no existe o no es de esta actividad.
+
+    Si se indica desde (versión del servidor en la última sincronización),
+    se devuelven además las filas que otros han cambiado después, para que
+    el cliente se ponga al día en la misma petición.
+
+    No hace commit: lo hace la vista que la llama.
+    """
+    ahora = datetime.utcnow()
+    ids = [cambio['id'] for cambio in cambios]
+    actuales = {}
+    if ids:
+        actuales = {
+            fila.id: fila for fila in db.session.execute(
+                select(Inscripcion.id, Inscripcion.asiste, Inscripcion.asistencia_actualizada)
+                .where(Inscripcion.actividad_id == actividad_id, Inscripcion.id.in_(ids))
+            )
+        }
+
+    resultados = []
+    a_guardar = []
+    for cambio in cambios:
+        actual = actuales.get(cambio['id'])
+        if actual is None:
+            resultados.append({'id': cambio['id'], 'estado': 'no_encontrada'})
+            continue
+        asiste = bool(cambio['asiste'])
+        if bool(actual.asiste) == asiste:
+            estado, valor, marca = 'sin_cambios', asiste, actual.asistencia_actualizada
+        elif version(actual.asistencia_actualizada) == (cambio.get('version') or ''):
+            estado, valor, marca = 'aplicado', asiste, ahora
+            a_guardar.append({'b_id': actual.id, 'b_asiste': asiste})
+        else:
+            estado, valor, marca = 'conflicto', bool(actual.asiste), actual.asistencia_actualizada
+        resultados.append({'id': actual.id, 'estado': estado, 'asiste': 1 if valor else 0,
+                           'version': version(marca)})
+
+    if a_guardar:
+        tabla = Inscripcion.__table__
+        db.session.execute(
+            update(tabla).where(tabla.c.id == bindparam('b_id'))
+            .values(asiste=bindparam('b_asiste'), asistencia_actualizada=ahora),
+            a_guardar,
+        )
+
+    respuesta = {'resultados': resultados, 'servidor': version(ahora)}
+    if desde:
+        try:
+            desde_fecha = datetime.fromisoformat(desde)
+        except (TypeError, ValueError):
+            desde_fecha = None
+        if desde_fecha is not None:
+            tocados = set(ids)
+            respuesta['actualizados'] = [
+                [fila.id, 1 if fila.asiste else 0, version(fila.asistencia_actualizada)]
+                for fila in db.session.execute(
+                    select(Inscripcion.id, Inscripcion.asiste, Inscripcion.asistencia_actualizada)
+                    .where(Inscripcion.actividad_id == actividad_id,
+                           Inscripcion.asistencia_actualizada > desde_fecha)
+                )
+                if fila.id not in tocados
+            ]
+    return respuesta
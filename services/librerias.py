@@ -0,0 +1,289 @@
+"""
+Bootstrap y Bootstrap Icons servidos desde static/vendor
+
+construir_estaticos.py descarga una vez (a una caché local) las versiones
+fijadas de Bootstrap y Bootstrap Icons y genera en static/vendor:
+
+- bootstrap.min.css sin las reglas cuyos selectores usan clases que no
+  aparecen en nuestras plantillas, JS ni código Python (los iconos de las
+  secciones de la galería, por ejemplo, están en services/galerias.py);
+- bootstrap-icons.css solo con los iconos bi-* que usamos, y la fuente
+  recortada a esos glifos (con fontTools; sin él se copia entera);
+- bootstrap.bundle.min.js tal cual.
+
+Después pasan por el mismo proceso de huella y compresión que el resto de
+static/ (services/estaticos.py). Mientras no existan, url_libreria() sigue
+devolviendo las URLs de jsDelivr, así que la web funciona igual antes del
+primer build.
+"""
+import os
+import re
+import shutil
+import urllib.request
+
+from services import estaticos
+
+try:
+    from fontTools import subset as fonttools_subset
+    from fontTools.ttLib import TTFont
+    FONTTOOLS_AVAILABLE = True
+except ImportError:
+    FONTTOOLS_AVAILABLE = False
+
+VERSION_BOOTSTRAP = '5.3.0'
+VERSION_ICONOS = '1.10.0'
+_CDN = 'https://cdn.jsdelivr.net/npm'
+
+ORIGENES = {
+    'bootstrap.min.css': f'{_CDN}/bootstrap@{VERSION_BOOTSTRAP}/dist/css/bootstrap.min.css',
+    'bootstrap.bundle.min.js': f'{_CDN}/bootstrap@{VERSION_BOOTSTRAP}/dist/js/bootstrap.bundle.min.js',
+    'bootstrap-icons.css': f'{_CDN}/bootstrap-icons@{VERSION_ICONOS}/font/bootstrap-icons.css',
+    'bootstrap-icons.woff2': f'{_CDN}/bootstrap-icons@{VERSION_ICONOS}/font/fonts/bootstrap-icons.woff2',
+}
+
+CARPETA = 'vendor'  # dentro de static/
+
+# Dónde buscar las clases que usamos (relativo a la raíz del proyecto)
+FUENTES_DE_CLASES = ('templates', 'static/js', 'blueprints', 'services', 'app.py')
+_EXTENSIONES_FUENTE = ('.html', '.js', '.py')
+
+# Clases que pone el JavaScript de Bootstrap en tiempo de ejecución
+SIEMPRE = {
+    'active', 'show', 'showing', 'hiding', 'fade', 'collapse', 'collapsing', 'collapsed',
+    'disabled', 'modal-open', 'modal-backdrop', 'modal-static', 'offcanvas-backdrop',
+    'carousel-item-start', 'carousel-item-end', 'carousel-item-next', 'carousel-item-prev',
+    'carousel-fade', 'pointer-event', 'was-validated', 'is-valid', 'is-invalid',
+    'dropdown-menu-end', 'dropstart', 'dropend', 'dropup',
+    'tooltip', 'tooltip-inner', 'tooltip-arrow', 'bs-tooltip-auto', 'bs-tooltip-top', 'bs-tooltip-bottom',
+    'popover', 'popover-header', 'popover-body', 'popover-arrow', 'bs-popover-auto',
+}
+
+_PALABRA = re.compile(r'[A-Za-z0-9_-]+')
+_CLASE = re.compile(r'\.(-?[_a-zA-Z][_a-zA-Z0-9-]*)')
+_NOT = re.compile(r':not\([^()]*\)')
+_ATRIBUTO = re.compile(r'\[\s*([a-zA-Z_][\w-]*)')
+_ETIQUETA = re.compile(r'(?:^|[\s>+~(])([a-z][a-z0-9]*)(?![\w-])')
+_ICONO = re.compile(r'\.(bi-[a-z0-9-]+)::?before\s*\{\s*content:\s*"\\([0-9a-fA-F]+)"\s*;?\s*\}')
+_CABECERA = re.compile(r'(\s*@charset[^;]*;)?\s*(/\*!.*?\*/)', re.S)
+_FONT_FACE = re.compile(r'@font-face\s*\{[^}]*\}')
+
+# Reglas @ cuyo contenido son otras reglas (se purgan por dentro)
+_AT_ANIDADAS = ('@media', '@supports', '@container', '@layer')
+
+
+# ---------------------------------------------------------------------------
+# Descarga
+# ---------------------------------------------------------------------------
+
+def descargar(cache_dir):
+    """Descarga a cache_dir los archivos que falten. Devuelve False si falta alguno"""
+    os.makedirs(cache_dir, exist_ok=True)
+    completo = True
+    for nombre, url in ORIGENES.items():
+        destino = os.path.join(cache_dir, nombre)
+        if os.path.exists(destino):
+            continue
+        try:
+            with urllib.request.urlopen(url, timeout=30) as respuesta:
+                datos = respuesta.read()
+        except Exception as e:
+            print(f"[WARNING] No se pudo descargar {url}: {e}")
+            completo = False
+            continue
+        with open(destino, 'wb') as f:
+            f.write(datos)
+    return completo
+
+
+# ---------------------------------------------------------------------------
+# Purga de CSS
+# ---------------------------------------------------------------------------
+
+def clases_usadas(raiz):
+    """Todas las palabras de plantillas, JS y Python que pueden ser nombres de clase"""
+    usadas = set(SIEMPRE)
+    for fuente in FUENTES_DE_CLASES:
+        ruta = os.path.join(raiz, fuente)
+        if os.path.isfile(ruta):
+            archivos = [ruta]
+        else:
+            archivos = [os.path.join(r, n) for r, _, ns in os.walk(ruta) for n in ns
+                        if n.endswith(_EXTENSIONES_FUENTE)]
+        for archivo in archivos:
+            with open(archivo, 'r', encoding='utf-8', errors='ignore') as f:
+                usadas.update(clases_visibles(f.read()))
+    return usadas
+
+
+def clases_visibles(texto):
+    """Palabras de un texto (plantilla, JS) que pueden ser nombres de clase"""
+    return set(_PALABRA.findall(texto))
+
+
+def _reglas(css):
+    """Divide CSS en (preludio, cuerpo) de nivel superior; cuerpo None para sentencias como @charset"""
+    i = 0
+    n = len(css)
+    inicio = 0
+    while i < n:
+        c = css[i]
+        if c == '/' and css.startswith('/*', i):
+            fin = css.find('*/', i + 2)
+            i = n if fin == -1 else fin + 2
+            continue
+        if c in '"\'':
+            fin = i + 1
+            while fin < n and css[fin] != c:
+                fin += 2 if css[fin] == '\\' else 1
+            i = fin + 1
+            continue
+        if c == ';':
+            yield css[inicio:i].strip(), None
+            i += 1
+            inicio = i
+            continue
+        if c == '{':
+            preludio = css[inicio:i].strip()
+            nivel = 1
+            j = i + 1
+            while j < n and nivel:
+                if css[j] == '{':
+                    nivel += 1
+                elif css[j] == '}':
+                    nivel -= 1
+                elif css[j] in '"\'':
+                    comilla = css[j]
+                    j += 1
+                    while j < n and css[j] != comilla:
+                        j += 2 if css[j] == '\\' else 1
+                j += 1
+            yield preludio, css[i + 1:j - 1]
+            i = j
+            inicio = i
+            continue
+        i += 1
+
+
+def _selector_usado(selector, usadas, estricto=False):
+    selector = _NOT.sub('', selector)
+    nombres = _CLASE.findall(selector)
+    if estricto:
+        # También etiquetas y atributos (para el CSS crítico, con el HTML concreto de la página)
+        nombres += _ATRIBUTO.findall(selector) + _ETIQUETA.findall(selector)
+    return all(nombre in usadas for nombre in nombres)
+
+
+def purgar(css, usadas, estricto=False):
+    """CSS sin los selectores que dependen de clases no usadas
+
+    Con estricto también se quitan los que usan etiquetas o atributos que no
+    aparecen, y el comentario de licencia (que sigue en la hoja completa).
+    """
+    salida = []
+    # El comentario de licencia se conserva (después del @charset, que tiene que ir primero)
+    cabecera = _CABECERA.match(css)
+    if cabecera:
+        if not estricto:
+            salida.extend(parte.strip() for parte in cabecera.groups() if parte)
+        css = css[cabecera.end():]
+    for preludio, cuerpo in _reglas(css):
+        preludio = re.sub(r'/\*.*?\*/', '', preludio, flags=re.S).strip()
+        if cuerpo is None:
+            if preludio:
+                salida.append(preludio + ';')
+        elif preludio.startswith(_AT_ANIDADAS):
+            interior = purgar(cuerpo, usadas, estricto)
+            if interior:
+                salida.append(f'{preludio}{{{interior}}}')
+        elif preludio.startswith('@'):
+            salida.append(f'{preludio}{{{cuerpo}}}')
+        else:
+            selectores = [s for s in preludio.split(',') if _selector_usado(s, usadas, estricto)]
+            if selectores:
+                salida.append(f"{','.join(selectores)}{{{cuerpo}}}")
+    return ''.join(salida)
+
+
+# ---------------------------------------------------------------------------
+# Iconos
+# ---------------------------------------------------------------------------
+
+def purgar_iconos(css, usadas):
+    """(CSS de iconos con solo los usados, códigos de los glifos que hay que conservar)
+
+    La @font-face se sustituye por una que apunta a la fuente recortada.
+    """
+    codigos = {int(codigo, 16) for clase, codigo in _ICONO.findall(css) if clase in usadas}
+    css = _ICONO.sub(lambda m: m.group(0) if m.group(1) in usadas else '', css)
+    css = _FONT_FACE.sub(
+        '@font-face{font-display:block;font-family:"bootstrap-icons";'
+        'src:url("fonts/bootstrap-icons.woff2") format("woff2")}', css, count=1)
+    return purgar(css, usadas), codigos
+
+
+def recortar_fuente(origen, destino, codigos):
+    """Fuente de iconos solo con los glifos indicados (copia entera si no hay fontTools)"""
+    os.makedirs(os.path.dirname(destino), exist_ok=True)
+    if not FONTTOOLS_AVAILABLE:
+        print("[WARNING] fontTools no está instalado. Se copia la fuente de iconos completa.")
+        shutil.copyfile(origen, destino)
+        return
+    fuente = TTFont(origen)
+    opciones = fonttools_subset.Options()
+    opciones.flavor = 'woff2'
+    opciones.layout_features = []
+    subsetter = fonttools_subset.Subsetter(options=opciones)
+    subsetter.populate(unicodes=codigos)
+    subsetter.subset(fuente)
+    fuente.flavor = 'woff2'
+    fuente.save(destino)
+
+
+# ---------------------------------------------------------------------------
+# Build y plantillas
+# ---------------------------------------------------------------------------
+
+def construir(raiz, static_folder, cache_dir):
+    """Genera static/vendor a partir de la caché. Devuelve un resumen o None si faltan originales"""
+    if not descargar(cache_dir):
+        return None
+    destino = os.path.join(static_folder, CARPETA)
+    os.makedirs(destino, exist_ok=True)
+    usadas = clases_usadas(raiz)
+
+    def leer(nombre):
+        with open(os.path.join(cache_dir, nombre), 'r', encoding='utf-8') as f:
+            return f.read()
+
+    def escribir(nombre, contenido):
+        with open(os.path.join(destino, nombre), 'w', encoding='utf-8') as f:
+            f.write(contenido)
+
+    original_css = leer('bootstrap.min.css')
+    css = purgar(original_css, usadas)
+    escribir('bootstrap.min.css', css)
+
+    original_iconos = leer('bootstrap-icons.css')
+    iconos, codigos = purgar_iconos(original_iconos, usadas)
+    escribir('bootstrap-icons.css', iconos)
+    recortar_fuente(os.path.join(cache_dir, 'bootstrap-icons.woff2'),
+                    os.path.join(destino, 'fonts', 'bootstrap-icons.woff2'), codigos)
+
+    shutil.copyfile(os.path.join(cache_dir, 'bootstrap.bundle.min.js'),
+                    os.path.join(destino, 'bootstrap.bundle.min.js'))
+
+    return {
+        'bootstrap_css': (len(original_css), len(css)),
+        'iconos_css': (len(original_iconos), len(iconos)),
+        'iconos': len(codigos),
+        'fuente': (os.path.getsize(os.path.join(cache_dir, 'bootstrap-icons.woff2')),
+                   os.path.getsize(os.path.join(destino, 'fonts', 'bootstrap-icons.woff2'))),
+    }
+
+
+def url_libreria(nombre):
+    """URL local (con huella) del archivo de la librería, o la del CDN si aún no se ha construido"""
+    local = f'{CARPETA}/{nombre}'
+    if estaticos.disponible(local):
+        return estaticos.url_for_estatico('static', filename=local)
+    return ORIGENES[nombre]
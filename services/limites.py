@@ -0,0 +1,165 @@
+"""
+Límite de peticiones (token bucket) para los formularios públicos
+
+hazte_socio y acceso_socios no piden sesión, y cada intento de acceso
+comprueba una contraseña con un hash lento a propósito. Una ráfaga de bots
+puede ocupar todos los workers de gunicorn; con @limitar cada POST gasta
+una ficha de su cubo (por IP, por nombre de usuario...) y si no quedan se
+responde 429 antes de tocar la base de datos o calcular ningún hash.
+
+Los cubos de las reglas indicadas en solo_fallos (el del nombre de usuario)
+se comprueban igual, pero la ficha solo la gasta la vista con fallo()
+cuando la contraseña no es correcta: si no, cualquiera podría dejar sin
+acceso a un socio enviando su nombre de usuario una vez por minuto.
+
+Los cubos están en una base SQLite aparte (LIMITES_DB, en instance/ o en
+/dev/shm), así que todos los workers comparten el mismo estado. Cada
+comprobación es una transacción corta sobre un archivo local. Si esa base
+falla, la petición se deja pasar (mejor sin límite que sin web).
+
+contadores() devuelve cuántas peticiones se han admitido y rechazado por
+regla; se ven en /admin/limites.
+"""
+from functools import wraps
+import math
+import os
+import sqlite3
+import time
+
+from flask import current_app, render_template, request
+
+# Regla -> (capacidad del cubo, segundos para recuperar el cubo entero, de dónde sale la clave)
+REGLAS = {
+    'acceso_ip': (10, 60, 'ip'),
+    'acceso_usuario': (5, 300, 'usuario'),
+    'hazte_socio_ip': (5, 3600, 'ip'),
+}
+
+LIMPIAR_CADA = 600  # segundos entre barridos de cubos llenos (por proceso)
+
+_conexion = {'pid': None, 'ruta': None, 'db': None, 'limpiado': 0.0}
+
+
+def _db():
+    """Conexión propia de este proceso (las conexiones SQLite no sobreviven al fork)"""
+    ruta = current_app.config['LIMITES_DB']
+    if _conexion['pid'] != os.getpid() or _conexion['ruta'] != ruta:
+        os.makedirs(os.path.dirname(ruta) or '.', exist_ok=True)
+        conexion = sqlite3.connect(ruta, timeout=2, isolation_level=None)
+        conexion.execute('PRAGMA journal_mode=WAL')
+        # Se puede perder lo último si se va la luz: solo son contadores
+        conexion.execute('PRAGMA synchronous=OFF')
+        conexion.execute('CREATE TABLE IF NOT EXISTS cubos (clave TEXT PRIMARY KEY, fichas REAL NOT NULL, actualizado REAL NOT NULL)')
+        conexion.execute('CREATE TABLE IF NOT EXISTS contadores (regla TEXT NOT NULL, resultado TEXT NOT NULL, '
+                         'total INTEGER NOT NULL, PRIMARY KEY (regla, resultado))')
+        _conexion.update(pid=os.getpid(), ruta=ruta, db=conexion)
+    return _conexion['db']
+
+
+def ip_cliente():
+    """IP del visitante (ProxyFix ya la ha sacado de X-Forwarded-For, ver PROXIES_CONFIABLES en create_app)"""
+    return request.remote_addr or ''
+
+
+def _clave(regla, origen):
+    if origen == 'ip':
+        valor = ip_cliente()
+    else:
+        valor = (request.form.get('nombre_usuario') or '').strip().lower()
+    return f'{regla}:{valor}' if valor else None
+
+
+def consumir(claves, sin_gastar=()):
+    """Gasta una ficha de cada cubo [(regla, clave)]. Devuelve los segundos de espera (0 = admitida)
+
+    Todo en una transacción: si algún cubo está vacío no se gasta ninguna ficha.
+    Los cubos de las reglas de sin_gastar solo se comprueban.
+    """
+    conexion = _db()
+    ahora = time.time()
+    espera = 0.0
+    nuevos = []
+    conexion.execute('BEGIN IMMEDIATE')
+    try:
+        for regla, clave in claves:
+            capacidad, periodo, _ = REGLAS[regla]
+            ritmo = capacidad / periodo
+            fila = conexion.execute('SELECT fichas, actualizado FROM cubos WHERE clave = ?', (clave,)).fetchone()
+            fichas = capacidad if fila is None else min(capacidad, fila[0] + (ahora - fila[1]) * ritmo)
+            if fichas < 1:
+                espera = max(espera, (1 - fichas) / ritmo)
+            nuevos.append((clave, fichas))
+        resultado = 'rechazada' if espera else 'admitida'
+        for (regla, _), (clave, fichas) in zip(claves, nuevos):
+            conexion.execute(
+                'INSERT INTO cubos (clave, fichas, actualizado) VALUES (?, ?, ?) '
+                'ON CONFLICT(clave) DO UPDATE SET fichas = excluded.fichas, actualizado = excluded.actualizado',
+                (clave, fichas if espera or regla in sin_gastar else fichas - 1, ahora))
+            conexion.execute(
+                'INSERT INTO contadores (regla, resultado, total) VALUES (?, ?, 1) '
+                'ON CONFLICT(regla, resultado) DO UPDATE SET total = total + 1', (regla, resultado))
+        conexion.execute('COMMIT')
+    except Exception:
+        conexion.execute('ROLLBACK')
+        raise
+    _limpiar(conexion, ahora)
+    return espera
+
+
+def _limpiar(conexion, ahora):
+    """Borra los cubos que ya estarían llenos otra vez (equivalen a no tener fila)"""
+    if ahora - _conexion['limpiado'] < LIMPIAR_CADA:
+        return
+    _conexion['limpiado'] = ahora
+    periodo_max = max(periodo for _, periodo, _ in REGLAS.values())
+    conexion.execute('DELETE FROM cubos WHERE actualizado < ?', (ahora - periodo_max,))
+
+
+def contadores():
+    """{regla: {'admitida': n, 'rechazada': n}}"""
+    resultado = {regla: {'admitida': 0, 'rechazada': 0} for regla in REGLAS}
+    for regla, tipo, total in _db().execute('SELECT regla, resultado, total FROM contadores'):
+        resultado.setdefault(regla, {})[tipo] = total
+    return resultado
+
+
+def fallo(regla):
+    """Gasta la ficha de una regla de solo_fallos (la vista ha visto un intento fallido)"""
+    if not current_app.config['LIMITES_ACTIVOS']:
+        return
+    clave = _clave(regla, REGLAS[regla][2])
+    if not clave:
+        return
+    try:
+        consumir([(regla, clave)])
+    except sqlite3.Error as e:
+        print(f"[WARNING] No se pudo anotar el fallo de {request.endpoint}: {e}")
+
+
+def limitar(*reglas, metodos=('POST',), solo_fallos=()):
+    """Decorador: 429 si alguno de los cubos de esas reglas está vacío
+
+    Va antes que cualquier trabajo de la vista (y después de @cachear, que
+    ya deja pasar los POST sin mirar la caché). Las reglas de solo_fallos
+    no gastan ficha aquí: la vista llama a fallo() cuando corresponde.
+    """
+    def decorador(vista):
+        @wraps(vista)
+        def envoltorio(*a, **kw):
+            if request.method not in metodos or not current_app.config['LIMITES_ACTIVOS']:
+                return vista(*a, **kw)
+            claves = [(regla, clave) for regla in reglas
+                      for clave in [_clave(regla, REGLAS[regla][2])] if clave]
+            try:
+                espera = consumir(claves, solo_fallos) if claves else 0
+            except sqlite3.Error as e:
+                print(f"[WARNING] No se pudo comprobar el límite de {request.endpoint}: {e}")
+                espera = 0
+            if espera:
+                segundos = math.ceil(espera)
+                respuesta = current_app.make_response((render_template('limite.html', segundos=segundos), 429))
+                respuesta.headers['Retry-After'] = str(segundos)
+                return respuesta
+            return vista(*a, **kw)
+        return envoltorio
+    return decorador
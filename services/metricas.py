@@ -0,0 +1,302 @@
+"""
+Métricas de las peticiones: tiempo de respuesta por ruta, consultas SQL y plantillas
+
+gunicorn solo deja en el access log el tiempo total (%(D)s) y no se sabe qué
+rutas son lentas ni por qué. iniciar() engancha a la app:
+
+- before_request/after_request: duración de cada petición, tamaño de la
+  respuesta y si ha sido un error 5xx;
+- before_cursor_execute/after_cursor_execute del engine: número de
+  consultas SQL y tiempo en SQL de la petición;
+- before_render_template/template_rendered: tiempo pintando plantillas.
+
+Cada proceso acumula por (endpoint, método) en memoria, con un histograma de
+duraciones en las cubetas de CUBETAS, y cada FLUSH_SEGUNDOS lo suma (UPSERT)
+a una base SQLite aparte (METRICAS_DB) que comparten todos los workers, como
+los contadores de services/limites.py. Si esa base falla se pierde ese
+bloque de métricas, nunca la petición.
+
+Se leen en /admin/metrics (tabla) y /admin/metrics/prometheus (formato de
+texto de Prometheus; el scraper puede entrar con Authorization: Bearer
+METRICAS_TOKEN). Las peticiones de más de METRICAS_LENTA_MS se avisan además
+con un [WARNING].
+"""
+import atexit
+import hmac
+import os
+import sqlite3
+import threading
+import time
+
+from flask import before_render_template, current_app, g, has_request_context, request, template_rendered
+from sqlalchemy import event
+
+# Límites superiores de las cubetas del histograma de duración (segundos); la última es +Inf
+CUBETAS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+FLUSH_SEGUNDOS = 5
+SIN_RUTA = '(sin ruta)'  # 404 y peticiones que no llegan a ninguna vista
+
+_estado = {'ruta': None, 'pid': None, 'db': None, 'volcado': 0.0}
+_pendiente = {}
+_cerrojo = threading.Lock()
+
+_COLUMNAS = ('peticiones', 'errores', 'duracion', 'duracion_max', 'consultas', 'sql', 'plantillas', 'bytes')
+
+
+def iniciar(app):
+    """Engancha la medición a la app (create_app)"""
+    _estado['ruta'] = app.config['METRICAS_DB']
+    if not app.config['METRICAS_ACTIVAS']:
+        return
+    app.before_request(_empezar)
+    app.after_request(_terminar)
+    before_render_template.connect(_antes_de_plantilla, app)
+    template_rendered.connect(_despues_de_plantilla, app)
+    with app.app_context():
+        from models import db
+        event.listen(db.engine, 'before_cursor_execute', _antes_de_sql)
+        event.listen(db.engine, 'after_cursor_execute', _despues_de_sql)
+    # gunicorn recicla los workers (max_requests): que no se pierda lo último
+    atexit.register(volcar)
+
+
+def _db():
+    """Conexión propia de este proceso (las conexiones SQLite no sobreviven al fork)"""
+    if _estado['pid'] != os.getpid():
+        ruta = _estado['ruta']
+        os.makedirs(os.path.dirname(ruta) or '.', exist_ok=True)
+        conexion = sqlite3.connect(ruta, timeout=2, isolation_level=None, check_same_thread=False)
+        conexion.execute('PRAGMA journal_mode=WAL')
+        # Se puede perder lo último si se va la luz: solo son contadores
+        conexion.execute('PRAGMA synchronous=OFF')
+        conexion.execute('CREATE TABLE IF NOT EXISTS rutas (endpoint TEXT NOT NULL, metodo TEXT NOT NULL, '
+                         'peticiones INTEGER NOT NULL, errores INTEGER NOT NULL, duracion REAL NOT NULL, '
+                         'duracion_max REAL NOT NULL, consultas INTEGER NOT NULL, sql REAL NOT NULL, '
+                         'plantillas REAL NOT NULL, bytes INTEGER NOT NULL, PRIMARY KEY (endpoint, metodo))')
+        conexion.execute('CREATE TABLE IF NOT EXISTS cubetas (endpoint TEXT NOT NULL, metodo TEXT NOT NULL, '
+                         'cubeta INTEGER NOT NULL, total INTEGER NOT NULL, PRIMARY KEY (endpoint, metodo, cubeta))')
+        conexion.execute('CREATE TABLE IF NOT EXISTS inicio (desde REAL NOT NULL)')
+        if conexion.execute('SELECT COUNT(*) FROM inicio').fetchone()[0] == 0:
+            conexion.execute('INSERT INTO inicio (desde) VALUES (?)', (time.time(),))
+        _estado.update(pid=os.getpid(), db=conexion)
+    return _estado['db']
+
+
+# ---------------------------------------------------------------------------
+# Medición
+# ---------------------------------------------------------------------------
+
+def _empezar():
+    g.metricas = {'inicio': time.perf_counter(), 'consultas': 0, 'sql': 0.0, 'plantillas': 0.0}
+
+
+def _medicion():
+    return g.get('metricas') if has_request_context() else None
+
+
+def _antes_de_sql(conn, cursor, statement, parameters, context, executemany):
+    if context is not None and _medicion() is not None:
+        context._metricas_inicio = time.perf_counter()
+
+
+def _despues_de_sql(conn, cursor, statement, parameters, context, executemany):
+    medicion = _medicion()
+    inicio = getattr(context, '_metricas_inicio', None)
+    if medicion is not None and inicio is not None:
+        medicion['consultas'] += 1
+        medicion['sql'] += time.perf_counter() - inicio
+
+
+def _antes_de_plantilla(sender, template, context, **extra):
+    medicion = _medicion()
+    if medicion is not None:
+        medicion.setdefault('plantillas_inicio', []).append(time.perf_counter())
+
+
+def _despues_de_plantilla(sender, template, context, **extra):
+    medicion = _medicion()
+    if medicion is not None and medicion.get('plantillas_inicio'):
+        medicion['plantillas'] += time.perf_counter() - medicion['plantillas_inicio'].pop()
+
+
+def _terminar(response):
+    medicion = g.pop('metricas', None)
+    if medicion is None:
+        return response
+    duracion = time.perf_counter() - medicion['inicio']
+    endpoint = request.endpoint or SIN_RUTA
+    cubeta = next((i for i, limite in enumerate(CUBETAS) if duracion <= limite), len(CUBETAS))
+    with _cerrojo:
+        fila = _pendiente.setdefault((endpoint, request.method), dict.fromkeys(_COLUMNAS, 0))
+        fila['peticiones'] += 1
+        fila['errores'] += response.status_code >= 500
+        fila['duracion'] += duracion
+        fila['duracion_max'] = max(fila['duracion_max'], duracion)
+        fila['consultas'] += medicion['consultas']
+        fila['sql'] += medicion['sql']
+        fila['plantillas'] += medicion['plantillas']
+        fila['bytes'] += response.content_length or 0
+        fila.setdefault('cubetas', [0] * (len(CUBETAS) + 1))[cubeta] += 1
+
+    if duracion * 1000 >= current_app.config['METRICAS_LENTA_MS']:
+        print(f"[WARNING] Petición lenta: {request.method} {request.path} ({endpoint}) {duracion * 1000:.0f} ms, "
+              f"{medicion['consultas']} consultas SQL en {medicion['sql'] * 1000:.0f} ms, "
+              f"plantillas {medicion['plantillas'] * 1000:.0f} ms")
+    if time.monotonic() - _estado['volcado'] >= FLUSH_SEGUNDOS:
+        volcar()
+    return response
+
+
+def volcar():
+    """Suma lo acumulado en este proceso a la base compartida"""
+    if _estado['ruta'] is None:
+        return
+    with _cerrojo:
+        try:
+            conexion = _db()
+        except sqlite3.Error as e:
+            print(f"[WARNING] No se pudo abrir la base de métricas: {e}")
+            _pendiente.clear()
+            return
+        _estado['volcado'] = time.monotonic()
+        if not _pendiente:
+            return
+        filas = list(_pendiente.items())
+        _pendiente.clear()
+        try:
+            conexion.execute('BEGIN IMMEDIATE')
+            for (endpoint, metodo), fila in filas:
+                conexion.execute(
+                    'INSERT INTO rutas (endpoint, metodo, peticiones, errores, duracion, duracion_max, consultas, '
+                    'sql, plantillas, bytes) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?) '
+                    'ON CONFLICT(endpoint, metodo) DO UPDATE SET peticiones = peticiones + excluded.peticiones, '
+                    'errores = errores + excluded.errores, duracion = duracion + excluded.duracion, '
+                    'duracion_max = MAX(duracion_max, excluded.duracion_max), '
+                    'consultas = consultas + excluded.consultas, sql = sql + excluded.sql, '
+                    'plantillas = plantillas + excluded.plantillas, bytes = bytes + excluded.bytes',
+                    (endpoint, metodo, *(fila[columna] for columna in _COLUMNAS)))
+                conexion.executemany(
+                    'INSERT INTO cubetas (endpoint, metodo, cubeta, total) VALUES (?, ?, ?, ?) '
+                    'ON CONFLICT(endpoint, metodo, cubeta) DO UPDATE SET total = total + excluded.total',
+                    [(endpoint, metodo, cubeta, total) for cubeta, total in enumerate(fila['cubetas']) if total])
+            conexion.execute('COMMIT')
+        except sqlite3.Error as e:
+            print(f"[WARNING] No se pudieron guardar las métricas: {e}")
+            try:
+                conexion.execute('ROLLBACK')
+            except sqlite3.Error:
+                pass
+
+
+# ---------------------------------------------------------------------------
+# Lectura
+# ---------------------------------------------------------------------------
+
+def _percentil(cubetas, total, fraccion):
+    """Límite superior (ms) de la cubeta donde cae el percentil, o None si es la de +Inf"""
+    objetivo = fraccion * total
+    acumulado = 0
+    for cubeta, cuenta in enumerate(cubetas):
+        acumulado += cuenta
+        if acumulado >= objetivo:
+            return CUBETAS[cubeta] * 1000 if cubeta < len(CUBETAS) else None
+    return None
+
+
+def rutas():
+    """Métricas de cada (endpoint, método) de todos los workers, de la que más tiempo total ocupa a la que menos
+
+    Cada fila es un diccionario con los totales, las medias por petición
+    ('media_ms', 'consultas_media', 'sql_ms', 'plantillas_ms', 'bytes_medio'),
+    'p50_ms' y 'p95_ms' (límite de la cubeta, None si pasa de la última) y
+    'cubetas' (cuentas no acumuladas, la última es +Inf).
+    """
+    volcar()
+    with _cerrojo:
+        conexion = _db()
+        filas_cubetas = conexion.execute('SELECT endpoint, metodo, cubeta, total FROM cubetas').fetchall()
+        filas = conexion.execute(
+            f'SELECT endpoint, metodo, {", ".join(_COLUMNAS)} FROM rutas ORDER BY duracion DESC').fetchall()
+    cubetas = {}
+    for endpoint, metodo, cubeta, total in filas_cubetas:
+        cubetas.setdefault((endpoint, metodo), [0] * (len(CUBETAS) + 1))[cubeta] = total
+    resultado = []
+    for fila in filas:
+        datos = dict(zip(('endpoint', 'metodo') + _COLUMNAS, fila))
+        peticiones = datos['peticiones'] or 1
+        datos['cubetas'] = cubetas.get((datos['endpoint'], datos['metodo']), [0] * (len(CUBETAS) + 1))
+        datos.update(
+            media_ms=datos['duracion'] * 1000 / peticiones,
+            max_ms=datos['duracion_max'] * 1000,
+            consultas_media=datos['consultas'] / peticiones,
+            sql_ms=datos['sql'] * 1000 / peticiones,
+            plantillas_ms=datos['plantillas'] * 1000 / peticiones,
+            bytes_medio=datos['bytes'] / peticiones,
+            p50_ms=_percentil(datos['cubetas'], datos['peticiones'], 0.5),
+            p95_ms=_percentil(datos['cubetas'], datos['peticiones'], 0.95),
+        )
+        resultado.append(datos)
+    return resultado
+
+
+def desde():
+    """Momento (timestamp) desde el que se cuentan las métricas"""
+    with _cerrojo:
+        return _db().execute('SELECT desde FROM inicio').fetchone()[0]
+
+
+def reiniciar():
+    """Pone a cero las métricas de todos los workers"""
+    volcar()
+    with _cerrojo:
+        conexion = _db()
+        conexion.execute('BEGIN IMMEDIATE')
+        conexion.execute('DELETE FROM rutas')
+        conexion.execute('DELETE FROM cubetas')
+        conexion.execute('UPDATE inicio SET desde = ?', (time.time(),))
+        conexion.execute('COMMIT')
+
+
+def token_valido():
+    """True si la petición trae Authorization: Bearer METRICAS_TOKEN (para el scraper de Prometheus)"""
+    token = current_app.config.get('METRICAS_TOKEN')
+    cabecera = request.headers.get('Authorization', '')
+    return bool(token) and cabecera.startswith('Bearer ') and hmac.compare_digest(cabecera[7:].strip(), token)
+
+
+def _etiquetas(**valores):
+    def escapar(valor):
+        return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    return '{' + ','.join(f'{nombre}="{escapar(valor)}"' for nombre, valor in valores.items()) + '}'
+
+
+def prometheus():
+    """Métricas en el formato de texto de Prometheus (version 0.0.4)"""
+    filas = rutas()
+    lineas = [
+        '# HELP asociacion_peticion_segundos Duración de las peticiones por ruta.',
+        '# TYPE asociacion_peticion_segundos histogram',
+    ]
+    for fila in filas:
+        etiquetas = {'endpoint': fila['endpoint'], 'metodo': fila['metodo']}
+        acumulado = 0
+        for cubeta, cuenta in enumerate(fila['cubetas']):
+            acumulado += cuenta
+            limite = repr(CUBETAS[cubeta]) if cubeta < len(CUBETAS) else '+Inf'
+            lineas.append(f'asociacion_peticion_segundos_bucket{_etiquetas(**etiquetas, le=limite)} {acumulado}')
+        lineas.append(f'asociacion_peticion_segundos_sum{_etiquetas(**etiquetas)} {fila["duracion"]:.6f}')
+        lineas.append(f'asociacion_peticion_segundos_count{_etiquetas(**etiquetas)} {fila["peticiones"]}')
+
+    contadores = (
+        ('asociacion_peticion_errores_total', 'Respuestas 5xx por ruta.', 'errores', '{}'),
+        ('asociacion_sql_consultas_total', 'Consultas SQL hechas en las peticiones.', 'consultas', '{}'),
+        ('asociacion_sql_segundos_total', 'Tiempo en SQL de las peticiones.', 'sql', '{:.6f}'),
+        ('asociacion_plantilla_segundos_total', 'Tiempo pintando plantillas.', 'plantillas', '{:.6f}'),
+        ('asociacion_respuesta_bytes_total', 'Bytes de las respuestas (Content-Length).', 'bytes', '{}'),
+    )
+    for nombre, ayuda, columna, formato in contadores:
+        lineas += [f'# HELP {nombre} {ayuda}', f'# TYPE {nombre} counter']
+        lineas += [f'{nombre}{_etiquetas(endpoint=fila["endpoint"], metodo=fila["metodo"])} '
+                   f'{formato.format(fila[columna])}' for fila in filas]
+    return '\n'.join(lineas) + '\n'
@@ -0,0 +1,155 @@
+"""
+Miniaturas y tamaños intermedios de las fotos de las galerías
+
+Para cada foto de static/galerias se generan versiones reducidas (TAMANOS)
+en WebP y JPEG, con la orientación EXIF ya aplicada, dentro de
+static/miniaturas. El nombre de cada versión lleva el hash del contenido de
+la foto original, así que:
+
+- una foto nueva o retocada produce nombres nuevos (y se puede servir con
+  caché "immutable" en nginx);
+- una foto que ya tiene todas sus versiones no se vuelve a procesar.
+
+Las fotos pendientes se reparten entre varios procesos (una por tarea). Lo
+ejecuta actualizar_galerias.py; las galerías usan las versiones a través
+del manifiesto (services/galerias.py) y solo cargan el original si se pide.
+"""
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import get_context
+import hashlib
+import os
+
+try:
+    from PIL import Image, ImageOps, features
+    PIL_AVAILABLE = True
+    WEBP_AVAILABLE = features.check('webp')
+except ImportError:
+    PIL_AVAILABLE = False
+    WEBP_AVAILABLE = False
+    print("[WARNING] Pillow no está instalado. No se generarán miniaturas de las galerías.")
+
+CARPETA = 'miniaturas'  # dentro de static/
+
+# Ancho máximo de cada versión (nunca se amplía una foto más pequeña)
+TAMANOS = {
+    'miniatura': 480,
+    'media': 1280,
+}
+
+CALIDAD_JPEG = 82
+CALIDAD_WEBP = 78
+
+
+def formatos():
+    return ('webp', 'jpg') if WEBP_AVAILABLE else ('jpg',)
+
+
+def hash_archivo(ruta):
+    """Hash corto del contenido de un archivo (clave de sus versiones)"""
+    h = hashlib.sha1()
+    with open(ruta, 'rb') as f:
+        for bloque in iter(lambda: f.read(1024 * 1024), b''):
+            h.update(bloque)
+    return h.hexdigest()[:16]
+
+
+def _ancho_final(ancho_original, ancho_maximo):
+    return min(ancho_original, ancho_maximo) if ancho_original else ancho_maximo
+
+
+def nombre_version(hash_foto, ancho, formato):
+    return f'{hash_foto}-{ancho}.{formato}'
+
+
+def versiones(static_folder, hash_foto, ancho_original):
+    """Versiones ya generadas de una foto, o None si falta alguna
+
+    {'miniatura': {'ancho': 480, 'webp': 'miniaturas/...webp', 'jpg': 'miniaturas/...jpg'}, 'media': {...}}
+    """
+    if not hash_foto:
+        return None
+    resultado = {}
+    for tamano, ancho_maximo in TAMANOS.items():
+        ancho = _ancho_final(ancho_original, ancho_maximo)
+        version = {'ancho': ancho}
+        for formato in formatos():
+            ruta = f'{CARPETA}/{nombre_version(hash_foto, ancho, formato)}'
+            if not os.path.exists(os.path.join(static_folder, ruta)):
+                return None
+            version[formato] = ruta
+        resultado[tamano] = version
+    return resultado
+
+
+def _guardar(imagen, ruta, formato):
+    """Guarda de forma atómica para no servir nunca un archivo a medias"""
+    temporal = f'{ruta}.{os.getpid()}.tmp'
+    if formato == 'webp':
+        imagen.save(temporal, 'WEBP', quality=CALIDAD_WEBP, method=4)
+    else:
+        imagen.save(temporal, 'JPEG', quality=CALIDAD_JPEG, optimize=True, progressive=True)
+    os.replace(temporal, ruta)
+
+
+def procesar(origen, destino, hash_foto):
+    """Genera todas las versiones de una foto (se ejecuta en un proceso del pool)"""
+    with Image.open(origen) as original:
+        imagen = ImageOps.exif_transpose(original)
+        if imagen.mode not in ('RGB', 'L'):
+            imagen = imagen.convert('RGB')
+        for ancho_maximo in TAMANOS.values():
+            ancho = _ancho_final(imagen.width, ancho_maximo)
+            alto = max(1, round(imagen.height * ancho / imagen.width))
+            reducida = imagen if ancho == imagen.width else imagen.resize((ancho, alto), Image.LANCZOS)
+            for formato in formatos():
+                _guardar(reducida, os.path.join(destino, nombre_version(hash_foto, ancho, formato)), formato)
+    return origen
+
+
+def generar(static_folder, fotos, procesos=None, progreso=None):
+    """Genera las versiones de las fotos que no las tengan todavía
+
+    fotos: entradas del manifiesto de galerías (con 'ruta', 'hash', 'ancho').
+    Devuelve el número de fotos procesadas.
+    """
+    if not PIL_AVAILABLE:
+        return 0
+    destino = os.path.join(static_folder, CARPETA)
+    os.makedirs(destino, exist_ok=True)
+
+    pendientes = {}
+    for foto in fotos:
+        if foto.get('hash') and foto['hash'] not in pendientes \
+                and versiones(static_folder, foto['hash'], foto.get('ancho')) is None:
+            pendientes[foto['hash']] = os.path.join(static_folder, foto['ruta'])
+    if not pendientes:
+        return 0
+
+    procesos = max(1, min(procesos or os.cpu_count() or 1, len(pendientes)))
+    hechas = 0
+    if procesos == 1:
+        for hash_foto, origen in pendientes.items():
+            try:
+                procesar(origen, destino, hash_foto)
+            except Exception as e:
+                print(f"[WARNING] No se pudo procesar {origen}: {e}")
+                continue
+            hechas += 1
+            if progreso:
+                progreso(hechas, len(pendientes), origen)
+        return hechas
+
+    with ProcessPoolExecutor(max_workers=procesos, mp_context=get_context('spawn')) as pool:
+        futuros = {pool.submit(procesar, origen, destino, hash_foto): origen
+                    for hash_foto, origen in pendientes.items()}
+        for futuro in as_completed(futuros):
+            origen = futuros[futuro]
+            try:
+                futuro.result()
+            except Exception as e:
+                print(f"[WARNING] No se pudo procesar {origen}: {e}")
+                continue
+            hechas += 1
+            if progreso:
+                progreso(hechas, len(pendientes), origen)
+    return hechas
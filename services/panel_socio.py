@@ -0,0 +1,190 @@
+"""
+Datos del panel y del historial de actividades del socio
+
+El panel (socios.dashboard) enseña las próximas actividades con sus plazas,
+las próximas en las que está apuntada la familia y, en cada actividad, a
+quién de la familia se puede inscribir. Antes la plantilla lo preguntaba
+actividad por actividad y persona por persona (usuario_inscrito,
+beneficiario_inscrito, numero_inscritos... una consulta cada vez). datos()
+lo resuelve con dos consultas:
+
+1. las actividades futuras con el número de inscritos (subconsulta
+   correlacionada) y, en la misma fila, las inscripciones de la familia
+   (LEFT JOIN);
+2. los beneficiarios del socio.
+
+Con eso calcula en memoria la matriz actividad x integrante: 'inscrito',
+'bloqueada', 'completa', 'edad' (con el mensaje) o 'disponible'. La
+plantilla solo consulta la matriz.
+
+Las actividades ya pasadas de la familia (socios.mis_actividades) pueden
+ser cientos en un socio de muchos años; historial() las sirve por páginas
+de la más reciente a la más antigua, con un cursor (fecha, id) de la última
+actividad mostrada en vez de OFFSET, así que cada página cuesta lo mismo.
+Las inscripciones de la familia se buscan con ix_inscripciones_user_actividad
+(e ix_inscripciones_archivo_user_actividad en el archivo): historial() lee
+las vistas de services/archivo.py para que no desaparezcan las actividades
+archivadas.
+"""
+from datetime import datetime
+
+from sqlalchemy import and_, func, or_, select
+from sqlalchemy.orm import aliased
+
+from models import Actividad, Beneficiario, Inscripcion, db
+from services import archivo
+
+SOCIO = 'socio'  # Clave del titular (la que envía el formulario de inscripción)
+
+TAMANO_HISTORIAL = 12
+
+
+def familia(socio):
+    """Titular y beneficiarios, como diccionarios con la clave del formulario"""
+    miembros = [{'clave': SOCIO, 'nombre': socio.nombre, 'ano_nacimiento': socio.ano_nacimiento,
+                 'nombre_pila': socio.nombre, 'titular': True, 'etiqueta': socio.nombre}]
+    beneficiarios = Beneficiario.query.filter_by(socio_id=socio.id).order_by(Beneficiario.nombre).all()
+    for ben in beneficiarios:
+        nombre = f'{ben.nombre} {ben.primer_apellido}'
+        miembros.append({'clave': ben.id, 'nombre': nombre, 'ano_nacimiento': ben.ano_nacimiento,
+                         'nombre_pila': ben.nombre, 'titular': False,
+                         'etiqueta': f'{nombre} ({ben.numero_beneficiario})' if ben.numero_beneficiario else nombre})
+    return miembros
+
+
+def _estado(actividad, inscritos, miembro, inscritos_familia):
+    """(estado, mensaje) de un integrante de la familia en una actividad futura"""
+    if miembro['clave'] in inscritos_familia:
+        return 'inscrito', None
+    if actividad.bloqueada_inscripcion:
+        return 'bloqueada', 'Las inscripciones están bloqueadas por la directiva.'
+    if inscritos >= actividad.aforo_maximo:
+        return 'completa', 'No quedan plazas.'
+    puede, mensaje = actividad.puede_inscribirse_por_edad(miembro['ano_nacimiento'])
+    if not puede:
+        return 'edad', mensaje
+    return 'disponible', None
+
+
+def datos(socio, ahora=None):
+    """Actividades del panel, familia y matriz de inscripción de un socio
+
+    Devuelve {'familia', 'proximas', 'inscritas'} (inscritas: las próximas
+    con alguien de la familia apuntado). Cada actividad es un diccionario
+    con 'actividad', 'inscritos', 'plazas', 'familia' (los integrantes
+    inscritos), 'matriz' ({clave: (estado, mensaje)}), 'resumen' y
+    'disponibles' (a quién se puede inscribir).
+    """
+    ahora = ahora or datetime.utcnow()
+    familia_socio = familia(socio)
+    por_clave = {miembro['clave']: miembro for miembro in familia_socio}
+
+    mias = aliased(Inscripcion)
+    filas = (db.session.query(Actividad, _inscritos(), mias.id, mias.beneficiario_id)
+             .outerjoin(mias, and_(mias.actividad_id == Actividad.id, mias.user_id == socio.id))
+             .filter(Actividad.fecha > ahora)
+             .order_by(Actividad.fecha, Actividad.id, mias.id)
+             .all())
+
+    actividades = {}
+    for actividad, total, inscripcion_id, beneficiario_id in filas:
+        datos_actividad = actividades.setdefault(actividad.id, _fila(actividad, total))
+        clave = SOCIO if beneficiario_id is None else beneficiario_id
+        if inscripcion_id is not None and clave in por_clave:
+            datos_actividad['familia'].append(por_clave[clave])
+
+    proximas = []
+    for datos_actividad in actividades.values():
+        actividad = datos_actividad['actividad']
+        claves_inscritas = {miembro['clave'] for miembro in datos_actividad['familia']}
+        matriz = {miembro['clave']: _estado(actividad, datos_actividad['inscritos'], miembro, claves_inscritas)
+                  for miembro in familia_socio}
+        disponibles = [miembro for miembro in familia_socio if matriz[miembro['clave']][0] == 'disponible']
+        if matriz[SOCIO][0] in ('inscrito', 'completa', 'bloqueada'):
+            resumen = matriz[SOCIO][0]
+        else:
+            resumen = 'disponible' if disponibles else 'no_disponible'
+        datos_actividad.update(matriz=matriz, disponibles=disponibles, resumen=resumen,
+                               mensaje=matriz[SOCIO][1])
+        proximas.append(datos_actividad)
+
+    inscritas = [datos_actividad for datos_actividad in proximas if datos_actividad['familia']]
+    return {'familia': familia_socio, 'proximas': proximas, 'inscritas': inscritas}
+
+
+def _inscritos():
+    """Subconsulta correlacionada con el número de inscritos de cada Actividad"""
+    return (select(func.count(Inscripcion.id)).where(Inscripcion.actividad_id == Actividad.id)
+            .correlate(Actividad).scalar_subquery())
+
+
+def _fila(actividad, inscritos):
+    return {
+        'actividad': actividad,
+        'inscritos': inscritos,
+        'plazas': max(actividad.aforo_maximo - inscritos, 0),
+        'familia': [],
+    }
+
+
+# ---------------------------------------------------------------------------
+# Historial
+# ---------------------------------------------------------------------------
+
+def cursor_de(actividad):
+    """Cursor de historial que apunta justo después de esta actividad"""
+    return f'{actividad.fecha.isoformat()}_{actividad.id}'
+
+
+def leer_cursor(cursor):
+    """(fecha, id) de un cursor, o None si no viene o no es válido"""
+    try:
+        fecha, actividad_id = (cursor or '').rsplit('_', 1)
+        return datetime.fromisoformat(fecha), int(actividad_id)
+    except ValueError:
+        return None
+
+
+def historial(socio, cursor=None, tamano=TAMANO_HISTORIAL, ahora=None):
+    """Una página de actividades pasadas de la familia, de la más reciente a la más antigua
+
+    Devuelve (filas, siguiente_cursor o None). Cada fila es como las de
+    datos(): 'actividad', 'inscritos', 'plazas' y 'familia'. Lee las vistas
+    del archivo, así que incluye las actividades archivadas ('actividad' es
+    entonces una fila de la vista, con archivada a 1).
+    """
+    ahora = ahora or datetime.utcnow()
+    actividades = archivo.actividades_historico
+    inscripciones = archivo.inscripciones_historico
+    de_la_familia = select(inscripciones.c.actividad_id).where(inscripciones.c.user_id == socio.id)
+    inscritos = (select(func.count()).select_from(inscripciones)
+                 .where(inscripciones.c.actividad_id == actividades.c.id)
+                 .correlate(actividades).scalar_subquery())
+    consulta = (select(actividades, inscritos)
+                .where(actividades.c.id.in_(de_la_familia), actividades.c.fecha <= ahora))
+    posicion = leer_cursor(cursor)
+    if posicion:
+        fecha, actividad_id = posicion
+        consulta = consulta.where(or_(actividades.c.fecha < fecha,
+                                      and_(actividades.c.fecha == fecha, actividades.c.id < actividad_id)))
+    # Una de más para saber si hay otra página
+    filas = db.session.execute(
+        consulta.order_by(actividades.c.fecha.desc(), actividades.c.id.desc()).limit(tamano + 1)
+    ).all()
+    siguiente = cursor_de(filas[tamano - 1]) if len(filas) > tamano else None
+    pagina = [_fila(fila, fila[-1]) for fila in filas[:tamano]]
+    if not pagina:
+        return pagina, None
+
+    por_clave = {miembro['clave']: miembro for miembro in familia(socio)}
+    por_actividad = {fila['actividad'].id: fila for fila in pagina}
+    inscritas = db.session.execute(
+        select(inscripciones.c.actividad_id, inscripciones.c.beneficiario_id)
+        .where(inscripciones.c.user_id == socio.id, inscripciones.c.actividad_id.in_(list(por_actividad)))
+        .order_by(inscripciones.c.fecha_inscripcion)
+    ).all()
+    for actividad_id, beneficiario_id in inscritas:
+        clave = SOCIO if beneficiario_id is None else beneficiario_id
+        if clave in por_clave:
+            por_actividad[actividad_id]['familia'].append(por_clave[clave])
+    return pagina, siguiente
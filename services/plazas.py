@@ -0,0 +1,122 @@
+"""
+Plazas disponibles de las actividades, para consultarlas sin pintar la página
+
+Un JSON en PLAZAS_CACHE (un disco local o /dev/shm, compartido por todos los
+workers de gunicorn) guarda, para cada actividad próxima, las plazas libres
+y si la directiva ha bloqueado las inscripciones. Se regenera con una sola
+consulta agrupada después de cada commit que toca actividades o
+inscripciones (services/versiones.py avisa), y como red de seguridad si
+tiene más de MAX_EDAD segundos (cambios hechos fuera de la aplicación,
+actividades que pasan a ser de hoy...).
+
+Cada worker guarda en memoria la última versión leída y solo vuelve a leer
+el archivo cuando cambia su fecha de modificación. El archivo lleva la suma
+de las versiones de las dos tablas: si dos workers lo regeneran a la vez,
+nunca se sustituye uno más reciente por otro más antiguo.
+"""
+from datetime import datetime
+import json
+import os
+import time
+
+from flask import current_app
+from sqlalchemy import bindparam, text
+
+from models import db
+from services import versiones
+
+try:
+    import fcntl
+    FCNTL_AVAILABLE = True
+except ImportError:
+    FCNTL_AVAILABLE = False
+
+MAX_EDAD = 60  # segundos
+MAX_AGE = 5  # segundos que el navegador puede reutilizar la respuesta
+
+_memoria = {'ruta': None, 'mtime': None, 'datos': None}
+
+_VERSION = text(
+    "SELECT COALESCE(SUM(version), 0) FROM versiones_tablas WHERE tabla IN ('actividades', 'inscripciones')"
+)
+
+_COLUMNAS = (
+    'SELECT a.id, a.aforo_maximo, a.bloqueada_inscripcion, '
+    '(SELECT COUNT(*) FROM inscripciones i WHERE i.actividad_id = a.id) '
+    'FROM actividades a '
+)
+_PROXIMAS = text(_COLUMNAS + 'WHERE a.fecha > :ahora')
+_POR_ID = text(_COLUMNAS + 'WHERE a.id IN :ids').bindparams(bindparam('ids', expanding=True))
+
+
+def _plazas(filas, ts):
+    return {
+        str(id_): {'plazas_disponibles': aforo - inscritos, 'bloqueada': bool(bloqueada), 'ts': ts}
+        for id_, aforo, bloqueada, inscritos in filas
+    }
+
+
+def refrescar():
+    """Regenera el archivo de plazas con lo que hay ahora en la base de datos"""
+    ruta = current_app.config['PLAZAS_CACHE']
+    ts = round(time.time(), 3)
+    with db.engine.connect() as conexion:
+        # La versión se lee antes que los datos: los datos son al menos de esa versión
+        version = conexion.execute(_VERSION).scalar()
+        filas = conexion.execute(_PROXIMAS, {'ahora': datetime.utcnow()}).all()
+    datos = {'version': version, 'ts': ts, 'actividades': _plazas(filas, ts)}
+
+    os.makedirs(os.path.dirname(ruta), exist_ok=True)
+    with open(f'{ruta}.lock', 'w') as cerrojo:
+        if FCNTL_AVAILABLE:
+            fcntl.flock(cerrojo, fcntl.LOCK_EX)
+        actual = _leer_archivo(ruta)
+        if actual is not None and actual.get('version', 0) > version:
+            return actual
+        temporal = f'{ruta}.{os.getpid()}.tmp'
+        with open(temporal, 'w', encoding='utf-8') as f:
+            json.dump(datos, f)
+        os.replace(temporal, ruta)
+    return datos
+
+
+def _leer_archivo(ruta):
+    try:
+        with open(ruta, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _datos():
+    """Contenido vigente del archivo, desde la memoria del worker si no ha cambiado"""
+    ruta = current_app.config['PLAZAS_CACHE']
+    try:
+        mtime = os.stat(ruta).st_mtime_ns
+    except OSError:
+        mtime = None
+    if mtime is not None and _memoria['ruta'] == ruta and _memoria['mtime'] == mtime:
+        datos = _memoria['datos']
+    else:
+        datos = _leer_archivo(ruta) if mtime is not None else None
+        _memoria.update(ruta=ruta, mtime=mtime, datos=datos)
+    if datos is None or datos['ts'] + MAX_EDAD < time.time():
+        datos = refrescar()
+    return datos
+
+
+def consultar(ids):
+    """{id (texto): {'plazas_disponibles', 'bloqueada', 'ts'}} de las actividades que existan"""
+    datos = _datos()
+    actividades = datos['actividades']
+    resultado = {str(id_): actividades[str(id_)] for id_ in ids if str(id_) in actividades}
+    faltan = [id_ for id_ in ids if str(id_) not in resultado]
+    if faltan:
+        # Actividades ya celebradas: no están en el archivo, se consultan directamente. Llevan el ts
+        # del archivo (se regenera con cada cambio de las dos tablas) para que el ETag no cambie solo
+        filas = db.session.execute(_POR_ID, {'ids': faltan}).all()
+        resultado.update(_plazas(filas, datos['ts']))
+    return resultado
+
+
+versiones.al_confirmar(('actividades', 'inscripciones'), refrescar)
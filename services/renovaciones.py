@@ -0,0 +1,131 @@
+"""
+Renovación masiva de socios
+
+En enero la directiva renueva a casi todos los socios a la vez. renovar()
+lo hace con unas pocas sentencias sobre conjuntos, en una sola transacción:
+
+1. guarda en renovaciones_socios qué socios cumplen el filtro y la validez
+   que tenían (es el registro de la renovación y fija el conjunto);
+2. UPDATE de users.fecha_validez de esos socios;
+3. UPDATE de beneficiarios.fecha_validez de sus beneficiarios, que tienen
+   siempre la misma fecha que el socio.
+
+Solo se alarga la validez: un socio que ya llega a la nueva fecha no se
+toca. previsualizar() cuenta lo mismo sin cambiar nada. Al terminar se
+vuelve a generar la lista de vencimientos del día.
+"""
+from datetime import datetime
+import time
+
+from sqlalchemy import func, insert, literal, select, update
+
+from models import Beneficiario, Renovacion, RenovacionSocio, User, db
+from services import vencimientos, verificacion
+
+FILTROS = {
+    'todos': 'Todos los socios',
+    'vencidos': 'Con la suscripción vencida',
+    'forma_pago': 'Por forma de pago',
+    'ids': 'Socios concretos (números de socio)',
+}
+
+FORMAS_PAGO = ('bizum', 'transferencia', 'efectivo')
+
+
+def fecha_fin(año):
+    """Validez de una renovación: 31/12 del año, al final del día (como renovar_socio)"""
+    return datetime(año, 12, 31, 23, 59, 59)
+
+
+def leer_numeros(texto):
+    """Números de socio de un texto separado por comas, espacios o saltos de línea"""
+    numeros = []
+    for parte in texto.replace(',', ' ').split():
+        if parte.isdigit():
+            numero = f'{int(parte):04d}'
+            if numero not in numeros:
+                numeros.append(numero)
+    return numeros
+
+
+def _condicion(filtro, valor, nueva):
+    """Condición sobre users de los socios a renovar. ValueError si el filtro no vale"""
+    condiciones = [User.rol == 'socio', User.fecha_validez < nueva]
+    if filtro == 'vencidos':
+        condiciones.append(User.fecha_validez < datetime.utcnow())
+    elif filtro == 'forma_pago':
+        if valor not in FORMAS_PAGO:
+            raise ValueError('Forma de pago no válida.')
+        condiciones.append(User.forma_de_pago == valor)
+    elif filtro == 'ids':
+        if not valor:
+            raise ValueError('Indica al menos un número de socio.')
+        condiciones.append(User.numero_socio.in_(valor))
+    elif filtro != 'todos':
+        raise ValueError('Filtro de socios no válido.')
+    return db.and_(*condiciones)
+
+
+def descripcion(filtro, valor):
+    if filtro == 'forma_pago':
+        return f'{FILTROS[filtro]}: {valor}'
+    if filtro == 'ids':
+        return f"{FILTROS[filtro]}: {', '.join(valor)}"
+    return FILTROS[filtro]
+
+
+def previsualizar(filtro, valor, año):
+    """{'socios', 'beneficiarios', 'fecha_validez'} que se renovarían, sin cambiar nada"""
+    nueva = fecha_fin(año)
+    ids = select(User.id).where(_condicion(filtro, valor, nueva)).scalar_subquery()
+    socios, beneficiarios = db.session.execute(select(
+        select(func.count()).select_from(User).where(User.id.in_(ids)).scalar_subquery(),
+        select(func.count()).select_from(Beneficiario).where(Beneficiario.socio_id.in_(ids)).scalar_subquery(),
+    )).one()
+    return {'socios': socios, 'beneficiarios': beneficiarios, 'fecha_validez': nueva}
+
+
+def renovar(filtro, valor, año, usuario=None):
+    """Renueva los socios del filtro y sus beneficiarios. Devuelve la Renovacion guardada"""
+    inicio = time.perf_counter()
+    nueva = fecha_fin(año)
+    condicion = _condicion(filtro, valor, nueva)
+    renovacion = Renovacion(usuario=usuario, filtro=descripcion(filtro, valor), fecha_validez=nueva)
+    try:
+        db.session.add(renovacion)
+        db.session.flush()
+
+        db.session.execute(insert(RenovacionSocio).from_select(
+            ['renovacion_id', 'user_id', 'validez_anterior'],
+            select(literal(renovacion.id), User.id, User.fecha_validez).where(condicion),
+        ))
+        renovados = select(RenovacionSocio.user_id).where(RenovacionSocio.renovacion_id == renovacion.id)
+        socios = db.session.execute(
+            update(User).where(User.id.in_(renovados)).values(fecha_validez=nueva)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        beneficiarios = db.session.execute(
+            update(Beneficiario).where(Beneficiario.socio_id.in_(renovados)).values(fecha_validez=nueva)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+
+        renovacion.socios = socios
+        renovacion.beneficiarios = beneficiarios
+        renovacion.duracion_ms = int((time.perf_counter() - inicio) * 1000)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    # Los objetos User/Beneficiario ya cargados tienen la fecha vieja; el estado de los carnets también
+    db.session.expire_all()
+    verificacion.invalidar()
+    # y la lista de vencimientos del día
+    try:
+        vencimientos.generar()
+    except Exception as e:
+        print(f"[WARNING] No se pudo regenerar la lista de vencimientos tras la renovación: {e}")
+    return renovacion
+
+
+def ultimas(limite=10):
+    return Renovacion.query.order_by(Renovacion.fecha.desc()).limit(limite).all()
@@ -0,0 +1,107 @@
+"""
+Tareas que puede ejecutar la cola de trabajos (services/trabajos.py)
+
+Cada tarea recibe el Trabajo en curso, se ejecuta dentro de un contexto de
+aplicación y devuelve (archivo, nombre_descarga, mimetype) o None.
+"""
+from datetime import datetime
+
+from models import Actividad
+from services import archivo, carnets, estadisticas, exportaciones, informes, inscritos, vencimientos
+from services.trabajos import tarea
+
+
+@tarea('exportar_socios_excel', 'Socios en Excel')
+def exportar_socios_excel(trabajo):
+    return trabajo.guardar(*exportaciones.excel_socios(trabajo.progreso))
+
+
+@tarea('exportar_vencimientos_excel', 'Socios vencidos y por vencer en Excel')
+def exportar_vencimientos_excel(trabajo):
+    return trabajo.guardar(*exportaciones.excel_vencimientos(trabajo.progreso))
+
+
+@tarea('exportar_estadisticas_excel', 'Estadísticas en Excel')
+def exportar_estadisticas_excel(trabajo):
+    return trabajo.guardar(*exportaciones.excel_estadisticas(trabajo.progreso))
+
+
+@tarea('exportar_solicitudes_excel', 'Solicitudes confirmadas en Excel')
+def exportar_solicitudes_excel(trabajo):
+    return trabajo.guardar(*exportaciones.excel_solicitudes_confirmadas(trabajo.progreso))
+
+
+@tarea('exportar_datos', 'Exportación de datos (JSON)')
+def exportar_datos(trabajo):
+    return trabajo.guardar(*exportaciones.json_datos(trabajo.progreso))
+
+
+@tarea('actividades_pdf', 'Listado de actividades en PDF')
+def actividades_pdf(trabajo):
+    actividades = Actividad.query.order_by(Actividad.fecha.desc()).all()
+    pdf_bytes = informes.pdf_listado_actividades(actividades, datetime.utcnow())
+    return trabajo.guardar(pdf_bytes, f'listado_actividades_{datetime.now().strftime("%Y%m%d")}.pdf',
+                           'application/pdf')
+
+
+@tarea('inscritos_pdf', 'Inscritos de una actividad en PDF')
+def inscritos_pdf(trabajo):
+    actividad = Actividad.query.get(trabajo.parametros['actividad_id'])
+    if actividad is None:
+        raise exportaciones.ErrorExportacion('La actividad ya no existe.')
+    pdf_bytes = informes.pdf_inscritos(actividad, inscritos.listado(actividad.id), datetime.utcnow())
+    nombre_archivo = f"inscritos_{actividad.nombre.replace(' ', '_')}_{datetime.now().strftime('%Y%m%d')}.pdf"
+    return trabajo.guardar(pdf_bytes, nombre_archivo, 'application/pdf')
+
+
+@tarea('descargar_base_datos', 'Copia completa de la base de datos')
+def descargar_base_datos(trabajo):
+    return trabajo.guardar(*exportaciones.copia_base_datos(trabajo.app))
+
+
+@tarea('restaurar_base_datos', 'Restauración de la base de datos')
+def restaurar_base_datos(trabajo):
+    with open(trabajo.ruta_entrada, 'rb') as f:
+        archivo_data = f.read()
+    avisos = exportaciones.restaurar_base_datos(trabajo.app, archivo_data,
+                                                trabajo.parametros.get('motivo', 'restauracion'))
+    for mensaje, _ in avisos:
+        print(f"[INFO] {mensaje}")
+    return None
+
+
+@tarea('carnets', 'Carnets por lotes')
+def carnets_lote(trabajo):
+    archivo = carnets.generar(trabajo.directorio, trabajo.parametros['filtro'], trabajo.parametros.get('poblacion'),
+                              progreso=trabajo.progreso, procesos=trabajo.app.config.get('CARNETS_PROCESOS'),
+                              url_base=trabajo.parametros.get('url_base'))
+    if archivo is None:
+        raise exportaciones.ErrorExportacion('No hay socios que cumplan el filtro.')
+    extension = archivo.rsplit('.', 1)[1]
+    mimetype = 'application/pdf' if extension == 'pdf' else 'application/zip'
+    return archivo, f"carnets_{datetime.now().strftime('%Y%m%d_%H%M')}.{extension}", mimetype
+
+
+@tarea('vencimientos', 'Lista diaria de socios vencidos y por vencer', diaria=True)
+def lista_vencimientos(trabajo):
+    lista = vencimientos.generar()
+    print(f"[INFO] Lista de vencimientos del {lista.fecha.strftime('%d/%m/%Y')}: "
+          f"{lista.por_vencer} por vencer, {lista.vencidos} vencidos ({lista.duracion_ms} ms)")
+    return None
+
+
+@tarea('archivar_actividades', 'Archivo de actividades antiguas', diaria=True)
+def archivar_actividades(trabajo):
+    resultado = archivo.archivar()
+    if resultado['actividades']:
+        print(f"[INFO] Archivadas {resultado['actividades']} actividad(es) y {resultado['inscripciones']} "
+              f"inscripción(es) anteriores al {resultado['corte'].strftime('%d/%m/%Y')} ({resultado['duracion_ms']} ms)")
+    return None
+
+
+@tarea('estadisticas', 'Estadísticas de socios y actividades', diaria=True)
+def generar_estadisticas(trabajo):
+    informe = estadisticas.generar()
+    print(f"[INFO] Estadísticas generadas: {informe.socios} socios, {informe.actividades} actividades "
+          f"({informe.duracion_ms} ms)")
+    return None
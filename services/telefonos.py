@@ -0,0 +1,160 @@
+"""
+Índice de teléfonos de las solicitudes de socio
+
+Cada móvil (movil y movil2) de una solicitud tiene una fila en la tabla
+telefonos con el número normalizado (solo dígitos, sin prefijo de España)
+y una restricción UNIQUE. Comprobar si un número ya está registrado es una
+sola búsqueda por índice, y si dos personas envían a la vez el formulario
+con el mismo número la base de datos rechaza la segunda (IntegrityError).
+
+Las filas se mantienen al crear o editar una solicitud (asignar) y al
+importar datos; al confirmar la solicitud se apunta también el socio creado.
+poblar() rellena al arrancar las que falten (solicitudes anteriores a la
+tabla o creadas por scripts) y apunta el socio en las de solicitudes ya
+confirmadas, buscándolo por el nombre completo con el que se creó.
+formas_de_pago() usa ese enlace para dar a los socios sin forma de pago la
+de su solicitud.
+"""
+import re
+
+from sqlalchemy import select, update
+
+from models import SolicitudSocio, Telefono, User, db
+
+
+def normalizar(numero):
+    """Solo los dígitos, sin +34 / 0034 delante. None si no queda nada"""
+    if not numero:
+        return None
+    digitos = re.sub(r'\D', '', numero)
+    if len(digitos) == 11 and digitos.startswith('34'):
+        digitos = digitos[2:]
+    elif len(digitos) == 13 and digitos.startswith('0034'):
+        digitos = digitos[4:]
+    return digitos or None
+
+
+def numeros(solicitud):
+    """Números normalizados de la solicitud, sin repetir"""
+    return list(dict.fromkeys(n for n in (normalizar(solicitud.movil), normalizar(solicitud.movil2)) if n))
+
+
+def registrado(numero, excepto_solicitud_id=None):
+    """Telefono que ya tiene ese número (de otra solicitud si se indica excepto_solicitud_id), o None"""
+    numero = normalizar(numero)
+    if not numero:
+        return None
+    telefono = Telefono.query.filter_by(numero=numero).first()
+    if telefono is not None and excepto_solicitud_id is not None and telefono.solicitud_id == excepto_solicitud_id:
+        return None
+    return telefono
+
+
+def asignar(solicitud, user_id=None):
+    """Deja en telefonos exactamente los números actuales de la solicitud (antes del flush/commit)"""
+    actuales = numeros(solicitud)
+    for telefono in list(solicitud.telefonos):
+        if telefono.numero not in actuales:
+            solicitud.telefonos.remove(telefono)
+    existentes = {telefono.numero for telefono in solicitud.telefonos}
+    for numero in actuales:
+        if numero not in existentes:
+            solicitud.telefonos.append(Telefono(numero=numero, user_id=user_id))
+    if user_id is not None:
+        for telefono in solicitud.telefonos:
+            telefono.user_id = user_id
+
+
+def es_duplicado(error):
+    """True si el IntegrityError viene de la restricción UNIQUE de telefonos"""
+    mensaje = str(getattr(error, 'orig', error)).lower()
+    return 'telefonos.numero' in mensaje or 'telefonos_numero' in mensaje
+
+
+def _nombre_completo(nombre, primer_apellido, segundo_apellido):
+    """Como lo compone admin.confirmar_solicitud, en mayúsculas para comparar"""
+    partes = [nombre, primer_apellido] + ([segundo_apellido] if segundo_apellido else [])
+    return ' '.join(parte.strip() for parte in partes).upper()
+
+
+def _enlazar_socios():
+    """Apunta el socio en los teléfonos de solicitudes confirmadas que no lo tienen
+
+    El socio se busca por el nombre completo; si hay varios socios con el
+    mismo nombre o el socio ya tiene otra solicitud, se deja sin enlazar.
+    Devuelve el número de teléfonos enlazados.
+    """
+    sin_socio = (db.session.query(Telefono.id, SolicitudSocio.id, SolicitudSocio.nombre,
+                                  SolicitudSocio.primer_apellido, SolicitudSocio.segundo_apellido)
+                 .join(SolicitudSocio, Telefono.solicitud_id == SolicitudSocio.id)
+                 .filter(Telefono.user_id.is_(None), SolicitudSocio.estado == 'activa')
+                 .all())
+    if not sin_socio:
+        return 0
+    enlazados = {user_id for (user_id,) in db.session.query(Telefono.user_id).filter(Telefono.user_id.isnot(None))}
+    por_nombre = {}
+    for user_id, nombre in db.session.query(User.id, User.nombre).filter(User.rol == 'socio'):
+        por_nombre.setdefault(nombre.strip().upper(), []).append(user_id)
+
+    por_solicitud = {}
+    cambios = []
+    for telefono_id, solicitud_id, nombre, primer_apellido, segundo_apellido in sin_socio:
+        if solicitud_id not in por_solicitud:
+            candidatos = por_nombre.get(_nombre_completo(nombre, primer_apellido, segundo_apellido), [])
+            por_solicitud[solicitud_id] = candidatos[0] if len(candidatos) == 1 and candidatos[0] not in enlazados else None
+            if por_solicitud[solicitud_id] is not None:
+                enlazados.add(por_solicitud[solicitud_id])
+        if por_solicitud[solicitud_id] is not None:
+            cambios.append({'id': telefono_id, 'user_id': por_solicitud[solicitud_id]})
+    if cambios:
+        db.session.execute(update(Telefono), cambios)
+    return len(cambios)
+
+
+def poblar():
+    """Crea las filas que falten a partir de movil/movil2 de las solicitudes y enlaza sus socios (create_app)
+
+    Si dos solicitudes antiguas comparten número se queda la más antigua y se
+    avisa. Devuelve el número de filas creadas.
+    """
+    ocupados = {numero for (numero,) in db.session.query(Telefono.numero)}
+    solicitudes = db.session.query(SolicitudSocio.id, SolicitudSocio.movil, SolicitudSocio.movil2).order_by(SolicitudSocio.id)
+    nuevos = {}
+    repetidos = 0
+    for solicitud_id, movil, movil2 in solicitudes:
+        for numero in dict.fromkeys(n for n in (normalizar(movil), normalizar(movil2)) if n):
+            if numero in nuevos:
+                repetidos += 1
+            elif numero not in ocupados:
+                nuevos[numero] = solicitud_id
+    nuevos = [{'numero': numero, 'solicitud_id': solicitud_id} for numero, solicitud_id in nuevos.items()]
+    if nuevos:
+        db.session.execute(db.insert(Telefono), nuevos)
+    enlazados = _enlazar_socios()
+    db.session.commit()
+    if nuevos:
+        print(f"[INFO] {len(nuevos)} teléfono(s) añadidos a la tabla 'telefonos'")
+    if enlazados:
+        print(f"[INFO] {enlazados} teléfono(s) de solicitudes confirmadas enlazados con su socio")
+    if repetidos:
+        print(f"[WARNING] {repetidos} teléfono(s) de solicitudes antiguas ya estaban en otra solicitud y no se han indexado")
+    return len(nuevos)
+
+
+def formas_de_pago():
+    """Da a los socios sin forma de pago la de la solicitud de la que salieron (create_app, después de poblar)
+
+    Devuelve el número de socios actualizados.
+    """
+    de_la_solicitud = (select(SolicitudSocio.forma_de_pago)
+                       .join(Telefono, Telefono.solicitud_id == SolicitudSocio.id)
+                       .where(Telefono.user_id == User.id)
+                       .order_by(SolicitudSocio.id.desc()).limit(1).scalar_subquery())
+    con_solicitud = select(Telefono.id).where(Telefono.user_id == User.id).exists()
+    resultado = db.session.execute(
+        update(User).where(User.forma_de_pago.is_(None), con_solicitud).values(forma_de_pago=de_la_solicitud)
+        .execution_options(synchronize_session=False))
+    db.session.commit()
+    if resultado.rowcount:
+        print(f"[INFO] Forma de pago tomada de la solicitud en {resultado.rowcount} socio(s)")
+    return resultado.rowcount
@@ -0,0 +1,464 @@
+"""
+Cola de trabajos en segundo plano
+
+Las exportaciones pesadas (Excel, JSON, PDF, copias de la base de datos,
+carnets por lotes) no caben en un worker sync de gunicorn con timeout = 30.
+Las vistas las encolan aquí y devuelven el identificador al momento; un
+proceso aparte (worker_trabajos.py, arrancado por systemd) las ejecuta.
+
+El estado vive en un SQLite propio (TRABAJOS_DIR/trabajos.db), independiente
+de la base de datos de la aplicación, para que la cola siga funcionando
+mientras se restaura esa base de datos. Cada trabajo tiene además un
+directorio TRABAJOS_DIR/<id>/ con el archivo de entrada (si lo hay) y el
+resultado.
+
+Estados: pendiente -> en_curso -> completado | error | cancelado
+
+Las tareas se registran con el decorador @tarea (ver services/tareas.py) y
+reciben un objeto Trabajo; devuelven (archivo, nombre_descarga, mimetype)
+con el archivo ya escrito en trabajo.directorio, o None si no generan nada.
+Las registradas con diaria=True las encola el propio worker una vez al día,
+a partir de HORA_DIARIAS (programar_diarias).
+
+Solo ejecuta trabajos el proceso que tiene el cerrojo TRABAJOS_DIR/worker.lock
+(tomar_cerrojo), sea worker_trabajos.py o el hilo interno de un proceso web
+(iniciar_worker_interno).
+"""
+import json
+import os
+import re
+import secrets
+import shutil
+import sqlite3
+import threading
+import time
+import traceback
+from datetime import datetime, timedelta
+
+try:
+    import fcntl
+    FCNTL_AVAILABLE = True
+except ImportError:
+    FCNTL_AVAILABLE = False
+
+TAREAS = {}
+DIARIAS = []
+
+ESTADOS_ACTIVOS = ('pendiente', 'en_curso')
+
+CADUCIDAD_DIAS = 7
+
+# Hora (local) a partir de la cual se encolan las tareas diarias
+HORA_DIARIAS = 4
+
+# Segundos entre intentos de tomar el cerrojo de los procesos web que no lo tienen
+CANDIDATO_INTERVALO = 30
+
+_ID = re.compile(r'^[0-9a-f]{16}$')
+
+_esquemas_creados = set()
+
+_interno = {'pid': None}
+_interno_lock = threading.Lock()
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS trabajos (
+    id TEXT PRIMARY KEY,
+    tipo TEXT NOT NULL,
+    descripcion TEXT,
+    parametros TEXT NOT NULL DEFAULT '{}',
+    usuario TEXT,
+    estado TEXT NOT NULL DEFAULT 'pendiente',
+    procesados INTEGER NOT NULL DEFAULT 0,
+    total INTEGER NOT NULL DEFAULT 0,
+    cancelar INTEGER NOT NULL DEFAULT 0,
+    archivo TEXT,
+    nombre_descarga TEXT,
+    mimetype TEXT,
+    error TEXT,
+    creado TEXT NOT NULL,
+    iniciado TEXT,
+    finalizado TEXT
+);
+CREATE INDEX IF NOT EXISTS ix_trabajos_estado_creado ON trabajos (estado, creado);
+CREATE INDEX IF NOT EXISTS ix_trabajos_tipo_creado ON trabajos (tipo, creado);
+"""
+
+
+class TrabajoCancelado(Exception):
+    """La directiva canceló el trabajo mientras se ejecutaba"""
+
+
+def tarea(tipo, descripcion, diaria=False):
+    """Registra una función como tarea ejecutable por la cola (diaria: la encola el worker cada día)"""
+    def registrar(funcion):
+        TAREAS[tipo] = (funcion, descripcion)
+        if diaria and tipo not in DIARIAS:
+            DIARIAS.append(tipo)
+        return funcion
+    return registrar
+
+
+# ---------------------------------------------------------------------------
+# Almacenamiento
+# ---------------------------------------------------------------------------
+
+def _directorio(app):
+    return app.config['TRABAJOS_DIR']
+
+
+def _conectar(app):
+    directorio = _directorio(app)
+    os.makedirs(directorio, exist_ok=True)
+    ruta = os.path.join(directorio, 'trabajos.db')
+    conn = sqlite3.connect(ruta, timeout=30, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    conn.execute('PRAGMA busy_timeout=30000;')
+    if ruta not in _esquemas_creados:
+        conn.execute('PRAGMA journal_mode=WAL;')
+        conn.executescript(_ESQUEMA)
+        _esquemas_creados.add(ruta)
+    return conn
+
+
+def _ahora():
+    return datetime.now().isoformat(timespec='seconds')
+
+
+def _como_dict(fila):
+    if fila is None:
+        return None
+    trabajo = dict(fila)
+    trabajo['parametros'] = json.loads(trabajo['parametros'] or '{}')
+    trabajo['cancelar'] = bool(trabajo['cancelar'])
+    trabajo['porcentaje'] = (trabajo['procesados'] * 100 // trabajo['total']) if trabajo['total'] else 0
+    for campo in ('creado', 'iniciado', 'finalizado'):
+        trabajo[f'{campo}_legible'] = (datetime.fromisoformat(trabajo[campo]).strftime('%d/%m/%Y %H:%M')
+                                       if trabajo[campo] else '')
+    return trabajo
+
+
+def ruta_trabajo(app, trabajo_id):
+    """Directorio de un trabajo (valida el identificador)"""
+    if not _ID.match(trabajo_id or ''):
+        raise ValueError('Identificador de trabajo no válido')
+    return os.path.join(_directorio(app), trabajo_id)
+
+
+def encolar(app, tipo, parametros=None, usuario=None, descripcion=None, entrada=None):
+    """Añade un trabajo a la cola y devuelve su identificador
+
+    entrada: archivo subido (FileStorage) o bytes que la tarea leerá de
+    trabajo.ruta_entrada. Se guarda antes de insertar el trabajo para que el
+    worker nunca lo recoja a medias.
+    """
+    if tipo not in TAREAS:
+        raise ValueError(f'Tipo de trabajo desconocido: {tipo}')
+    trabajo_id = secrets.token_hex(8)
+    ruta = ruta_trabajo(app, trabajo_id)
+    os.makedirs(ruta, exist_ok=True)
+    if entrada is not None:
+        destino = os.path.join(ruta, 'entrada')
+        if isinstance(entrada, bytes):
+            with open(destino, 'wb') as f:
+                f.write(entrada)
+        else:
+            entrada.save(destino)
+
+    conn = _conectar(app)
+    try:
+        _insertar(conn, trabajo_id, tipo, parametros, usuario, descripcion)
+    finally:
+        conn.close()
+    return trabajo_id
+
+
+def _insertar(conn, trabajo_id, tipo, parametros=None, usuario=None, descripcion=None):
+    conn.execute(
+        'INSERT INTO trabajos (id, tipo, descripcion, parametros, usuario, creado) VALUES (?, ?, ?, ?, ?, ?)',
+        (trabajo_id, tipo, descripcion or TAREAS[tipo][1], json.dumps(parametros or {}, ensure_ascii=False),
+         usuario, _ahora())
+    )
+
+
+def obtener(app, trabajo_id):
+    """Trabajo como diccionario, o None si no existe"""
+    if not _ID.match(trabajo_id or ''):
+        return None
+    conn = _conectar(app)
+    try:
+        return _como_dict(conn.execute('SELECT * FROM trabajos WHERE id = ?', (trabajo_id,)).fetchone())
+    finally:
+        conn.close()
+
+
+def listar(app, tipo=None, limite=20):
+    """Últimos trabajos, del más reciente al más antiguo"""
+    conn = _conectar(app)
+    try:
+        if tipo:
+            filas = conn.execute('SELECT * FROM trabajos WHERE tipo = ? ORDER BY creado DESC, rowid DESC LIMIT ?',
+                                 (tipo, limite)).fetchall()
+        else:
+            filas = conn.execute('SELECT * FROM trabajos ORDER BY creado DESC, rowid DESC LIMIT ?',
+                                 (limite,)).fetchall()
+        return [_como_dict(fila) for fila in filas]
+    finally:
+        conn.close()
+
+
+def cancelar(app, trabajo_id):
+    """Cancela un trabajo. Devuelve el trabajo actualizado o None si no existe
+
+    Un trabajo pendiente se cancela al momento; uno en curso queda marcado y
+    se detiene en su siguiente aviso de progreso.
+    """
+    conn = _conectar(app)
+    try:
+        conn.execute("UPDATE trabajos SET estado = 'cancelado', finalizado = ? WHERE id = ? AND estado = 'pendiente'",
+                     (_ahora(), trabajo_id))
+        conn.execute("UPDATE trabajos SET cancelar = 1 WHERE id = ? AND estado = 'en_curso'", (trabajo_id,))
+    finally:
+        conn.close()
+    return obtener(app, trabajo_id)
+
+
+def ruta_resultado(app, trabajo_id):
+    """(ruta, nombre_descarga, mimetype) de un trabajo completado, o None"""
+    trabajo = obtener(app, trabajo_id)
+    if not trabajo or trabajo['estado'] != 'completado' or not trabajo['archivo']:
+        return None
+    ruta = os.path.join(ruta_trabajo(app, trabajo_id), trabajo['archivo'])
+    if not os.path.exists(ruta):
+        return None
+    return ruta, trabajo['nombre_descarga'], trabajo['mimetype']
+
+
+def limpiar_antiguos(app, dias=CADUCIDAD_DIAS):
+    """Borra los trabajos terminados hace más de `dias` días y sus archivos"""
+    limite = (datetime.now() - timedelta(days=dias)).isoformat(timespec='seconds')
+    conn = _conectar(app)
+    try:
+        ids = [fila['id'] for fila in conn.execute(
+            "SELECT id FROM trabajos WHERE estado NOT IN ('pendiente', 'en_curso') AND creado < ?", (limite,))]
+        for trabajo_id in ids:
+            shutil.rmtree(ruta_trabajo(app, trabajo_id), ignore_errors=True)
+            conn.execute('DELETE FROM trabajos WHERE id = ?', (trabajo_id,))
+    finally:
+        conn.close()
+    return len(ids)
+
+
+# ---------------------------------------------------------------------------
+# Ejecución
+# ---------------------------------------------------------------------------
+
+class Trabajo:
+    """Trabajo en ejecución tal como lo ve una tarea"""
+
+    def __init__(self, app, fila):
+        self.app = app
+        self.id = fila['id']
+        self.tipo = fila['tipo']
+        self.usuario = fila['usuario']
+        self.parametros = json.loads(fila['parametros'] or '{}')
+        self.directorio = ruta_trabajo(app, self.id)
+        self.ruta_entrada = os.path.join(self.directorio, 'entrada')
+
+    def progreso(self, procesados, total=None):
+        """Guarda el avance y lanza TrabajoCancelado si se ha pedido cancelar"""
+        conn = _conectar(self.app)
+        try:
+            if total is None:
+                conn.execute('UPDATE trabajos SET procesados = ? WHERE id = ?', (procesados, self.id))
+            else:
+                conn.execute('UPDATE trabajos SET procesados = ?, total = ? WHERE id = ?',
+                             (procesados, total, self.id))
+            fila = conn.execute('SELECT cancelar FROM trabajos WHERE id = ?', (self.id,)).fetchone()
+        finally:
+            conn.close()
+        if fila and fila['cancelar']:
+            raise TrabajoCancelado()
+
+    def guardar(self, datos, nombre_descarga, mimetype):
+        """Escribe el resultado en el directorio del trabajo (atajo para las tareas)"""
+        archivo = 'resultado' + os.path.splitext(nombre_descarga)[1]
+        with open(os.path.join(self.directorio, archivo), 'wb') as f:
+            f.write(datos)
+        return archivo, nombre_descarga, mimetype
+
+
+def _reclamar(app):
+    """Pasa a en_curso el trabajo pendiente más antiguo y lo devuelve"""
+    conn = _conectar(app)
+    try:
+        conn.execute('BEGIN IMMEDIATE')
+        fila = conn.execute(
+            "SELECT * FROM trabajos WHERE estado = 'pendiente' ORDER BY creado, rowid LIMIT 1").fetchone()
+        if fila:
+            conn.execute("UPDATE trabajos SET estado = 'en_curso', iniciado = ? WHERE id = ?",
+                         (_ahora(), fila['id']))
+        conn.execute('COMMIT')
+        return fila
+    except Exception:
+        conn.execute('ROLLBACK')
+        raise
+    finally:
+        conn.close()
+
+
+def _finalizar(app, trabajo_id, **campos):
+    campos['finalizado'] = _ahora()
+    asignaciones = ', '.join(f'{campo} = ?' for campo in campos)
+    conn = _conectar(app)
+    try:
+        conn.execute(f'UPDATE trabajos SET {asignaciones} WHERE id = ?', (*campos.values(), trabajo_id))
+    finally:
+        conn.close()
+
+
+def ejecutar_siguiente(app):
+    """Ejecuta el siguiente trabajo pendiente. Devuelve False si no había ninguno"""
+    fila = _reclamar(app)
+    if fila is None:
+        return False
+
+    from models import db
+    trabajo = Trabajo(app, fila)
+    inicio = time.time()
+    try:
+        funcion = TAREAS[trabajo.tipo][0]
+        with app.app_context():
+            try:
+                resultado = funcion(trabajo)
+            finally:
+                db.session.remove()
+        archivo, nombre_descarga, mimetype = resultado or (None, None, None)
+        _finalizar(app, trabajo.id, estado='completado', archivo=archivo,
+                   nombre_descarga=nombre_descarga, mimetype=mimetype)
+        print(f"[INFO] Trabajo {trabajo.id} ({trabajo.tipo}) completado en {time.time() - inicio:.1f}s")
+    except TrabajoCancelado:
+        _finalizar(app, trabajo.id, estado='cancelado')
+        print(f"[INFO] Trabajo {trabajo.id} ({trabajo.tipo}) cancelado")
+    except Exception as e:
+        traceback.print_exc()
+        _finalizar(app, trabajo.id, estado='error', error=str(e) or e.__class__.__name__)
+    finally:
+        if os.path.exists(trabajo.ruta_entrada):
+            os.remove(trabajo.ruta_entrada)
+    return True
+
+
+def recuperar_interrumpidos(app):
+    """Marca como error los trabajos que quedaron en curso al parar el worker"""
+    conn = _conectar(app)
+    try:
+        cursor = conn.execute(
+            "UPDATE trabajos SET estado = 'error', error = ?, finalizado = ? WHERE estado = 'en_curso'",
+            ('Interrumpido al reiniciar el worker', _ahora()))
+        return cursor.rowcount
+    finally:
+        conn.close()
+
+
+def programar_diarias(app, ahora=None):
+    """Encola las tareas diarias que todavía no se han encolado hoy. Devuelve cuántas
+
+    La comprobación y los INSERT van en la misma transacción BEGIN IMMEDIATE:
+    aunque lo llamen dos procesos a la vez, cada tarea se encola una sola vez.
+    """
+    ahora = ahora or datetime.now()
+    if ahora.hour < HORA_DIARIAS:
+        return 0
+    conn = _conectar(app)
+    try:
+        conn.execute('BEGIN IMMEDIATE')
+        pendientes = [tipo for tipo in DIARIAS if conn.execute(
+            'SELECT 1 FROM trabajos WHERE tipo = ? AND creado >= ? LIMIT 1',
+            (tipo, ahora.date().isoformat())).fetchone() is None]
+        for tipo in pendientes:
+            trabajo_id = secrets.token_hex(8)
+            os.makedirs(ruta_trabajo(app, trabajo_id), exist_ok=True)
+            _insertar(conn, trabajo_id, tipo)
+        conn.execute('COMMIT')
+    except Exception:
+        conn.execute('ROLLBACK')
+        raise
+    finally:
+        conn.close()
+    return len(pendientes)
+
+
+def tomar_cerrojo(app):
+    """Cerrojo de TRABAJOS_DIR/worker.lock para ejecutar los trabajos de ese directorio
+
+    Devuelve el archivo abierto, que hay que mantener abierto mientras se
+    ejecutan trabajos (el cerrojo se suelta al cerrarlo o al morir el
+    proceso), o None si lo tiene otro proceso. Sin fcntl no se comprueba.
+    """
+    directorio = _directorio(app)
+    os.makedirs(directorio, exist_ok=True)
+    cerrojo = open(os.path.join(directorio, 'worker.lock'), 'w')
+    if FCNTL_AVAILABLE:
+        try:
+            fcntl.flock(cerrojo, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            cerrojo.close()
+            return None
+    return cerrojo
+
+
+def ejecutar_worker(app, intervalo=1.0, parar=None):
+    """Bucle del worker: ejecuta trabajos hasta que se active el evento `parar`"""
+    parar = parar or threading.Event()
+    ultima_limpieza = 0
+    ultima_programacion = 0
+    while not parar.is_set():
+        try:
+            if time.time() - ultima_limpieza > 3600:
+                limpiar_antiguos(app)
+                ultima_limpieza = time.time()
+            if time.time() - ultima_programacion > 60:
+                programar_diarias(app)
+                ultima_programacion = time.time()
+            if not ejecutar_siguiente(app):
+                parar.wait(intervalo)
+        except Exception as e:
+            print(f"[ERROR] Fallo en el worker de trabajos: {e}")
+            traceback.print_exc()
+            parar.wait(intervalo * 5)
+
+
+def _candidato(app):
+    """Hilo interno: espera al cerrojo y, cuando lo consigue, hace de worker"""
+    cerrojo = tomar_cerrojo(app)
+    while cerrojo is None:
+        time.sleep(CANDIDATO_INTERVALO)
+        cerrojo = tomar_cerrojo(app)
+    try:
+        interrumpidos = recuperar_interrumpidos(app)
+        if interrumpidos:
+            print(f"[WARNING] {interrumpidos} trabajo(s) interrumpido(s) marcados como error")
+        print(f"[INFO] Worker de trabajos interno iniciado en el proceso {os.getpid()}")
+        ejecutar_worker(app)
+    finally:
+        cerrojo.close()
+
+
+def iniciar_worker_interno(app):
+    """Worker en un hilo de los procesos web (despliegues sin systemd)
+
+    El hilo no se lanza aquí: con preload_app create_app se ejecuta en el
+    master de gunicorn, que no atiende peticiones y cuyos hilos no pasan a
+    los workers al hacer fork. Cada proceso lanza el suyo con la primera
+    petición; solo el que tiene el cerrojo ejecuta trabajos, y los demás
+    siguen intentándolo por si ese proceso se recicla (max_requests).
+    """
+    @app.before_request
+    def lanzar_worker_interno():
+        if _interno['pid'] == os.getpid():
+            return
+        with _interno_lock:
+            if _interno['pid'] != os.getpid():
+                _interno['pid'] = os.getpid()
+                threading.Thread(target=_candidato, args=(app,), daemon=True, name='worker-trabajos').start()
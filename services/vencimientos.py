@@ -0,0 +1,137 @@
+"""
+Socios vencidos y por vencer
+
+El estado de la suscripción (vencida, por vencer en DIAS_AVISO días o
+activa) se calcula en SQL con estado_sql(), así los listados no llaman a
+suscripcion_vencida()/suscripcion_por_vencer() socio a socio. Las
+condiciones son rangos sobre fecha_validez dentro de rol = 'socio' y usan el
+índice ix_users_rol_fecha_validez.
+
+Una vez al día la tarea 'vencimientos' de la cola (el worker la encola solo,
+ver trabajos.programar_diarias) guarda la lista de trabajo de la directiva:
+en vencimientos los socios vencidos y por vencer con su número de
+beneficiarios, y en listas_vencimientos los totales. El panel y la
+exportación leen de ahí. Si al consultarla la lista no es de hoy (el worker
+no está en marcha) se genera en ese momento: es un INSERT ... SELECT sobre
+el índice.
+
+La lista es una foto del día; renovar un socio lo actualiza en ella
+(actualizar_socio) y la renovación masiva la vuelve a generar entera.
+"""
+from datetime import datetime, timedelta
+import time
+
+from sqlalchemy import case, delete, func, insert, literal, select
+
+from models import Beneficiario, ListaVencimientos, User, Vencimiento, db
+
+DIAS_AVISO = 30
+
+ESTADOS = {
+    'vencido': 'Vencida',
+    'por_vencer': 'Por vencer',
+    'vigente': 'Activa',
+}
+
+# Se guardan los totales de las listas de estos días (para ver la evolución)
+CONSERVAR_DIAS = 90
+
+_COLUMNAS = ['lista_id', 'user_id', 'numero_socio', 'nombre', 'nombre_usuario', 'forma_de_pago',
+             'fecha_validez', 'estado', 'beneficiarios']
+
+
+def estado_sql(ahora=None):
+    """Expresión SQL con el estado de la suscripción de User: 'vencido', 'por_vencer' o 'vigente'"""
+    ahora = ahora or datetime.utcnow()
+    return case(
+        (User.fecha_validez < ahora, 'vencido'),
+        (User.fecha_validez <= ahora + timedelta(days=DIAS_AVISO), 'por_vencer'),
+        else_='vigente',
+    )
+
+
+def _seleccion(lista, ahora):
+    """SELECT de las filas de vencimientos de la lista (socios vencidos o por vencer)"""
+    beneficiarios = (select(func.count()).select_from(Beneficiario)
+                     .where(Beneficiario.socio_id == User.id).scalar_subquery())
+    return select(
+        literal(lista.id), User.id, User.numero_socio, User.nombre, User.nombre_usuario, User.forma_de_pago,
+        User.fecha_validez, estado_sql(ahora), beneficiarios,
+    ).where(User.rol == 'socio', User.fecha_validez <= ahora + timedelta(days=DIAS_AVISO))
+
+
+def _recontar(lista):
+    totales = dict(db.session.execute(
+        select(Vencimiento.estado, func.count()).where(Vencimiento.lista_id == lista.id).group_by(Vencimiento.estado)
+    ).all())
+    lista.por_vencer = totales.get('por_vencer', 0)
+    lista.vencidos = totales.get('vencido', 0)
+    lista.beneficiarios = db.session.scalar(
+        select(func.coalesce(func.sum(Vencimiento.beneficiarios), 0)).where(Vencimiento.lista_id == lista.id))
+
+
+def generar(ahora=None):
+    """Genera la lista de hoy (sustituye a la anterior). Devuelve la ListaVencimientos"""
+    inicio = time.perf_counter()
+    ahora = ahora or datetime.utcnow()
+    lista = ListaVencimientos(fecha=ahora.date(), generada=ahora)
+    try:
+        db.session.execute(delete(Vencimiento))
+        db.session.add(lista)
+        db.session.flush()
+        db.session.execute(insert(Vencimiento).from_select(_COLUMNAS, _seleccion(lista, ahora)))
+        _recontar(lista)
+        lista.duracion_ms = int((time.perf_counter() - inicio) * 1000)
+        db.session.execute(delete(ListaVencimientos).where(
+            ListaVencimientos.fecha < ahora.date() - timedelta(days=CONSERVAR_DIAS)))
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return lista
+
+
+def actual():
+    """Lista más reciente, o None si no se ha generado ninguna"""
+    return ListaVencimientos.query.order_by(ListaVencimientos.id.desc()).first()
+
+
+def de_hoy():
+    """Lista de hoy; si el worker aún no la ha generado, se genera ahora"""
+    lista = actual()
+    if lista is None or lista.fecha != datetime.utcnow().date():
+        lista = generar()
+    return lista
+
+
+def listado(lista, estado=None):
+    """Socios de la lista (todos o los de un estado), del que vence antes al que vence después"""
+    consulta = Vencimiento.query.filter(Vencimiento.lista_id == lista.id)
+    if estado:
+        consulta = consulta.filter(Vencimiento.estado == estado)
+    return consulta.order_by(Vencimiento.fecha_validez, Vencimiento.numero_socio).all()
+
+
+def historico(dias=30):
+    """Totales de las listas de los últimos días, de la más reciente a la más antigua (una por día)"""
+    desde = datetime.utcnow().date() - timedelta(days=dias)
+    ultimas = (select(func.max(ListaVencimientos.id)).where(ListaVencimientos.fecha >= desde)
+               .group_by(ListaVencimientos.fecha))
+    return (ListaVencimientos.query.filter(ListaVencimientos.id.in_(ultimas))
+            .order_by(ListaVencimientos.fecha.desc()).all())
+
+
+def actualizar_socio(user_id):
+    """Vuelve a calcular la fila de un socio en la lista actual (tras renovarlo o editarlo)"""
+    lista = actual()
+    if lista is None:
+        return
+    try:
+        db.session.execute(delete(Vencimiento).where(Vencimiento.lista_id == lista.id, Vencimiento.user_id == user_id))
+        db.session.execute(insert(Vencimiento).from_select(
+            _COLUMNAS, _seleccion(lista, lista.generada).where(User.id == user_id)))
+        _recontar(lista)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        print(f"[WARNING] No se pudo actualizar la lista de vencimientos del socio {user_id}: {e}")
@@ -0,0 +1,148 @@
+"""
+Verificación de carnets mediante código QR
+
+El QR del carnet lleva la URL /verificar/<token>, donde el token es el id
+del socio firmado con la SECRET_KEY (itsdangerous). Una firma que no cuadra
+se rechaza sin tocar la base de datos.
+
+Para los tokens válidos, el estado del socio (vigencia, beneficiarios e
+inscripciones de hoy) se guarda en una caché en memoria del proceso durante
+TTL_CACHE segundos: en la puerta de un evento se escanean cientos de carnets
+seguidos y la mayoría de consultas repetidas (dos miembros de la directiva
+leyendo el mismo carnet, un socio con varios beneficiarios) no llegan a la
+base de datos. Las consultas que sí llegan van por índice: users por clave
+primaria, beneficiarios por socio_id e inscripciones por user_id (índice de
+unique_inscripcion).
+"""
+from datetime import datetime, timedelta
+import threading
+import time
+
+from flask import current_app, has_request_context, request
+from itsdangerous import Signer, BadSignature
+from sqlalchemy import select
+
+from models import db, User, Beneficiario, Inscripcion, Actividad
+
+SAL = 'carnet-socio'
+RUTA = '/verificar/'
+TTL_CACHE = 30  # segundos
+MAX_ENTRADAS = 5000
+
+_cache = {}
+_lock = threading.Lock()
+
+
+def _firmante():
+    return Signer(current_app.config['SECRET_KEY'], salt=SAL)
+
+
+def token_socio(socio_id):
+    """Token firmado que identifica a un socio"""
+    return _firmante().sign(str(socio_id)).decode('ascii')
+
+
+def leer_token(token):
+    """Id del socio del token, o None si la firma no es válida"""
+    try:
+        return int(_firmante().unsign(token))
+    except (BadSignature, ValueError):
+        return None
+
+
+def url_verificacion(socio_id, url_base=None):
+    """URL completa que se codifica en el QR del carnet
+
+    Fuera de una petición (trabajos en segundo plano) hay que indicar
+    url_base o configurar URL_PUBLICA; si no, ValueError (una URL relativa
+    en el QR no la abre ningún móvil).
+    """
+    url_base = url_base or current_app.config.get('URL_PUBLICA')
+    if not url_base and has_request_context():
+        url_base = request.url_root
+    if not url_base:
+        raise ValueError('Sin URL_PUBLICA ni url_base no se puede construir la URL del QR del carnet')
+    return url_base.rstrip('/') + RUTA + token_socio(socio_id)
+
+
+def invalidar(socio_id=None):
+    """Olvida el estado cacheado de un socio (o de todos)"""
+    with _lock:
+        if socio_id is None:
+            _cache.clear()
+        else:
+            _cache.pop(socio_id, None)
+
+
+def _cargar(socio_id, ahora):
+    socio = db.session.execute(
+        select(User.nombre, User.numero_socio, User.rol, User.fecha_validez).where(User.id == socio_id)
+    ).first()
+    if socio is None:
+        return None
+
+    beneficiarios = db.session.execute(
+        select(Beneficiario.id, Beneficiario.nombre, Beneficiario.primer_apellido,
+               Beneficiario.numero_beneficiario, Beneficiario.fecha_validez)
+        .where(Beneficiario.socio_id == socio_id)
+        .order_by(Beneficiario.nombre)
+    ).all()
+
+    inicio_dia = ahora.replace(hour=0, minute=0, second=0, microsecond=0)
+    inscripciones = db.session.execute(
+        select(Actividad.nombre, Actividad.fecha, Inscripcion.beneficiario_id, Inscripcion.asiste)
+        .join(Actividad, Actividad.id == Inscripcion.actividad_id)
+        .where(Inscripcion.user_id == socio_id,
+               Actividad.fecha >= inicio_dia,
+               Actividad.fecha < inicio_dia + timedelta(days=1))
+        .order_by(Actividad.fecha)
+    ).all()
+
+    nombres = {b.id: f"{b.nombre} {b.primer_apellido}" for b in beneficiarios}
+    vigente = socio.fecha_validez >= ahora
+    return {
+        'valido': vigente and socio.rol == 'socio',
+        'nombre': socio.nombre,
+        'numero_socio': socio.numero_socio,
+        'fecha_validez': socio.fecha_validez.strftime('%d/%m/%Y'),
+        'vigente': vigente,
+        'beneficiarios': [
+            {
+                'nombre': nombres[b.id],
+                'numero': b.numero_beneficiario,
+                'fecha_validez': b.fecha_validez.strftime('%d/%m/%Y'),
+                'vigente': b.fecha_validez >= ahora,
+            }
+            for b in beneficiarios
+        ],
+        'hoy': [
+            {
+                'actividad': i.nombre,
+                'hora': i.fecha.strftime('%H:%M'),
+                'persona': nombres.get(i.beneficiario_id, socio.nombre),
+                'asiste': bool(i.asiste),
+            }
+            for i in inscripciones
+        ],
+        'consultado': ahora.strftime('%d/%m/%Y %H:%M:%S'),
+    }
+
+
+def estado_socio(socio_id):
+    """Estado del socio para la verificación (cacheado TTL_CACHE segundos)
+
+    Devuelve None si el socio ya no existe.
+    """
+    ahora = datetime.utcnow()
+    instante = time.monotonic()
+    with _lock:
+        entrada = _cache.get(socio_id)
+    if entrada is not None and instante - entrada[0] < TTL_CACHE and entrada[1] == ahora.date():
+        return entrada[2]
+
+    estado = _cargar(socio_id, ahora)
+    with _lock:
+        if len(_cache) >= MAX_ENTRADAS:
+            _cache.clear()
+        _cache[socio_id] = (instante, ahora.date(), estado)
+    return estado
@@ -0,0 +1,176 @@
+"""
+Versiones de las tablas y GET condicional (ETag / Last-Modified)
+
+Cada cambio en users, actividades, inscripciones o beneficiarios hecho a
+través de la sesión de SQLAlchemy (objetos o UPDATE/DELETE masivos) suma 1
+a la fila de esa tabla en versiones_tablas, dentro de la misma transacción.
+Como está en la base de datos, todos los workers ven el mismo contador.
+
+@condicional calcula con una sola consulta el ETag de la vista (versiones
+de sus tablas, usuario, día y última actividad ya celebrada, que es cuando
+cambia lo que se ve aunque nadie toque la base de datos) y, si el navegador
+ya tiene esa versión, responde 304 sin ejecutar la vista.
+"""
+from datetime import datetime
+from functools import wraps
+from itertools import chain
+import hashlib
+import time
+
+from flask import current_app, request, session
+from flask_login import current_user
+from sqlalchemy import bindparam, event, text
+from sqlalchemy.orm import Session
+from werkzeug.http import is_resource_modified
+
+from models import VersionTabla, db
+
+TABLAS = ('users', 'actividades', 'inscripciones', 'beneficiarios')
+
+_estado = {'arranque': ''}
+_suscriptores = []  # (tablas, función) que se llaman después de cada commit que las toca
+
+_SUBIR = text(
+    'UPDATE versiones_tablas SET version = version + 1, actualizado = :ahora WHERE tabla IN :tablas'
+).bindparams(bindparam('tablas', expanding=True))
+
+_CONSULTA = text(
+    'SELECT tabla, version, actualizado, '
+    '(SELECT MAX(fecha) FROM actividades WHERE fecha <= :ahora) '
+    'FROM versiones_tablas WHERE tabla IN :tablas'
+).bindparams(bindparam('tablas', expanding=True))
+
+
+# ---------------------------------------------------------------------------
+# Contadores
+# ---------------------------------------------------------------------------
+
+def _anotar(session, tablas):
+    tablas = {tabla for tabla in tablas if tabla in TABLAS}
+    if tablas:
+        session.info.setdefault('tablas_modificadas', set()).update(tablas)
+
+
+@event.listens_for(Session, 'after_flush')
+def _tras_flush(session, flush_context):
+    objetos = chain(session.new, session.deleted, (o for o in session.dirty if session.is_modified(o)))
+    _anotar(session, (getattr(o, '__tablename__', None) for o in objetos))
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _tras_execute(ejecucion):
+    # UPDATE/DELETE masivos (query.update(), executemany de inscritos.sincronizar...)
+    if ejecucion.is_update or ejecucion.is_delete or ejecucion.is_insert:
+        tabla = getattr(ejecucion.statement, 'table', None)
+        if tabla is not None:
+            _anotar(ejecucion.session, [tabla.name])
+
+
+@event.listens_for(Session, 'before_commit')
+def _antes_commit(session):
+    session.flush()
+    tablas = session.info.pop('tablas_modificadas', None)
+    if tablas:
+        session.execute(_SUBIR, {'ahora': datetime.utcnow(), 'tablas': sorted(tablas)})
+        session.info['tablas_confirmadas'] = tablas
+
+
+@event.listens_for(Session, 'after_commit')
+def _tras_commit(session):
+    tablas = session.info.pop('tablas_confirmadas', None)
+    if not tablas:
+        return
+    for interesan, funcion in _suscriptores:
+        if tablas & interesan:
+            try:
+                funcion()
+            except Exception as e:
+                print(f"[WARNING] Error en {funcion.__module__}.{funcion.__name__} tras el commit: {e}")
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _tras_rollback(session, transaccion_previa):
+    session.info.pop('tablas_modificadas', None)
+    session.info.pop('tablas_confirmadas', None)
+
+
+def al_confirmar(tablas, funcion):
+    """Llama a funcion() después de cada commit que cambie alguna de esas tablas
+
+    Se ejecuta ya fuera de la transacción (la sesión no admite más SQL en
+    ese momento: funcion tiene que usar su propia conexión).
+    """
+    _suscriptores.append((set(tablas), funcion))
+
+
+def iniciar(app):
+    """Crea las filas de versiones_tablas que falten (create_app, después de db.create_all)"""
+    _estado['arranque'] = hashlib.sha1(f'{time.time()}'.encode()).hexdigest()[:8]
+    existentes = {fila.tabla for fila in VersionTabla.query.all()}
+    for tabla in TABLAS:
+        if tabla not in existentes:
+            db.session.add(VersionTabla(tabla=tabla, version=0))
+    db.session.commit()
+
+
+# ---------------------------------------------------------------------------
+# GET condicional
+# ---------------------------------------------------------------------------
+
+def estado(tablas):
+    """(etag, last_modified) de una vista que depende de esas tablas, para el usuario actual"""
+    ahora = datetime.utcnow()
+    filas = db.session.execute(_CONSULTA, {'ahora': ahora, 'tablas': list(tablas)}).all()
+    if len(filas) != len(tablas):
+        return None, None
+    ultima_pasada = filas[0][3]
+    partes = [_estado['arranque'], str(current_user.get_id()), ahora.date().isoformat(), str(ultima_pasada)]
+    partes += [f'{tabla}:{version}' for tabla, version, _, _ in sorted(filas)]
+    etag = hashlib.sha1('|'.join(partes).encode('utf-8')).hexdigest()[:20]
+
+    def _fecha(valor):
+        # SQLite devuelve texto en las consultas con text()
+        return datetime.fromisoformat(valor) if isinstance(valor, str) else valor
+
+    momentos = [_fecha(actualizado) for _, _, actualizado, _ in filas]
+    momentos.append(datetime.combine(ahora.date(), datetime.min.time()))
+    if ultima_pasada:
+        momentos.append(_fecha(ultima_pasada))
+    return etag, max(momentos).replace(microsecond=0)
+
+
+def condicional(*tablas):
+    """Decorador: 304 sin ejecutar la vista si el navegador ya tiene esta versión
+
+    Va después de @login_required (y de @directiva_required). Si hay mensajes
+    flash pendientes la vista se ejecuta siempre, para que se muestren.
+    """
+    tablas = tablas or TABLAS
+
+    def decorador(vista):
+        @wraps(vista)
+        def envoltorio(*a, **kw):
+            if request.method != 'GET' or session.get('_flashes'):
+                return vista(*a, **kw)
+            try:
+                etag, modificado = estado(tablas)
+            except Exception as e:
+                db.session.rollback()
+                print(f"[WARNING] No se pudo calcular la versión de {request.endpoint}: {e}")
+                etag = None
+            if etag is None:
+                return vista(*a, **kw)
+
+            if not is_resource_modified(request.environ, etag=etag, last_modified=modificado):
+                respuesta = current_app.response_class(status=304)
+            else:
+                respuesta = current_app.make_response(vista(*a, **kw))
+                if respuesta.status_code != 200:
+                    return respuesta
+            respuesta.set_etag(etag)
+            respuesta.last_modified = modificado
+            # El navegador guarda la página pero pregunta siempre antes de usarla
+            respuesta.headers['Cache-Control'] = 'private, no-cache'
+            return respuesta
+        return envoltorio
+    return decorador
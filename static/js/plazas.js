@@ -0,0 +1,76 @@
+// Detalle de actividad: plazas disponibles actualizadas sin recargar la página
+// Consulta /actividades/<id>/plazas cada 5 s; si no cambia nada (o falla) espera
+// el doble, hasta 1 minuto. Cuando cambia vuelve a 5 s. Con la pestaña oculta no consulta.
+
+document.addEventListener('DOMContentLoaded', function() {
+    const caja = document.querySelector('[data-plazas-url]');
+    if (!caja || !window.fetch) {
+        return;
+    }
+
+    const ESPERA_MIN = 5000;
+    const ESPERA_MAX = 60000;
+    const numero = caja.querySelector('.js-plazas-numero');
+    const completa = caja.querySelector('.js-plazas-completa');
+    const aviso = caja.querySelector('.js-plazas-aviso');
+    // Estado con el que se pintó la página (los botones de inscripción dependen de él)
+    const inicial = {
+        hayPlazas: parseInt(caja.dataset.plazas, 10) > 0,
+        bloqueada: caja.dataset.bloqueada === '1'
+    };
+    let ultimo = caja.dataset.plazas + ':' + caja.dataset.bloqueada;
+    let espera = ESPERA_MIN;
+    let temporizador = null;
+
+    function pintar(datos) {
+        const hayPlazas = datos.plazas_disponibles > 0;
+        numero.textContent = datos.plazas_disponibles;
+        numero.classList.toggle('text-success', hayPlazas);
+        numero.classList.toggle('text-danger', !hayPlazas);
+        completa.classList.toggle('d-none', hayPlazas);
+        const distinto = hayPlazas !== inicial.hayPlazas || datos.bloqueada !== inicial.bloqueada;
+        aviso.classList.toggle('d-none', !distinto);
+    }
+
+    function programar() {
+        clearTimeout(temporizador);
+        temporizador = document.hidden ? null : setTimeout(consultar, espera);
+    }
+
+    function consultar() {
+        fetch(caja.dataset.plazasUrl, {credentials: 'same-origin', headers: {'Accept': 'application/json'}})
+            .then(function(respuesta) {
+                if (!respuesta.ok) {
+                    throw new Error(respuesta.status);
+                }
+                return respuesta.json();
+            })
+            .then(function(datos) {
+                const clave = datos.plazas_disponibles + ':' + (datos.bloqueada ? 1 : 0);
+                if (clave !== ultimo) {
+                    ultimo = clave;
+                    pintar(datos);
+                    espera = ESPERA_MIN;
+                } else {
+                    espera = Math.min(espera * 2, ESPERA_MAX);
+                }
+            })
+            .catch(function() {
+                espera = Math.min(espera * 2, ESPERA_MAX);
+            })
+            .then(programar);
+    }
+
+    document.addEventListener('visibilitychange', function() {
+        if (document.hidden) {
+            clearTimeout(temporizador);
+            temporizador = null;
+        } else {
+            // Al volver a la pestaña, consulta enseguida y empieza de nuevo desde 5 s
+            espera = ESPERA_MIN;
+            consultar();
+        }
+    });
+
+    programar();
+});
@@ -0,0 +1,102 @@
+// Portada (auth/login.html): carteles ampliables y pistas de patrocinadores
+
+document.addEventListener('DOMContentLoaded', function() {
+    const submitButtons = document.querySelectorAll('button[type="submit"]');
+    submitButtons.forEach(function(button) {
+        button.replaceWith(button.cloneNode(true));
+    });
+
+    const carouselEl = document.getElementById('portadaCartelesCarousel');
+    const cartelModalEl = document.getElementById('modalCartelPortada');
+    const cartelModalImg = document.getElementById('modalCartelPortadaImg');
+    const cartelModalTitle = document.getElementById('modalCartelPortadaLabel');
+    let carouselInstance = null;
+
+    function esMovilCartel() {
+        return window.matchMedia('(max-width: 767.98px)').matches;
+    }
+
+    function ajustarCartelAlPantalla() {
+        if (!cartelModalImg || !esMovilCartel()) {
+            if (cartelModalImg) {
+                cartelModalImg.style.width = '';
+                cartelModalImg.style.height = '';
+            }
+            return;
+        }
+
+        const header = cartelModalEl.querySelector('.modal-header');
+        const maxAncho = window.innerWidth;
+        const maxAlto = window.innerHeight - (header ? header.offsetHeight : 44) - 8;
+        const anchoNatural = cartelModalImg.naturalWidth;
+        const altoNatural = cartelModalImg.naturalHeight;
+
+        if (!anchoNatural || !altoNatural) {
+            return;
+        }
+
+        const escala = Math.min(maxAncho / anchoNatural, maxAlto / altoNatural, 1);
+        cartelModalImg.style.width = Math.round(anchoNatural * escala) + 'px';
+        cartelModalImg.style.height = Math.round(altoNatural * escala) + 'px';
+    }
+
+    if (carouselEl) {
+        carouselInstance = bootstrap.Carousel.getOrCreateInstance(carouselEl);
+    }
+
+    document.querySelectorAll('.portada-cartel-clic').forEach(function(img) {
+        img.addEventListener('click', function() {
+            if (carouselInstance) {
+                carouselInstance.pause();
+            }
+
+            cartelModalImg.removeAttribute('width');
+            cartelModalImg.removeAttribute('height');
+            cartelModalImg.style.width = '';
+            cartelModalImg.style.height = '';
+
+            cartelModalImg.onload = function() {
+                cartelModalImg.onload = null;
+                ajustarCartelAlPantalla();
+            };
+
+            cartelModalImg.src = img.currentSrc || img.src;
+            cartelModalImg.alt = img.alt;
+            cartelModalTitle.textContent = img.dataset.cartelTitulo || img.alt;
+
+            if (cartelModalImg.complete) {
+                cartelModalImg.onload();
+            }
+
+            bootstrap.Modal.getOrCreateInstance(cartelModalEl).show();
+        });
+
+        img.addEventListener('keydown', function(event) {
+            if (event.key === 'Enter' || event.key === ' ') {
+                event.preventDefault();
+                img.click();
+            }
+        });
+    });
+
+    if (cartelModalEl) {
+        cartelModalEl.addEventListener('shown.bs.modal', ajustarCartelAlPantalla);
+        window.addEventListener('resize', ajustarCartelAlPantalla);
+
+        cartelModalEl.addEventListener('hidden.bs.modal', function() {
+            if (carouselInstance) {
+                carouselInstance.cycle();
+            }
+        });
+    }
+
+    // Las pistas de patrocinadores llevan los logotipos dos veces para que la
+    // animación sea continua; la segunda copia se crea aquí en lugar de ir en el HTML
+    document.querySelectorAll('.patrocinadores-track').forEach(function(pista) {
+        Array.from(pista.children).forEach(function(item) {
+            const copia = item.cloneNode(true);
+            copia.setAttribute('aria-hidden', 'true');
+            pista.appendChild(copia);
+        });
+    });
+});
@@ -0,0 +1,53 @@
+"""
+Worker de la cola de trabajos en segundo plano (services/trabajos.py)
+
+Ejecuta, uno detrás de otro, los trabajos que encolan las vistas de la
+directiva (exportaciones, copias de la base de datos, carnets por lotes).
+En el VPS lo arranca systemd (systemd/asociacion-worker.service) junto a
+gunicorn; en local basta con dejarlo abierto en otra terminal:
+
+    python worker_trabajos.py
+
+Solo trabaja un worker por TRABAJOS_DIR (cerrojo worker.lock; si lo tiene
+otro, espera): al conseguirlo marca como error los trabajos que quedaron en
+curso si el anterior se detuvo a medias.
+"""
+import signal
+import threading
+
+from app import create_app
+from services import trabajos
+import services.tareas  # noqa: F401  (registra las tareas)
+
+
+def main():
+    app = create_app()
+    parar = threading.Event()
+
+    def detener(signum, frame):
+        print("[INFO] Deteniendo el worker al terminar el trabajo en curso...")
+        parar.set()
+
+    signal.signal(signal.SIGTERM, detener)
+    signal.signal(signal.SIGINT, detener)
+
+    cerrojo = trabajos.tomar_cerrojo(app)
+    if cerrojo is None:
+        print("[WARNING] Otro worker ya ejecuta los trabajos de este directorio; esperando a que termine...")
+    while cerrojo is None and not parar.is_set():
+        parar.wait(trabajos.CANDIDATO_INTERVALO)
+        cerrojo = trabajos.tomar_cerrojo(app)
+    if cerrojo is None:
+        return
+
+    interrumpidos = trabajos.recuperar_interrumpidos(app)
+    if interrumpidos:
+        print(f"[WARNING] {interrumpidos} trabajo(s) interrumpido(s) marcados como error")
+
+    print(f"[INFO] Worker de trabajos iniciado. Directorio: {app.config['TRABAJOS_DIR']}")
+    trabajos.ejecutar_worker(app, parar=parar)
+    print("[INFO] Worker de trabajos detenido")
+
+
+if __name__ == '__main__':
+    main()